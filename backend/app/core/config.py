@@ -11,6 +11,46 @@ class Settings(BaseSettings):
 
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS: int = 3600  # удаление истекших refresh-токенов
+
+    # Пул соединений асинхронного движка (на один процесс uvicorn)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # ожидание свободного соединения
+    # Синхронный движок: init_db и фоновые задачи в executor
+    DB_SYNC_POOL_SIZE: int = 5
+    DB_SYNC_MAX_OVERFLOW: int = 5
+    # Параметры каждого соединения
+    DB_CONNECT_TIMEOUT_SECONDS: int = 10
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # 0 - без ограничения
+    DB_APPLICATION_NAME: str = "project_workshop_backend"
+
+    # Кэш принципалов (id/username -> флаги) в get_current_user; инвалидируется
+    # локально, в других процессах изменения видны не позже чем через TTL
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+
+    # Автосохранение конспектов: правки сразу пишутся в журнал note_edits, а текст
+    # конспекта переписывается не чаще раза в AUTOSAVE_COALESCE_SECONDS (0 - писать сразу)
+    AUTOSAVE_COALESCE_SECONDS: float = 10.0
+
+    # История AI-обработки пишется в фоне пачками до HISTORY_BATCH_SIZE
+    # записей или раз в HISTORY_FLUSH_SECONDS; сверх HISTORY_MAX_PENDING
+    # записи отбрасываются
+    HISTORY_BATCH_SIZE: int = 50
+    HISTORY_FLUSH_SECONDS: float = 1.0
+    HISTORY_MAX_PENDING: int = 10000
+
+    # Хеширование паролей (argon2) в отдельном пуле потоков
+    PASSWORD_HASH_WORKERS: int = 0  # 0 - по числу ядер
+    PASSWORD_HASH_MAX_PENDING: int = 256  # сверх лимита логины получают 503
+    # При изменении параметров старые хеши пересчитываются при следующем входе
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # КиБ
+    ARGON2_PARALLELISM: int = 4
 
     # OPENAI_API_KEY: str = "dummy-key-for-testing"
     # OPENAI_MODEL: str = "gpt-4"
@@ -25,12 +65,90 @@ class Settings(BaseSettings):
     OPENROUTER_API_KEY: str
     OPENROUTER_MODEL: str = "deepseek/deepseek-chat"
     OPENROUTER_OCR_MODEL: str = "google/gemini-flash-1.5"
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+
+    # HTTP-клиент OpenRouter (один на приложение)
+    OPENROUTER_MAX_CONNECTIONS: int = 100
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENROUTER_KEEPALIVE_EXPIRY: float = 30.0
+    OPENROUTER_TIMEOUT: float = 120.0
+    OPENROUTER_HTTP2: bool = True  # используется, если установлен пакет h2
+    OPENROUTER_MAX_CONCURRENCY: int = 64  # одновременных запросов к LLM на процесс
+
+    # Политика вызовов LLM (llm_policy): запасные модели через запятую пробуются
+    # после основной; если недоступны все - текст обрабатывается только ML-модулем
+    OPENROUTER_FALLBACK_MODELS: str = ""
+    OPENROUTER_OCR_FALLBACK_MODELS: str = ""
+    LLM_CALL_TIMEOUT_SECONDS: float = 60.0
+    LLM_MAX_RETRIES: int = 2  # повторы 429/5xx/таймаутов на каждую модель
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 8.0
+    # Второй запрос, если первый идет дольше p95 модели (после LLM_HEDGE_MIN_SAMPLES ответов)
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_MIN_SAMPLES: int = 50
+    LLM_BREAKER_FAILURES: int = 5  # ошибок подряд до отключения модели
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+
+    # Длинные тексты (оценка больше LONG_TEXT_THRESHOLD_TOKENS) обрабатываются
+    # map-reduce: куски по LONG_TEXT_CHUNK_TOKENS параллельно, затем сведение
+    LLM_CHARS_PER_TOKEN: float = 3.0  # оценка для русского текста без токенизатора
+    LONG_TEXT_THRESHOLD_TOKENS: int = 6000
+    LONG_TEXT_CHUNK_TOKENS: int = 2500
+    LONG_TEXT_MAX_CONCURRENCY: int = 8  # одновременных запросов на один текст
 
     # Настройки обработки
     USE_OPENROUTER: bool = True
     USE_ML_ENHANCER: bool = True
     USE_DIRECT_OCR_ENHANCEMENT: bool = False
 
+    # Загрузка изображений: читается кусками, слишком большой файл отклоняется не дочитанным
+    IMAGE_UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024
+    IMAGE_UPLOAD_CHUNK_BYTES: int = 256 * 1024
+
+    # Предобработка перед OCR (пул потоков): поворот по EXIF, уменьшение до
+    # IMAGE_OCR_MAX_DIMENSION по большей стороне и JPEG не больше IMAGE_OCR_TARGET_BYTES
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_PREPROCESS_WORKERS: int = 0  # 0 - по числу ядер
+    IMAGE_PREPROCESS_MAX_PENDING: int = 64  # сверх лимита изображение уходит без предобработки
+    IMAGE_OCR_MAX_DIMENSION: int = 2048
+    IMAGE_OCR_TARGET_BYTES: int = 1024 * 1024
+    IMAGE_OCR_JPEG_QUALITY: int = 85
+    IMAGE_OCR_GRAYSCALE: bool = True
+    IMAGE_OCR_AUTOCROP: bool = False  # обрезать поля вокруг текста
+
+    # Многостраничные документы (/ai/process-document): страницы распознаются
+    # параллельно, не больше OCR_BATCH_CONCURRENCY одновременно на документ
+    DOCUMENT_MAX_PAGES: int = 50
+    DOCUMENT_MAX_TOTAL_BYTES: int = 50 * 1024 * 1024  # все файлы документа вместе
+    OCR_BATCH_CONCURRENCY: int = 8
+
+    # Пул процессов для ML-улучшения
+    ML_PROCESS_POOL: bool = True
+    ML_POOL_WORKERS: int = 0  # 0 - по числу ядер
+    ML_POOL_MAX_PENDING: int = 32  # задачи сверх лимита получают 503
+
+    # Кэш результатов пайплайна
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 3600
+    RESULT_CACHE_PERSISTENT: bool = True  # искать готовые результаты в ai_responses
+    RESULT_CACHE_PERSISTENT_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Очередь фоновой AI-обработки (/ai/jobs)
+    JOB_WORKERS: int = 4  # asyncio-воркеров на процесс
+    JOB_QUEUE_MAX_PENDING: int = 1000  # сверх лимита новые задачи получают 503
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0  # опрос задач, поставленных другими процессами
+    JOB_STALE_SECONDS: int = 600  # задача в processing без обновлений считается брошенной
+    # Подписчики /ai/jobs/{id}/events узнают об изменениях задач своего процесса сразу;
+    # задачи, которые обрабатывает другой процесс, опрашиваются с этим интервалом
+    JOB_EVENTS_POLL_SECONDS: float = 5.0
+    # Временные ошибки (пул ML перегружен, LLM недоступна): задача возвращается
+    # в очередь с паузой, удваивающейся с каждой попыткой
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF_SECONDS: float = 5.0
+    JOB_RETRY_BACKOFF_MAX_SECONDS: float = 300.0
+
     class Config:
         env_file = f"{BASE_DIR}/.env"
         env_file_encoding = "utf-8"
@@ -1,28 +1,36 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 from typing import Optional
 from app.db.session import get_db
 from app.db.models.user import User
 from app.core.config import settings
+from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal, principal_cache
+from app.services.ml_enhancer_service import enhancement_pool
+from app.services.openrouter_service import OpenRouterService
+from app.services.ai_orchestrator import AIOrchestrator
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-async def get_current_user(
-        token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
-) -> User:
-    """
-    Получает текущего пользователя из JWT токена
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Невалидный токен",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+async def get_current_principal(
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """
+    Получает личность пользователя из JWT токена без загрузки ORM-модели
+    (запрос к БД только при промахе кэша принципалов)
+    """
     try:
         payload = jwt.decode(
             token,
@@ -30,39 +38,61 @@ async def get_current_user(
             algorithms=[settings.ALGORITHM]
         )
         username: Optional[str] = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        # refresh токен годится только для /auth/refresh
+        if username is None or payload.get("type") == "refresh":
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
+    principal = principal_cache.get(username)
+    if principal is None:
+        user = await AuthService.get_user_by_username(db, username)
+        if user is None:
+            raise _credentials_exception()
+        principal = Principal.from_user(user)
+        principal_cache.set(principal)
 
-    if hasattr(user, 'is_active') and not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Пользователь неактивен"
         )
 
+    return principal
+
+
+async def get_current_user(
+        principal: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    Получает текущего пользователя из JWT токена (ORM-модель)
+    """
+    # При промахе кэша пользователь уже в identity map сессии - повторного запроса нет
+    user = await AuthService.get_user_by_id(db, principal.id)
+    if user is None:
+        principal_cache.invalidate(principal.username)
+        raise _credentials_exception()
+
     return user
 
 async def get_current_admin(
-        current_user: User = Depends(get_current_user)
-) -> User:
+        principal: Principal = Depends(get_current_principal)
+) -> Principal:
     """
     Проверяет, является ли пользователь администратором
     """
-    if not current_user.is_admin:
+    if not principal.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Недостаточно прав"
         )
-    return current_user
+    return principal
+
 
 async def get_current_user_optional(
         token: Optional[str] = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """
     Получает текущего пользователя, но не вызывает ошибку если токен отсутствует
@@ -71,6 +101,42 @@ async def get_current_user_optional(
         return None
 
     try:
-        return await get_current_user(token, db)
+        principal = await get_current_principal(token, db)
+        return await get_current_user(principal, db)
     except HTTPException:
-        return None
\ No newline at end of file
+        return None
+
+
+async def require_ml_capacity() -> None:
+    """
+    Быстро отклоняет запрос (503), если очередь ML-обработки заполнена
+    """
+    if settings.USE_ML_ENHANCER and enhancement_pool.started and enhancement_pool.saturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис ML-обработки перегружен, повторите запрос позже",
+            headers={"Retry-After": "1"}
+        )
+
+
+def get_openrouter(request: Request) -> OpenRouterService:
+    """
+    Общий для приложения клиент OpenRouter (создается в lifespan).
+    Если ключ API не настроен, клиента нет - отвечаем 503
+    """
+    openrouter = getattr(request.app.state, "openrouter", None)
+    if openrouter is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OpenRouter не настроен"
+        )
+    return openrouter
+
+
+def get_orchestrator(
+        openrouter: OpenRouterService = Depends(get_openrouter)
+) -> AIOrchestrator:
+    """
+    Оркестратор поверх общего клиента: соединения не создаются на каждый запрос
+    """
+    return AIOrchestrator(openrouter)
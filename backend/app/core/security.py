@@ -56,14 +56,14 @@ def create_refresh_token(data: dict) -> str:
     Создает refresh токен с большим временем жизни
 
     Args:
-        data: Данные для кодирования
+        data: Данные для кодирования (sub, jti и fam - семейство ротации)
 
     Returns:
         str: Refresh токен
     """
     to_encode = data.copy()
 
-    expire = datetime.utcnow() + timedelta(days=7)
+    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
 
     encoded_jwt = jwt.encode(
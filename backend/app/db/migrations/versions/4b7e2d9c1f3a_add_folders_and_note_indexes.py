@@ -0,0 +1,57 @@
+"""add folders and note list indexes
+
+Revision ID: 4b7e2d9c1f3a
+Revises: 00fb228e8d05
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e2d9c1f3a'
+down_revision: Union[str, Sequence[str], None] = '00fb228e8d05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('folders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_folders_id'), 'folders', ['id'], unique=False)
+    op.create_index(op.f('ix_folders_owner_id'), 'folders', ['owner_id'], unique=False)
+
+    op.add_column('notes', sa.Column('original_text', sa.Text(), nullable=True))
+    op.add_column('notes', sa.Column('snippet', sa.String(length=200), server_default='', nullable=False))
+    op.add_column('notes', sa.Column('folder_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('notes_folder_id_fkey', 'notes', 'folders', ['folder_id'], ['id'], ondelete='CASCADE')
+
+    # (updated_at, id) - ключ пагинации: заполняем пропуски и запрещаем NULL
+    op.execute("UPDATE notes SET updated_at = COALESCE(updated_at, created_at, now()) WHERE updated_at IS NULL")
+    op.execute("UPDATE notes SET snippet = left(regexp_replace(content, '<[^>]+>', ' ', 'g'), 200)")
+    op.alter_column('notes', 'updated_at', server_default=sa.text('now()'), nullable=False)
+    op.create_index('ix_notes_owner_folder_updated', 'notes', ['owner_id', 'folder_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notes_owner_folder_updated', table_name='notes')
+    op.alter_column('notes', 'updated_at', server_default=None, nullable=True)
+    op.drop_constraint('notes_folder_id_fkey', 'notes', type_='foreignkey')
+    op.drop_column('notes', 'folder_id')
+    op.drop_column('notes', 'snippet')
+    op.drop_column('notes', 'original_text')
+    op.drop_index(op.f('ix_folders_owner_id'), table_name='folders')
+    op.drop_index(op.f('ix_folders_id'), table_name='folders')
+    op.drop_table('folders')
@@ -0,0 +1,36 @@
+"""add ai request job columns
+
+Revision ID: a7d3e9f2b614
+Revises: f1c4a2b8e637
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f2b614'
+down_revision: Union[str, Sequence[str], None] = 'f1c4a2b8e637'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ai_requests', sa.Column('error', sa.Text(), nullable=True))
+    op.add_column('ai_requests', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('ai_requests', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('ai_requests', sa.Column('run_after', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_ai_requests_status'), 'ai_requests', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ai_requests_status'), table_name='ai_requests')
+    op.drop_column('ai_requests', 'run_after')
+    op.drop_column('ai_requests', 'attempts')
+    op.drop_column('ai_requests', 'updated_at')
+    op.drop_column('ai_requests', 'error')
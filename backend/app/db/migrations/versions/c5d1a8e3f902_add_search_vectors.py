@@ -0,0 +1,48 @@
+"""add full-text search vectors
+
+Revision ID: c5d1a8e3f902
+Revises: 8c2f6a1d5e47
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d1a8e3f902'
+down_revision: Union[str, Sequence[str], None] = '8c2f6a1d5e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notes', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A')"
+        " || setweight(to_tsvector('english', coalesce(title, '')), 'A')"
+        " || setweight(to_tsvector('russian', coalesce(content, '')), 'B')"
+        " || setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+        persisted=True
+    ), nullable=True))
+    op.create_index('ix_notes_search_vector', 'notes', ['search_vector'], unique=False, postgresql_using='gin')
+
+    op.add_column('ai_responses', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(json_to_tsvector('russian', coalesce(key_terms, '[]'::json), '[\"string\"]'), 'A')"
+        " || setweight(json_to_tsvector('english', coalesce(key_terms, '[]'::json), '[\"string\"]'), 'A')"
+        " || setweight(to_tsvector('russian', coalesce(final_result, '')), 'B')"
+        " || setweight(to_tsvector('english', coalesce(final_result, '')), 'B')",
+        persisted=True
+    ), nullable=True))
+    op.create_index('ix_ai_responses_search_vector', 'ai_responses', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ai_responses_search_vector', table_name='ai_responses')
+    op.drop_column('ai_responses', 'search_vector')
+    op.drop_index('ix_notes_search_vector', table_name='notes')
+    op.drop_column('notes', 'search_vector')
@@ -0,0 +1,30 @@
+"""add ai response cache key
+
+Revision ID: f1c4a2b8e637
+Revises: e3a7b5c9d214
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c4a2b8e637'
+down_revision: Union[str, Sequence[str], None] = 'e3a7b5c9d214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ai_responses', sa.Column('cache_key', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_ai_responses_cache_key'), 'ai_responses', ['cache_key'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ai_responses_cache_key'), table_name='ai_responses')
+    op.drop_column('ai_responses', 'cache_key')
@@ -1,2 +1,5 @@
 from .user import User
-from .note import Note
\ No newline at end of file
+from .folder import Folder
+from .note import Note, NoteEdit
+from .ai_request import AIRequest, AIResponse
+from .refresh_token import RefreshToken
\ No newline at end of file
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Float
+from sqlalchemy import Column, Computed, Integer, String, Text, DateTime, ForeignKey, JSON, Float, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from app.db.migrations.base import Base
 import enum
 
@@ -21,14 +22,21 @@ class AIRequest(Base):
     type = Column(String, nullable=False)  # 'text' or 'image'
     processing_type = Column(String, nullable=False)  # 'summarize', 'enhance', etc.
     content = Column(Text, nullable=False)
-    status = Column(String, default="pending")
+    # pending -> processing -> completed / failed
+    status = Column(String, default="pending", index=True)
+    error = Column(Text, nullable=True)
+    # Повторы после временных ошибок (пул ML перегружен, LLM недоступна)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    run_after = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Метаданные
     file_name = Column(String, nullable=True)
     file_size = Column(Integer, nullable=True)
     
     user = relationship("User", back_populates="ai_requests")
+    response = relationship("AIResponse", back_populates="request", uselist=False)
 
 class AIResponse(Base):
     __tablename__ = "ai_responses"
@@ -36,6 +44,9 @@ class AIResponse(Base):
     id = Column(Integer, primary_key=True, index=True)
     request_id = Column(Integer, ForeignKey("ai_requests.id"), nullable=False)
     
+    # Хеш контента и конфигурации пайплайна (персистентный уровень кэша)
+    cache_key = Column(String(64), index=True, nullable=True)
+    
     # Результаты обработки
     openrouter_result = Column(Text)
     ml_enhanced_result = Column(Text)
@@ -48,10 +59,23 @@ class AIResponse(Base):
     word_count_original = Column(Integer)
     word_count_processed = Column(Integer)
     
+    # Поисковый вектор: ключевые термины ML-модуля весомее текста результата
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(json_to_tsvector('russian', coalesce(key_terms, '[]'::json), '[\"string\"]'), 'A')"
+        " || setweight(json_to_tsvector('english', coalesce(key_terms, '[]'::json), '[\"string\"]'), 'A')"
+        " || setweight(to_tsvector('russian', coalesce(final_result, '')), 'B')"
+        " || setweight(to_tsvector('english', coalesce(final_result, '')), 'B')",
+        persisted=True
+    ), nullable=True))
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     request = relationship("AIRequest", back_populates="response")
 
+    __table_args__ = (
+        Index("ix_ai_responses_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
 # Добавьте связь в существующую модель User
 # В файле backend/app/db/models/user.py добавьте:
 # ai_requests = relationship("AIRequest", back_populates="user")
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Computed, Integer, String, ForeignKey, Text, DateTime, Index, JSON, UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from app.db.migrations.base import Base
 
 
@@ -10,13 +11,58 @@ class Note(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), index=True, nullable=False)  # ← добавил длину
     content = Column(Text, nullable=False)
+    original_text = Column(Text, nullable=True)
+    # Начало текста без разметки: списки конспектов не читают content
+    snippet = Column(String(200), nullable=False, default="")
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    folder_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
+    # Поисковый вектор (русская и английская морфология), заголовок весомее текста
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A')"
+        " || setweight(to_tsvector('english', coalesce(title, '')), 'A')"
+        " || setweight(to_tsvector('russian', coalesce(content, '')), 'B')"
+        " || setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+        persisted=True
+    ), nullable=True))
+    # Растет при каждом изменении текста; автосохранение проверяет её (409 при расхождении)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Добавляем временные метки
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # NOT NULL: (updated_at, id) - ключ пагинации списков
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     owner = relationship("User", back_populates="notes")
+    folder = relationship("Folder", back_populates="notes")
+
+    __table_args__ = (
+        Index("ix_notes_owner_folder_updated", "owner_id", "folder_id", "updated_at", "id"),
+        Index("ix_notes_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    def __repr__(self):
+        return f"<Note(id={self.id}, title='{self.title}', owner_id={self.owner_id})>"
+
+
+class NoteEdit(Base):
+    """Принятое автосохранение, еще не перенесенное в notes.content.
+
+    Версия конспекта, выданная клиенту, сразу есть в БД (уникальна для
+    конспекта), а сам текст переписывается реже - при сбросе журнала.
+    """
+    __tablename__ = "note_edits"
+
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    # Версия конспекта после этой правки
+    version = Column(Integer, nullable=False)
+    # Список TextOp: [{"offset", "delete", "insert"}, ...]
+    ops = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        UniqueConstraint("note_id", "version", name="uq_note_edits_note_id_version"),
+    )
 
     def __repr__(self):
-        return f"<Note(id={self.id}, title='{self.title}', owner_id={self.owner_id})>"
\ No newline at end of file
+        return f"<NoteEdit(note_id={self.note_id}, version={self.version})>"
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.migrations.base import Base
+
+
+class RefreshToken(Base):
+    """Выданный refresh-токен: хранится только sha256 от jti, сам токен - у клиента"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    jti_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # Все токены одной цепочки ротации (от одного логина) - для отзыва целиком
+    family_id = Column(String(32), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_refresh_tokens_family_id_revoked_at", "family_id", "revoked_at"),
+    )
+
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, user_id={self.user_id}, family_id='{self.family_id}')>"
@@ -18,6 +18,7 @@ class User(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     notes = relationship("Note", back_populates="owner")
+    folders = relationship("Folder", back_populates="owner", passive_deletes=True)
 
     # Новое:
     ai_requests = relationship("AIRequest", back_populates="user")
@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+
+class PoolWaitStats:
+    """Время ожидания соединения из пула (включая установку нового соединения)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.acquired + self.timeouts
+            return {
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3)
+            }
+
+
+class _TimedPoolMixin:
+    """Замеряет, сколько запрос ждал свободного соединения в QueuePool"""
+
+    @property
+    def wait_stats(self) -> PoolWaitStats:
+        # Pool.recreate() создает новый экземпляр через __init__, поэтому лениво
+        stats = self.__dict__.get("_wait_stats")
+        if stats is None:
+            stats = self.__dict__.setdefault("_wait_stats", PoolWaitStats())
+        return stats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - started)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def sync_database_url() -> str:
+    """DATABASE_URL с драйвером psycopg2 (init_db, фоновые задачи в executor)"""
+    url = make_url(settings.DATABASE_URL)
+    return url.set(drivername="postgresql+psycopg2").render_as_string(hide_password=False)
+
+
+def async_database_url() -> str:
+    """DATABASE_URL с драйвером asyncpg (обработчики запросов)"""
+    url = make_url(settings.DATABASE_URL)
+    return url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+def _pool_options(pool_size: int, max_overflow: int) -> Dict[str, Any]:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        # SQL в stdout только при отладочном уровне логирования
+        "echo": settings.LOG_LEVEL.upper() == "DEBUG"
+    }
+
+
+def sync_engine_options() -> Dict[str, Any]:
+    options = ["-c client_encoding=utf8"]
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        options.append(f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}")
+    return {
+        **_pool_options(settings.DB_SYNC_POOL_SIZE, settings.DB_SYNC_MAX_OVERFLOW),
+        "poolclass": TimedQueuePool,
+        "connect_args": {
+            "options": " ".join(options),
+            "application_name": settings.DB_APPLICATION_NAME,
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT_SECONDS
+        }
+    }
+
+
+def async_engine_options() -> Dict[str, Any]:
+    server_settings = {"application_name": settings.DB_APPLICATION_NAME}
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    return {
+        **_pool_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+        "poolclass": TimedAsyncQueuePool,
+        "connect_args": {
+            "server_settings": server_settings,
+            "timeout": settings.DB_CONNECT_TIMEOUT_SECONDS
+        }
+    }
+
+
+def pool_stats(pool: QueuePool) -> Dict[str, Any]:
+    """Состояние пула: занятые/свободные соединения, переполнение и ожидание"""
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # overflow() отрицателен, пока пул не заполнен до pool_size
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout_seconds": pool.timeout()
+    }
+    if isinstance(pool, _TimedPoolMixin):
+        stats["wait"] = pool.wait_stats.stats()
+    return stats
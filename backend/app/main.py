@@ -1,17 +1,57 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from app.core.config import settings
-from app.db.session import init_db
-from app.routers import auth, users, ai
+from app.core.dependencies import get_current_admin
+from app.db.session import init_db, async_engine, db_pool_stats
+from app.routers import auth, users, ai, notes, search
+from app.services.enhancement_pool import EnhancementPoolSaturated
+from app.services.ml_enhancer_service import enhancement_pool
+from app.services.openrouter_service import OpenRouterService, create_openrouter_client
+from app.services.job_queue import JobQueueFull, job_queue
+from app.services.llm_policy import LLMUnavailable
+from app.services.principal_cache import Principal
+from app.services.token_service import refresh_token_sweeper
+from app.services.autosave_buffer import autosave_buffer
+from app.services.history_store import history_writer
+from app.services.image_preprocessor import image_preprocessor
+from app.services.password_hasher import PasswordHashPoolSaturated, password_hasher
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Инициализация базы данных...")
     init_db()
     print("База данных готова!")
+    try:
+        app.state.openrouter = OpenRouterService(create_openrouter_client())
+    except ValueError as e:
+        # Без ключа API поднимается: эндпоинты, которым нужен OpenRouter, отвечают 503
+        print(f"OpenRouter недоступен: {e}")
+        app.state.openrouter = None
+    if settings.USE_ML_ENHANCER and settings.ML_PROCESS_POOL:
+        print("Запуск пула ML-обработки...")
+        await enhancement_pool.start()
+        print(f"Пул ML-обработки готов ({enhancement_pool.max_workers} воркеров)")
+    if app.state.openrouter is not None:
+        await job_queue.start(app.state.openrouter)
+        print(f"Очередь AI-обработки запущена ({job_queue.workers} воркеров)")
+    await refresh_token_sweeper.start()
+    await autosave_buffer.start()
+    await history_writer.start()
     yield
     print("Приложение завершает работу...")
+    await autosave_buffer.shutdown()
+    await refresh_token_sweeper.shutdown()
+    await job_queue.shutdown()
+    # После очереди: дописываем историю запросов, завершившихся при остановке
+    await history_writer.shutdown()
+    enhancement_pool.shutdown()
+    password_hasher.shutdown()
+    image_preprocessor.shutdown()
+    if app.state.openrouter is not None:
+        await app.state.openrouter.aclose()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="University Project API",
@@ -37,11 +77,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(EnhancementPoolSaturated)
+async def enhancement_pool_saturated_handler(request: Request, exc: EnhancementPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailable):
+    # Распознавание изображений без LLM невозможно; текст в этом случае обрабатывается только ML
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(settings.LLM_BREAKER_RESET_SECONDS))}
+    )
+
+@app.exception_handler(PasswordHashPoolSaturated)
+async def password_hash_pool_saturated_handler(request: Request, exc: PasswordHashPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(JobQueueFull)
+async def job_queue_full_handler(request: Request, exc: JobQueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "5"}
+    )
+
 from app.routers import ml  #для связи бэка и мл (соня)
 # Подключаем роутеры
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(ai.router)
+app.include_router(notes.router)
+app.include_router(search.router)
 app.include_router(ml.router) # для связи бэка и мл (соня)
 
 @app.get("/")
@@ -58,3 +133,8 @@ async def health_check():
         "status": "healthy",
         "service": "University Project API"
     }
+
+@app.get("/health/db-pool")
+async def db_pool_health(admin: Principal = Depends(get_current_admin)):
+    """Состояние пулов соединений с БД в этом процессе (только для администраторов)"""
+    return db_pool_stats()
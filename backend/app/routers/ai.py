@@ -1,32 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.db.session import get_db
-from app.core.dependencies import get_current_user
-from app.db.models.user import User
+from app.core.dependencies import get_current_principal, get_current_admin, require_ml_capacity, get_orchestrator, get_openrouter
+from app.services.principal_cache import Principal
 from app.services.ai_orchestrator import AIOrchestrator
-import base64
+from app.services.enhancement_pool import EnhancementPoolSaturated
+from app.services.result_cache import result_cache
+from app.services.job_queue import job_queue, COMPLETED, FAILED
+from app.services.history_store import HistoryService, history_writer, reuse_plan
+from app.services.image_preprocessor import image_preprocessor
+from app.services.llm_policy import LLMUnavailable, llm_policy
+from app.services.image_upload import PDF_MIME_TYPE, ImageData, ImageTooLarge, InvalidImage, read_image_upload
+from app.schemas.history import HistoryEntry, HistoryPage, HistoryRerun
+import asyncio
+import json
 import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
+
+async def _sse(events: AsyncGenerator[Dict[str, Any], None]) -> AsyncGenerator[str, None]:
+    """Форматирует события оркестратора как server-sent events"""
+    async for event in events:
+        data = json.dumps(event["data"], ensure_ascii=False)
+        yield f"event: {event['event']}\ndata: {data}\n\n"
+
+
+async def _read_image(file: UploadFile) -> ImageData:
+    """Читает загруженное изображение кусками; ошибки формата и размера - 400"""
+    try:
+        return await read_image_upload(file)
+    except (InvalidImage, ImageTooLarge) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _read_pages(files: List[UploadFile]) -> List[ImageData]:
+    """Страницы документа по порядку; PDF разворачивается в изображения страниц"""
+    max_pages = settings.DOCUMENT_MAX_PAGES
+    if len(files) > max_pages:
+        raise HTTPException(status_code=400, detail=f"Слишком много страниц: максимум {max_pages}")
+    
+    # Общий лимит проверяется во время чтения: файл читается не больше остатка бюджета
+    max_total = settings.DOCUMENT_MAX_TOTAL_BYTES
+    remaining = max_total
+    too_large = f"Документ слишком большой. Максимальный размер: {max_total // (1024 * 1024)}MB"
+    pages: List[ImageData] = []
+    for file in files:
+        if remaining <= 0:
+            raise HTTPException(status_code=400, detail=too_large)
+        max_bytes = min(settings.IMAGE_UPLOAD_MAX_BYTES, remaining)
+        try:
+            upload = await read_image_upload(file, max_bytes=max_bytes, allow_pdf=True)
+            remaining -= upload.size
+            if upload.mime_type == PDF_MIME_TYPE:
+                pages.extend(await image_preprocessor.split_pdf(upload, max_pages - len(pages)))
+            else:
+                pages.append(upload)
+        except ImageTooLarge as e:
+            if max_bytes < settings.IMAGE_UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=400, detail=too_large)
+            raise HTTPException(status_code=400, detail=f"{file.filename}: {e}")
+        except InvalidImage as e:
+            raise HTTPException(status_code=400, detail=f"{file.filename}: {e}")
+        if len(pages) > max_pages:
+            raise HTTPException(status_code=400, detail=f"Слишком много страниц: максимум {max_pages}")
+    if not pages:
+        raise HTTPException(status_code=400, detail="В документе нет страниц")
+    return pages
+
+
 @router.post("/process-text")
 async def process_text(
     text: str = Form(...),
     processing_type: str = Form(default="enhance"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    stream: bool = Form(default=False),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+    orchestrator: AIOrchestrator = Depends(get_orchestrator),
+    _: None = Depends(require_ml_capacity)
 ):
-    """Обработка текстового запроса"""
+    """Обработка текстового запроса (stream=true - ответ потоком SSE)"""
     try:
         if not text.strip():
             raise HTTPException(status_code=400, detail="Текст не может быть пустым")
-            
-        orchestrator = AIOrchestrator()
-        result = await orchestrator.process_request({
+        
+        request_data = {
             "type": "text",
             "content": text,
-            "processing_type": processing_type
-        })
+            "processing_type": processing_type,
+            "user_id": current_user.id
+        }
+        
+        if stream:
+            return StreamingResponse(
+                _sse(orchestrator.stream_text(request_data)),
+                media_type="text/event-stream",
+                # Без буферизации на прокси, иначе первые токены придут только в конце
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+            
+        result = await orchestrator.process_request(request_data)
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
@@ -35,9 +111,14 @@ async def process_text(
             "processed_text": result["final_text"],
             "key_terms": result.get("key_terms", []),
             "processing_time": result["processing_time"],
+            "cached": result.get("cached", False),
+            # true - LLM недоступна, текст обработан только ML-модулем
+            "degraded": result.get("degraded", False),
             "success": True
         }
         
+    except (HTTPException, EnhancementPoolSaturated, LLMUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -45,30 +126,22 @@ async def process_text(
 async def process_image(
     file: UploadFile = File(...),
     processing_type: str = Form(default="enhance"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+    orchestrator: AIOrchestrator = Depends(get_orchestrator),
+    _: None = Depends(require_ml_capacity)
 ):
     """Обработка изображения"""
     try:
-        # Проверка типа файла
-        allowed_mime_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
-        if file.content_type not in allowed_mime_types:
-            raise HTTPException(status_code=400, detail="Неподдерживаемый формат изображения. Используйте JPEG, PNG, GIF или WebP.")
-        
-        # Проверка размера файла (макс 10MB)
-        contents = await file.read()
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="Файл слишком большой. Максимальный размер: 10MB")
-        
-        # Кодирование в base64
-        encoded_string = base64.b64encode(contents).decode('utf-8')
+        content = await _read_image(file)
         
-        orchestrator = AIOrchestrator()
         result = await orchestrator.process_request({
             "type": "image",
-            "content": f"data:{file.content_type};base64,{encoded_string}",
+            "content": content,
             "processing_type": processing_type,
-            "filename": file.filename
+            "filename": file.filename,
+            "file_size": content.size,
+            "user_id": current_user.id
         })
         
         if not result["success"]:
@@ -80,8 +153,235 @@ async def process_image(
             "key_terms": result.get("key_terms", []),
             "ocr_confidence": result.get("ocr_confidence", 0),
             "processing_time": result["processing_time"],
+            "cached": result.get("cached", False),
+            "degraded": result.get("degraded", False),
             "success": True
         }
         
+    except (HTTPException, EnhancementPoolSaturated, LLMUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/process-document")
+async def process_document(
+    files: List[UploadFile] = File(...),
+    processing_type: str = Form(default="enhance"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+    orchestrator: AIOrchestrator = Depends(get_orchestrator),
+    _: None = Depends(require_ml_capacity)
+):
+    """Многостраничный документ: несколько изображений (или PDF) в порядке страниц.
+    
+    Страницы распознаются параллельно, а текст целиком обрабатывается одним
+    вызовом OpenRouter и ML-модуля.
+    """
+    try:
+        pages = await _read_pages(files)
+        
+        result = await orchestrator.process_request({
+            "type": "document",
+            "content": pages,
+            "processing_type": processing_type,
+            "filename": files[0].filename,
+            "file_size": sum(page.size for page in pages),
+            "user_id": current_user.id
+        })
+        
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
+        
+        ocr_step = result["steps"].get("ocr", {})
+        return {
+            "original_text": ocr_step.get("text", ""),
+            "processed_text": result["final_text"],
+            "key_terms": result.get("key_terms", []),
+            "ocr_confidence": result.get("ocr_confidence", 0),
+            "page_count": ocr_step.get("page_count", len(pages)),
+            "failed_pages": ocr_step.get("failed_pages", []),
+            "processing_time": result["processing_time"],
+            "cached": result.get("cached", False),
+            "degraded": result.get("degraded", False),
+            "success": True
+        }
+        
+    except (HTTPException, EnhancementPoolSaturated, LLMUnavailable):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs/text", status_code=202, dependencies=[Depends(get_openrouter)])
+async def submit_text_job(
+    text: str = Form(...),
+    processing_type: str = Form(default="enhance"),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Ставит обработку текста в очередь и сразу возвращает id задачи"""
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Текст не может быть пустым")
+    
+    job_id = await job_queue.submit(current_user.id, {
+        "type": "text",
+        "content": text,
+        "processing_type": processing_type
+    })
+    return {"job_id": job_id, "status": "pending"}
+
+@router.post("/jobs/image", status_code=202, dependencies=[Depends(get_openrouter)])
+async def submit_image_job(
+    file: UploadFile = File(...),
+    processing_type: str = Form(default="enhance"),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Ставит обработку изображения в очередь и сразу возвращает id задачи"""
+    content = await _read_image(file)
+    
+    job_id = await job_queue.submit(current_user.id, {
+        "type": "image",
+        "content": content,
+        "processing_type": processing_type,
+        "filename": file.filename,
+        "file_size": content.size
+    })
+    return {"job_id": job_id, "status": "pending"}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, current_user: Principal = Depends(get_current_principal)):
+    """Статус задачи и готовые результаты шагов"""
+    job = await job_queue.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: int, current_user: Principal = Depends(get_current_principal)):
+    """Подписка на задачу: SSE-событие при каждом изменении, до завершения"""
+    job = await job_queue.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    
+    async def events():
+        changed = job_queue.subscribe(job_id)
+        try:
+            current = job
+            last_sent = None
+            while True:
+                if current != last_sent:
+                    yield {"event": current["status"], "data": current}
+                    last_sent = current
+                if current["status"] in (COMPLETED, FAILED):
+                    return
+                # БД читается по уведомлению воркера; задачу другого процесса - редким опросом
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=settings.JOB_EVENTS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+                current = await job_queue.get(job_id, current_user.id)
+                if current is None:
+                    return
+        finally:
+            job_queue.unsubscribe(job_id, changed)
+    
+    return StreamingResponse(
+        _sse(events()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/history", response_model=HistoryPage)
+async def list_history(
+    cursor: Optional[int] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """История обработки от новых к старым (без текстов). Следующая страница - по next_cursor"""
+    items, next_cursor = await HistoryService.list_requests(db, current_user.id, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/history/{request_id}", response_model=HistoryEntry)
+async def get_history_entry(
+    request_id: int,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Сохраненный результат обработки вместе с промежуточными шагами"""
+    request = await HistoryService.get_request(db, current_user.id, request_id)
+    if request is None:
+        raise HTTPException(status_code=404, detail="Запрос не найден")
+    return HistoryService.to_entry(request)
+
+@router.post("/history/{request_id}/rerun")
+async def rerun_history_entry(
+    request_id: int,
+    rerun_data: HistoryRerun,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+    orchestrator: AIOrchestrator = Depends(get_orchestrator),
+    _: None = Depends(require_ml_capacity)
+):
+    """Перезапуск с шага from_stage (по умолчанию - с неудавшегося); готовые шаги берутся из истории"""
+    request = await HistoryService.get_request(db, current_user.id, request_id)
+    if request is None:
+        raise HTTPException(status_code=404, detail="Запрос не найден")
+
+    try:
+        reuse_steps = reuse_plan(request, rerun_data.from_stage)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if reuse_steps is None:
+        # Пересчитывать нечего: отдаем сохраненный результат
+        entry = HistoryService.to_entry(request)
+        return {
+            "id": request.id,
+            "processed_text": entry["processed_text"],
+            "key_terms": entry["key_terms"],
+            "processing_time": entry["processing_time"],
+            "cached": True,
+            "success": True
+        }
+
+    result = await orchestrator.process_request({
+        "type": request.type,
+        "content": request.content,
+        "processing_type": request.processing_type,
+        "filename": request.file_name,
+        "user_id": current_user.id,
+        "history_id": request.id,
+        "cache_key": request.response.cache_key if request.response is not None else None
+    }, reuse_steps=reuse_steps)
+
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
+
+    return {
+        "id": request.id,
+        "processed_text": result["final_text"],
+        "key_terms": result.get("key_terms", []),
+        "processing_time": result["processing_time"],
+        "cached": result.get("cached", False),
+        "success": True
+    }
+
+@router.get("/history-writer/stats")
+async def history_writer_stats(admin: Principal = Depends(get_current_admin)):
+    """Метрики фоновой записи истории (только для администраторов)"""
+    return history_writer.stats()
+
+@router.get("/llm/stats")
+async def llm_stats(admin: Principal = Depends(get_current_admin)):
+    """Повторы, хеджирование и автоматы защиты моделей LLM (только для администраторов)"""
+    return llm_policy.stats()
+
+@router.get("/queue/stats")
+async def job_queue_stats(admin: Principal = Depends(get_current_admin)):
+    """Метрики очереди AI-обработки (только для администраторов)"""
+    return job_queue.stats()
+
+@router.get("/cache/stats")
+async def cache_stats(admin: Principal = Depends(get_current_admin)):
+    """Метрики кэша результатов (только для администраторов)"""
+    return result_cache.stats()
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.db.models.user import User
 from app.core.security import create_access_token
-from app.schemas.user import UserCreate, UserResponse, Token, LoginRequest
+from app.schemas.user import UserCreate, UserResponse, Token, LoginRequest, RefreshRequest
 from app.services.auth_service import AuthService
+from app.services.token_service import TokenService
 from app.core.dependencies import get_current_user
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
@@ -14,35 +15,25 @@ router = APIRouter(prefix="/auth", tags=["authentication"])
 @router.post("/register", response_model=UserResponse)
 async def register(
         user_data: UserCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Регистрация нового пользователя
     """
-
-    existing_user = db.query(User).filter(
-        (User.email == user_data.email) | (User.username == user_data.username)
-    ).first()
-
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким email или username уже существует"
-        )
-
-    user = AuthService.create_user(db, user_data)
+    # Проверка на существующего пользователя выполняется в AuthService.create_user
+    user = await AuthService.create_user(db, user_data)
 
     return user
 
 @router.post("/login", response_model=Token)
 async def login(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Аутентификация пользователя и выдача JWT токена
     """
-    user = AuthService.authenticate_user(
+    user = await AuthService.authenticate_user(
         db, form_data.username, form_data.password
     )
 
@@ -63,24 +54,26 @@ async def login(
     access_token = create_access_token(
         data={"sub": user.username}
     )
+    refresh_token = await TokenService.issue_refresh_token(db, user)
 
     return {
         "access_token": access_token,
         "token_type": "bearer",
         "username": user.username,
-        "email": user.email
+        "email": user.email,
+        "refresh_token": refresh_token
     }
 
 
 @router.post("/login-json", response_model=Token)
 async def login_json(
         login_data: LoginRequest,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Аутентификация пользователя через JSON
     """
-    user = AuthService.authenticate_user(
+    user = await AuthService.authenticate_user(
         db, login_data.username, login_data.password
     )
 
@@ -100,15 +93,53 @@ async def login_json(
     access_token = create_access_token(
         data={"sub": user.username}
     )
+    refresh_token = await TokenService.issue_refresh_token(db, user)
 
     return {
         "access_token": access_token,
         "token_type": "bearer",
         "username": user.username,
-        "email": user.email
+        "email": user.email,
+        "refresh_token": refresh_token
     }
 
 
+@router.post("/refresh", response_model=Token)
+async def refresh(
+        refresh_data: RefreshRequest,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Обмен refresh токена на новую пару токенов (старый refresh токен отзывается)
+    """
+    user, refresh_token = await TokenService.rotate_refresh_token(db, refresh_data.refresh_token)
+
+    access_token = create_access_token(
+        data={"sub": user.username}
+    )
+
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "username": user.username,
+        "email": user.email,
+        "refresh_token": refresh_token
+    }
+
+
+@router.post("/logout")
+async def logout(
+        refresh_data: RefreshRequest,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Отзыв refresh токена и всей цепочки его ротации
+    """
+    await TokenService.revoke_token_family(db, refresh_data.refresh_token)
+
+    return {"message": "Выход выполнен"}
+
+
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(
         current_user: User = Depends(get_current_user)
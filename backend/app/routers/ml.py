@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
-from app.services.ml_client import enhance_text
+from typing import List
+from app.services.ml_client import enhance_text, enhance_texts
 
 router = APIRouter(prefix="/ml", tags=["ML Module"])
 
@@ -11,3 +12,11 @@ class TextIn(BaseModel):
 async def process_text(data: TextIn):
     result = await enhance_text(data.text)
     return {"result": result}
+
+class TextsIn(BaseModel):
+    texts: List[str]
+
+@router.post("/process-batch")
+async def process_batch(data: TextsIn):
+    result = await enhance_texts(data.texts)
+    return {"result": result}
@@ -0,0 +1,245 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.core.dependencies import get_current_principal
+from app.db.session import get_db
+from app.schemas.note import (
+    FolderCreate, FolderOut, FolderUpdate,
+    NoteAutosave, NoteBulkDelete, NoteBulkMove, NoteCreate, NoteOut, NotePage, NoteUpdate
+)
+from app.services.autosave_buffer import NoteVersionConflict, autosave_buffer
+from app.services.note_service import NoteService
+from app.services.principal_cache import Principal
+
+router = APIRouter(prefix="/api", tags=["notes"])
+
+
+def _folder_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Папка не найдена"
+    )
+
+
+def _note_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Конспект не найден"
+    )
+
+
+@router.get("/folders/", response_model=List[FolderOut])
+async def list_folders(
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Папки текущего пользователя
+    """
+    return await NoteService.list_folders(db, current_user.id)
+
+
+@router.post("/folders/", response_model=FolderOut)
+async def create_folder(
+        folder_data: FolderCreate,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Создать папку
+    """
+    return await NoteService.create_folder(db, current_user.id, folder_data.name)
+
+
+@router.put("/folders/{folder_id}", response_model=FolderOut)
+async def rename_folder(
+        folder_id: int,
+        folder_data: FolderUpdate,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Переименовать папку
+    """
+    folder = await NoteService.get_folder(db, current_user.id, folder_id)
+    if not folder:
+        raise _folder_not_found()
+
+    folder.name = folder_data.name
+    await db.commit()
+    await db.refresh(folder)
+
+    return folder
+
+
+@router.delete("/folders/{folder_id}")
+async def delete_folder(
+        folder_id: int,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Удалить папку вместе с конспектами
+    """
+    folder = await NoteService.get_folder(db, current_user.id, folder_id)
+    if not folder:
+        raise _folder_not_found()
+
+    await NoteService.delete_folder(db, folder)
+
+    return {"message": "Папка удалена"}
+
+
+@router.get("/folders/{folder_id}/notes/", response_model=NotePage)
+async def list_notes(
+        folder_id: int,
+        cursor: Optional[str] = None,
+        limit: int = Query(default=50, ge=1, le=200),
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Страница конспектов папки (без текста, только начало). Следующая страница - по next_cursor
+    """
+    items, next_cursor = await NoteService.list_notes(db, current_user.id, folder_id, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.post("/folders/{folder_id}/notes/", response_model=NoteOut)
+async def create_note(
+        folder_id: int,
+        note_data: NoteCreate,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Создать конспект в папке
+    """
+    if not await NoteService.get_folder(db, current_user.id, folder_id):
+        raise _folder_not_found()
+
+    return await NoteService.create_note(db, current_user.id, folder_id, note_data)
+
+
+@router.post("/notes/bulk-move")
+async def bulk_move_notes(
+        move_data: NoteBulkMove,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Перенести несколько конспектов в папку
+    """
+    if not await NoteService.get_folder(db, current_user.id, move_data.folder_id):
+        raise _folder_not_found()
+
+    moved = await NoteService.bulk_move(db, current_user.id, move_data.note_ids, move_data.folder_id)
+
+    return {"moved": moved}
+
+
+@router.post("/notes/bulk-delete")
+async def bulk_delete_notes(
+        delete_data: NoteBulkDelete,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Удалить несколько конспектов
+    """
+    deleted = await NoteService.bulk_delete(db, current_user.id, delete_data.note_ids)
+    autosave_buffer.discard(delete_data.note_ids)
+
+    return {"deleted": deleted}
+
+
+@router.get("/notes/{note_id}", response_model=NoteOut)
+async def get_note(
+        note_id: int,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Конспект целиком
+    """
+    note = await NoteService.get_note(db, current_user.id, note_id)
+    if not note:
+        raise _note_not_found()
+
+    # Сброс журнала - только после проверки владельца
+    await autosave_buffer.flush_note(db, note_id)
+    return note
+
+
+@router.put("/notes/{note_id}", response_model=NoteOut)
+async def update_note(
+        note_id: int,
+        note_update: NoteUpdate,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Обновить конспект (название, текст, исходный материал, папку)
+    """
+    note = await NoteService.get_note(db, current_user.id, note_id)
+    if not note:
+        raise _note_not_found()
+
+    # Журнал автосохранений - в той же транзакции, что и изменение
+    await autosave_buffer.fold(db, note_id)
+
+    if note_update.folder_id is not None and note_update.folder_id != note.folder_id:
+        if not await NoteService.get_folder(db, current_user.id, note_update.folder_id):
+            raise _folder_not_found()
+
+    return await NoteService.update_note(db, note, note_update)
+
+
+@router.patch("/notes/{note_id}/autosave")
+async def autosave_note(
+        note_id: int,
+        autosave_data: NoteAutosave,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Автосохранение правками относительно версии base_version (409, если версия устарела)
+    """
+    try:
+        version = await autosave_buffer.apply(
+            db, current_user.id, note_id, autosave_data.base_version, autosave_data.ops
+        )
+    except NoteVersionConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Конспект изменен в другом месте", "version": e.current_version}
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Правка не соответствует тексту конспекта"
+        )
+
+    if version is None:
+        raise _note_not_found()
+
+    return {"version": version}
+
+
+@router.delete("/notes/{note_id}")
+async def delete_note(
+        note_id: int,
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Удалить конспект
+    """
+    note = await NoteService.get_note(db, current_user.id, note_id)
+    if not note:
+        raise _note_not_found()
+
+    await NoteService.delete_note(db, note)
+    autosave_buffer.discard([note_id])
+
+    return {"message": "Конспект удален"}
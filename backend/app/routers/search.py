@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from app.core.dependencies import get_current_principal
+from app.db.session import get_db
+from app.schemas.search import SearchPage
+from app.services.principal_cache import Principal
+from app.services.search_service import SOURCES, SearchService
+
+router = APIRouter(prefix="/api", tags=["search"])
+
+
+@router.get("/search", response_model=SearchPage)
+async def search(
+        q: str = Query(min_length=1, max_length=500),
+        source: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(default=20, ge=1, le=100),
+        current_user: Principal = Depends(get_current_principal),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Поиск по конспектам и результатам AI-обработки (source=note|ai_result - только один вид).
+    Следующая страница - по next_cursor
+    """
+    if source is not None and source not in SOURCES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"source должен быть одним из: {', '.join(SOURCES)}"
+        )
+
+    sources = [source] if source else list(SOURCES)
+    items, next_cursor = await SearchService.search(db, current_user.id, q, sources, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
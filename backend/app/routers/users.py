@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.core.dependencies import get_current_user, get_current_admin
 from app.db.session import get_db
 from app.db.models.user import User
 from app.schemas.user import UserOut, UserUpdate
+from app.services.auth_service import AuthService
+from app.services.principal_cache import Principal, principal_cache
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -21,46 +24,50 @@ async def get_me(current_user: User = Depends(get_current_user)):
 async def update_me(
         user_update: UserUpdate,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Обновить информацию текущего пользователя
     """
     update_data = user_update.dict(exclude_unset=True)
+    old_username = current_user.username
 
     for field, value in update_data.items():
         setattr(current_user, field, value)
 
-    db.commit()
-    db.refresh(current_user)
+    # current_user загружен в той же сессии запроса (общая зависимость get_db)
+    await db.commit()
+    await db.refresh(current_user)
+    principal_cache.invalidate(old_username, current_user.username)
 
     return current_user
 
 
 @router.get("/", response_model=List[UserOut])
 async def get_all_users(
-        admin: User = Depends(get_current_admin),
-        db: Session = Depends(get_db),
+        admin: Principal = Depends(get_current_admin),
+        db: AsyncSession = Depends(get_db),
         skip: int = 0,
         limit: int = 100
 ):
     """
     Получить список всех пользователей (только для администраторов)
     """
-    users = db.query(User).offset(skip).limit(limit).all()
+    result = await db.execute(select(User).order_by(User.id).offset(skip).limit(limit))
+    users = result.scalars().all()
     return users
 
 
 @router.get("/{user_id}", response_model=UserOut)
 async def get_user_by_id(
         user_id: int,
-        admin: User = Depends(get_current_admin),
-        db: Session = Depends(get_db)
+        admin: Principal = Depends(get_current_admin),
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Получить пользователя по ID (только для администраторов)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await AuthService.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -72,21 +79,22 @@ async def get_user_by_id(
 @router.delete("/{user_id}")
 async def delete_user(
         user_id: int,
-        admin: User = Depends(get_current_admin),
-        db: Session = Depends(get_db)
+        admin: Principal = Depends(get_current_admin),
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Удалить пользователя (только для администраторов)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await AuthService.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
 
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    principal_cache.invalidate(user.username)
 
     return {"message": "Пользователь удален"}
 
@@ -94,13 +102,13 @@ async def delete_user(
 @router.patch("/{user_id}/activate")
 async def activate_user(
         user_id: int,
-        admin: User = Depends(get_current_admin),
-        db: Session = Depends(get_db)
+        admin: Principal = Depends(get_current_admin),
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Активировать/деактивировать пользователя (только для администраторов)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await AuthService.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -108,7 +116,8 @@ async def activate_user(
         )
 
     user.is_active = not user.is_active
-    db.commit()
+    await db.commit()
+    principal_cache.invalidate(user.username)
 
     status_text = "активирован" if user.is_active else "деактивирован"
     return {"message": f"Пользователь {status_text}"}
\ No newline at end of file
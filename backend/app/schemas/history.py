@@ -0,0 +1,36 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+
+class HistoryItem(BaseModel):
+    """Элемент истории: без текста запроса и результата"""
+    id: int
+    type: str
+    processing_type: str
+    status: str
+    error: Optional[str] = None
+    file_name: Optional[str] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class HistoryPage(BaseModel):
+    items: List[HistoryItem]
+    # Передается в ?cursor= для следующей страницы; None - страниц больше нет
+    next_cursor: Optional[int] = None
+
+
+class HistoryEntry(HistoryItem):
+    content: str
+    processed_text: Optional[str] = None
+    key_terms: List[str] = []
+    processing_time: Optional[float] = None
+    # Сохраненные промежуточные результаты шагов (ocr, openrouter, ml_enhancement)
+    steps: Dict[str, Any] = {}
+
+
+class HistoryRerun(BaseModel):
+    # Шаг, с которого пересчитать; None - с первого отсутствующего
+    from_stage: Optional[str] = None
@@ -0,0 +1,89 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
+from datetime import datetime
+
+
+class FolderCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=255)
+
+
+class FolderUpdate(BaseModel):
+    name: str = Field(min_length=1, max_length=255)
+
+
+class FolderOut(BaseModel):
+    id: int
+    name: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NoteCreate(BaseModel):
+    title: str = Field(min_length=1, max_length=255)
+    content: str = ""
+    original_text: str = ""
+
+
+class NoteUpdate(BaseModel):
+    title: Optional[str] = Field(default=None, min_length=1, max_length=255)
+    content: Optional[str] = None
+    original_text: Optional[str] = None
+    folder_id: Optional[int] = None
+
+
+class NoteOut(BaseModel):
+    id: int
+    folder_id: Optional[int] = None
+    title: str
+    content: str
+    original_text: Optional[str] = None
+    version: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NoteSummary(BaseModel):
+    """Элемент списка: без content, только начало текста"""
+    id: int
+    folder_id: Optional[int] = None
+    title: str
+    snippet: str
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NotePage(BaseModel):
+    items: List[NoteSummary]
+    # Передается в ?cursor= для следующей страницы; None - страниц больше нет
+    next_cursor: Optional[str] = None
+
+
+class NoteBulkMove(BaseModel):
+    note_ids: List[int] = Field(min_length=1, max_length=1000)
+    folder_id: int
+
+
+class NoteBulkDelete(BaseModel):
+    note_ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class TextOp(BaseModel):
+    """Правка текста: удалить `delete` символов с позиции `offset` и вставить `insert`.
+
+    Позиции - в UTF-16 code units (как индексы строк JavaScript), относительно
+    текста после предыдущих правок.
+    """
+    offset: int = Field(ge=0)
+    delete: int = Field(default=0, ge=0)
+    insert: str = ""
+
+
+class NoteAutosave(BaseModel):
+    base_version: int
+    ops: List[TextOp] = Field(max_length=1000)
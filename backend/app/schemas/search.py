@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+class SearchHit(BaseModel):
+    # note - конспект, ai_result - результат AI-обработки
+    source: str
+    id: int
+    title: str
+    # Фрагменты с найденными словами в <mark>...</mark>
+    highlight: str
+    rank: float
+    created_at: Optional[datetime] = None
+
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
@@ -42,6 +42,11 @@ class Token(BaseModel):
     token_type: str
     username: str
     email: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
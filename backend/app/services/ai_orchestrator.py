@@ -1,42 +1,99 @@
 import asyncio
-from typing import Dict, Any
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Any, List, Optional
 from app.core.config import settings
+from app.services.image_upload import ImageData
+from app.services.llm_policy import LLMUnavailable
 from app.services.openrouter_service import OpenRouterService
 from app.services.ocr_service import OCRService
-from app.services.ml_enhancer_service import MLEnhancerService
+from app.services.ml_enhancer_service import MLEnhancerService, enhancement_pool
+from app.services.enhancement_pool import EnhancementPoolSaturated
+from app.services.result_cache import result_cache
+from app.services.history_store import history_writer
+
+# Граница абзаца в потоке ответа OpenRouter
+PARAGRAPH_SEPARATOR = "\n\n"
+# Граница страниц в тексте документа, собранном из нескольких изображений
+PAGE_SEPARATOR = "\n\n"
+
+# Вызывается после каждого шага пайплайна: (название шага, результат шага)
+StepCallback = Callable[[str, Any], Awaitable[None]]
+
 
 class AIOrchestrator:
     """Оркестратор для координации всех AI сервисов"""
     
-    def __init__(self):
-        self.openrouter = OpenRouterService()
-        self.ocr = OCRService()
+    def __init__(self, openrouter: OpenRouterService):
+        self.openrouter = openrouter
+        self.ocr = OCRService(openrouter)
         self.ml_enhancer = MLEnhancerService()
     
-    async def process_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Основной метод обработки запроса"""
+    async def process_request(self, request_data: Dict[str, Any],
+                              on_step: Optional[StepCallback] = None,
+                              reuse_steps: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Основной метод обработки запроса.
+        
+        reuse_steps - сохраненные результаты шагов (перезапуск из истории):
+        эти шаги не выполняются заново, пересчитываются только остальные.
+        """
         start_time = asyncio.get_event_loop().time()
+        reuse_steps = reuse_steps or {}
+        pipeline_key = None
+        result = {
+            "success": False,
+            "processing_time": 0,
+            "steps": {}
+        }
         
         try:
-            result = {
-                "success": False,
-                "processing_time": 0,
-                "steps": {}
-            }
-            
             # Определяем тип контента
             content_type = request_data["type"]  # 'text' or 'image'
             processing_type = request_data["processing_type"]  # 'summarize', 'enhance', etc.
             content = request_data["content"]
             
+            # Повторная отправка того же контента: весь пайплайн берем из кэша
+            # При перезапуске из истории ключ берется из сохраненной записи:
+            # изображение в БД не хранится, и ключ по content не совпал бы
+            # (без ключа изображение перезапускается мимо кэша: пустой content не его ключ)
+            pipeline_key = request_data.get("cache_key")
+            if pipeline_key is None and content:
+                pipeline_key = result_cache.make_key("pipeline", content, processing_type, type=content_type)
+            cached = None
+            if pipeline_key and not reuse_steps:
+                cached = await result_cache.get(pipeline_key, persistent=True)
+            if cached is not None:
+                result.update(cached)
+                result["cached"] = True
+                # Повтор уже сохраненного результата новую строку истории не создает;
+                # перезапуск записи из истории обновляет ее как обычно
+                if request_data.get("history_id"):
+                    history_writer.record(request_data, result, pipeline_key)
+                return result
+            
             # Шаг 1: Обработка изображения если нужно
-            if content_type == "image":
+            if content_type in ("image", "document") and "ocr" in reuse_steps:
+                result["steps"]["ocr"] = reuse_steps["ocr"]
+                text_to_process = reuse_steps["ocr"]["text"]
+            elif content_type == "document":
+                # Страницы распознаются параллельно, дальше - один текстовый пайплайн на документ
+                ocr_result = await self.ocr_pages(content)
+                result["steps"]["ocr"] = ocr_result
+                if on_step is not None:
+                    await on_step("ocr", ocr_result)
+                
+                if not ocr_result.get("text"):
+                    result["error"] = "Не удалось распознать текст ни на одной странице"
+                    return result
+                
+                text_to_process = ocr_result["text"]
+            elif content_type == "image":
                 if settings.USE_DIRECT_OCR_ENHANCEMENT:
                     ocr_result = await self.ocr.process_image_with_enhancement(content, processing_type)
                 else:
                     ocr_result = await self.ocr.process_image(content)
                 
                 result["steps"]["ocr"] = ocr_result
+                if on_step is not None:
+                    await on_step("ocr", ocr_result)
                 
                 if not ocr_result.get("text"):
                     result["error"] = "Не удалось распознать текст с изображения"
@@ -48,16 +105,38 @@ class AIOrchestrator:
             
             # Шаг 2: Обработка через OpenRouter
             if settings.USE_OPENROUTER and (content_type != "image" or not settings.USE_DIRECT_OCR_ENHANCEMENT):
-                openrouter_result = await self.openrouter.process_text(text_to_process, processing_type)
+                openrouter_key = result_cache.make_key("openrouter", text_to_process, processing_type)
+                openrouter_result = reuse_steps.get("openrouter") or await result_cache.get(openrouter_key)
+                if openrouter_result is None:
+                    try:
+                        openrouter_result = await self.openrouter.process_text(text_to_process, processing_type)
+                        await result_cache.set(openrouter_key, openrouter_result)
+                    except LLMUnavailable as e:
+                        # Запасной путь: без LLM, только ML-модуль над исходным текстом
+                        result["degraded"] = True
+                        result["llm_error"] = str(e)
+            else:
+                openrouter_result = None
+            
+            if openrouter_result is not None:
                 result["steps"]["openrouter"] = openrouter_result
+                if on_step is not None:
+                    await on_step("openrouter", openrouter_result)
                 text_for_ml = openrouter_result
             else:
                 text_for_ml = text_to_process
             
             # Шаг 3: ML улучшение
             if settings.USE_ML_ENHANCER:
-                ml_result = await self.ml_enhancer.process_text(text_for_ml, processing_type)
+                ml_key = result_cache.make_key("ml", text_for_ml, processing_type)
+                ml_result = reuse_steps.get("ml_enhancement") or await result_cache.get(ml_key)
+                if ml_result is None:
+                    ml_result = await self.ml_enhancer.process_text(text_for_ml, processing_type)
+                    if "error" not in ml_result:
+                        await result_cache.set(ml_key, ml_result)
                 result["steps"]["ml_enhancement"] = ml_result
+                if on_step is not None:
+                    await on_step("ml_enhancement", ml_result)
                 final_text = ml_result["processed_text"]
                 key_terms = ml_result.get("key_terms", [])
             else:
@@ -70,13 +149,200 @@ class AIOrchestrator:
             result["key_terms"] = key_terms
             
             # Добавляем статистику
-            if content_type == "image":
+            if content_type in ("image", "document"):
                 result["ocr_confidence"] = result["steps"]["ocr"].get("confidence", 0)
             
+            # Деградировавший результат (ошибка ML или ответ без LLM) не кэшируем
+            if pipeline_key and result_cache.is_cacheable(result):
+                result["processing_time"] = asyncio.get_event_loop().time() - start_time
+                await result_cache.set(pipeline_key, result)
+            
+        except (EnhancementPoolSaturated, LLMUnavailable):
+            # Временные ошибки: 503 для запроса, повтор с паузой для задачи очереди
+            raise
         except Exception as e:
             result["error"] = f"Ошибка оркестрации: {str(e)}"
         
         finally:
             result["processing_time"] = asyncio.get_event_loop().time() - start_time
         
+        # История пишется в фоне пачками; ответ пользователю ее не ждет
+        history_writer.record(request_data, result, pipeline_key)
         return result
+    
+    async def ocr_pages(self, pages: List[ImageData]) -> Dict[str, Any]:
+        """OCR страниц документа параллельно (не больше OCR_BATCH_CONCURRENCY сразу).
+        
+        Порядок страниц сохраняется; текст склеивается с разделителем страниц.
+        Нераспознанные страницы пропускаются и перечисляются в failed_pages.
+        """
+        semaphore = asyncio.Semaphore(settings.OCR_BATCH_CONCURRENCY)
+        
+        async def recognize(page: ImageData) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.ocr.process_image(page)
+        
+        page_results = await asyncio.gather(*(recognize(page) for page in pages))
+        
+        texts = [page["text"] for page in page_results if page.get("text")]
+        failed_pages = [number for number, page in enumerate(page_results, 1) if not page.get("text")]
+        confidences = [page.get("confidence", 0) for page in page_results if page.get("text")]
+        return {
+            "text": PAGE_SEPARATOR.join(texts),
+            "confidence": sum(confidences) / len(confidences) if confidences else 0.0,
+            "page_count": len(pages),
+            "failed_pages": failed_pages,
+            "word_count": sum(len(text.split()) for text in texts),
+            "model_used": settings.OPENROUTER_OCR_MODEL
+        }
+    
+    async def stream_text(self, request_data: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        """Потоковая обработка текста.
+        
+        События:
+            token - очередной фрагмент ответа OpenRouter
+            chunk - готовый результат куска длинного текста (index, total, text)
+            paragraph - ML-улучшенный абзац (по мере завершения абзацев)
+            done - итоговый текст и ключевые термины
+            error - ошибка обработки
+        """
+        start_time = asyncio.get_event_loop().time()
+        content = request_data["content"]
+        processing_type = request_data["processing_type"]
+        # ML-обработка абзацев идет параллельно с приемом токенов
+        paragraph_tasks: List[asyncio.Task] = []
+        # Не больше воркеров пула и заведомо меньше его очереди: длинная заметка
+        # не должна сама упираться в EnhancementPoolSaturated
+        paragraph_semaphore = asyncio.Semaphore(
+            max(1, min(enhancement_pool.max_workers, enhancement_pool.max_pending // 2))
+        )
+        enhanced_paragraphs: List[Dict[str, Any]] = []
+        
+        try:
+            pipeline_key = result_cache.make_key("pipeline", content, processing_type, type="text")
+            cached = await result_cache.get(pipeline_key, persistent=True)
+            if cached is not None:
+                cached["cached"] = True
+                cached["processing_time"] = asyncio.get_event_loop().time() - start_time
+                # Как и в process_request: повтор из кэша историю не дублирует
+                yield {"event": "done", "data": cached}
+                return
+            
+            result = {"success": False, "steps": {}}
+            
+            async def enhance_limited(paragraph: str) -> Dict[str, Any]:
+                async with paragraph_semaphore:
+                    return await self.ml_enhancer.process_text(paragraph, processing_type)
+            
+            def enhance_paragraph(paragraph: str):
+                if settings.USE_ML_ENHANCER and paragraph.strip():
+                    paragraph_tasks.append(asyncio.create_task(enhance_limited(paragraph)))
+            
+            def completed_paragraphs():
+                while paragraph_tasks and paragraph_tasks[0].done():
+                    paragraph_result = paragraph_tasks.pop(0).result()
+                    enhanced_paragraphs.append(paragraph_result)
+                    yield paragraph_result
+            
+            openrouter_result = None
+            if settings.USE_OPENROUTER:
+                openrouter_key = result_cache.make_key("openrouter", content, processing_type)
+                openrouter_result = await result_cache.get(openrouter_key)
+                if openrouter_result is None:
+                    parts: List[str] = []
+                    buffer = ""
+                    if self.openrouter.is_long_text(content):
+                        # Длинный текст: куски обрабатываются параллельно, готовые отдаются сразу
+                        events = self.openrouter.stream_long_text(content, processing_type)
+                    else:
+                        events = (("token", delta) async for delta in self.openrouter.stream_text(content, processing_type))
+                    try:
+                        async for event, delta in events:
+                            if event == "chunk":
+                                yield {"event": "chunk", "data": delta}
+                                continue
+                            parts.append(delta)
+                            yield {"event": "token", "data": {"text": delta}}
+                            
+                            buffer += delta
+                            *paragraphs, buffer = buffer.split(PARAGRAPH_SEPARATOR)
+                            for paragraph in paragraphs:
+                                enhance_paragraph(paragraph)
+                            for paragraph_result in completed_paragraphs():
+                                yield {"event": "paragraph", "data": paragraph_result}
+                    except LLMUnavailable as e:
+                        # Текст ответа уже начат - подменить его нельзя
+                        if parts:
+                            raise
+                        result["degraded"] = True
+                        result["llm_error"] = str(e)
+                    
+                    if not result.get("degraded"):
+                        enhance_paragraph(buffer)
+                        openrouter_result = "".join(parts).strip()
+                        await result_cache.set(openrouter_key, openrouter_result)
+                else:
+                    yield {"event": "token", "data": {"text": openrouter_result}}
+                    for paragraph in openrouter_result.split(PARAGRAPH_SEPARATOR):
+                        enhance_paragraph(paragraph)
+            
+            if openrouter_result is not None:
+                result["steps"]["openrouter"] = openrouter_result
+                text_for_ml = openrouter_result
+            else:
+                # Без OpenRouter (отключен или недоступен) ML-модуль работает с исходным текстом
+                text_for_ml = content
+                for paragraph in content.split(PARAGRAPH_SEPARATOR):
+                    enhance_paragraph(paragraph)
+            
+            while paragraph_tasks:
+                paragraph_result = await paragraph_tasks.pop(0)
+                enhanced_paragraphs.append(paragraph_result)
+                yield {"event": "paragraph", "data": paragraph_result}
+            
+            # Итог собирается из уже улучшенных абзацев, без второго прохода ML по всему
+            # тексту; ключевые термины считаются по всему тексту, а не по отдельным абзацам
+            if settings.USE_ML_ENHANCER:
+                ml_result = {
+                    "processed_text": PARAGRAPH_SEPARATOR.join(
+                        paragraph["processed_text"] for paragraph in enhanced_paragraphs
+                    ),
+                    "key_terms": await self.ml_enhancer.extract_key_terms(text_for_ml),
+                    "stats": {
+                        "word_count": sum(
+                            paragraph.get("stats", {}).get("word_count", 0) for paragraph in enhanced_paragraphs
+                        ),
+                        "paragraphs": len(enhanced_paragraphs)
+                    }
+                }
+                errors = [paragraph["error"] for paragraph in enhanced_paragraphs if "error" in paragraph]
+                if errors:
+                    ml_result["error"] = errors[0]
+                result["steps"]["ml_enhancement"] = ml_result
+                final_text = ml_result["processed_text"]
+                key_terms = ml_result.get("key_terms", [])
+            else:
+                final_text = text_for_ml
+                key_terms = []
+            
+            result["success"] = True
+            result["final_text"] = final_text
+            result["key_terms"] = key_terms
+            result["processing_time"] = asyncio.get_event_loop().time() - start_time
+            
+            if result_cache.is_cacheable(result):
+                await result_cache.set(pipeline_key, result)
+            
+            history_writer.record(request_data, result, pipeline_key)
+            yield {"event": "done", "data": result}
+            
+        except Exception as e:
+            # Ответ уже начат: ошибку (в том числе перегрузку пула) отдаем событием
+            error = f"Ошибка оркестрации: {str(e)}"
+            history_writer.record(request_data, {"success": False, "error": error, "steps": {}}, None)
+            yield {"event": "error", "data": {"error": error}}
+        
+        finally:
+            # Клиент отключился или произошла ошибка: незавершенные абзацы не нужны
+            for task in paragraph_tasks:
+                task.cancel()
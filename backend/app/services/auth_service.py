@@ -1,42 +1,36 @@
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.db.models.user import User
 from app.schemas.user import UserCreate
-
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+from app.services.principal_cache import principal_cache
+from app.services.password_hasher import hash_password, password_hasher, verify_password
 
 
 class AuthService:
     @staticmethod
     def get_password_hash(password: str) -> str:
         """
-        Хеширует пароль с обработкой длинных паролей
+        Хеширует пароль с обработкой длинных паролей (синхронно, для скриптов)
         """
-        if len(password.encode('utf-8')) > 72:
-            import hashlib
-            password = hashlib.sha256(password.encode('utf-8')).hexdigest()
-        return pwd_context.hash(password)
+        return hash_password(password)
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
         """
-        Проверяет пароль с хешем
+        Проверяет пароль с хешем (синхронно, для скриптов)
         """
-        if len(plain_password.encode('utf-8')) > 72:
-            import hashlib
-            plain_password = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
-
-        return pwd_context.verify(plain_password, hashed_password)
+        return verify_password(plain_password, hashed_password)
 
     @staticmethod
-    def create_user(db: Session, user_data: UserCreate) -> User:
+    async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
         """
         Создает нового пользователя в базе данных
         """
-        existing_user = db.query(User).filter(
+        result = await db.execute(select(User).where(
             (User.email == user_data.email) | (User.username == user_data.username)
-        ).first()
+        ))
+        existing_user = result.scalars().first()
 
         if existing_user:
             raise HTTPException(
@@ -44,7 +38,7 @@ class AuthService:
                 detail="Пользователь с таким email или username уже существует"
             )
 
-        hashed_password = AuthService.get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
 
         user = User(
             username=user_data.username,
@@ -53,63 +47,82 @@ class AuthService:
         )
 
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
         return user
 
     @staticmethod
-    def authenticate_user(db: Session, username: str, password: str) -> User | None:
+    async def authenticate_user(db: AsyncSession, username: str, password: str) -> User | None:
         """
         Аутентифицирует пользователя по username и паролю
         """
-        user = db.query(User).filter(User.username == username).first()
+        user = await AuthService.get_user_by_username(db, username)
+        if not user:
+            return None
 
-        if not user or not AuthService.verify_password(password, user.hashed_password):
+        valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+        if not valid:
             return None
 
+        if new_hash:
+            # Хеш создан с устаревшими параметрами argon2 - пересохраняем с текущими
+            user.hashed_password = new_hash
+            await db.commit()
+
         return user
 
     @staticmethod
-    def get_user_by_username(db: Session, username: str) -> User | None:
+    async def get_user_by_username(db: AsyncSession, username: str) -> User | None:
         """
         Получает пользователя по username
         """
-        return db.query(User).filter(User.username == username).first()
+        result = await db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
 
     @staticmethod
-    def get_user_by_email(db: Session, email: str) -> User | None:
+    async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
         """
         Получает пользователя по email
         """
-        return db.query(User).filter(User.email == email).first()
+        result = await db.execute(select(User).where(User.email == email))
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> User | None:
+        """
+        Получает пользователя по ID
+        """
+        return await db.get(User, user_id)
 
     @staticmethod
-    def change_password(db: Session, user: User, new_password: str) -> User:
+    async def change_password(db: AsyncSession, user: User, new_password: str) -> User:
         """
         Изменяет пароль пользователя
         """
-        user.hashed_password = AuthService.get_password_hash(new_password)
-        db.commit()
-        db.refresh(user)
+        user.hashed_password = await password_hasher.hash(new_password)
+        await db.commit()
+        await db.refresh(user)
         return user
 
     @staticmethod
-    def deactivate_user(db: Session, user: User) -> User:
+    async def deactivate_user(db: AsyncSession, user: User) -> User:
         """
         Деактивирует пользователя
         """
         user.is_active = False
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        principal_cache.invalidate(user.username)
         return user
 
     @staticmethod
-    def activate_user(db: Session, user: User) -> User:
+    async def activate_user(db: AsyncSession, user: User) -> User:
         """
         Активирует пользователя
         """
         user.is_active = True
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        principal_cache.invalidate(user.username)
         return user
\ No newline at end of file
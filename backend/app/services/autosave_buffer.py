@@ -0,0 +1,241 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models.note import Note, NoteEdit
+from app.schemas.note import TextOp
+from app.services.note_service import make_snippet
+
+
+class NoteVersionConflict(Exception):
+    """Клиент правил не последнюю версию конспекта (409)"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Версия конспекта изменилась: {current_version}")
+        self.current_version = current_version
+
+
+def apply_text_ops(content: str, ops: List[TextOp]) -> str:
+    """Применяет правки (offset, delete, insert) последовательно.
+
+    Смещения - в UTF-16 code units, как индексы строк в JavaScript, поэтому
+    работаем с байтами utf-16-le. Выход за границы или разрыв суррогатной
+    пары дает ValueError.
+    """
+    buffer = bytearray(content.encode("utf-16-le"))
+    for op in ops:
+        start = op.offset * 2
+        end = start + op.delete * 2
+        if end > len(buffer):
+            raise ValueError("Правка выходит за границы текста")
+        buffer[start:end] = op.insert.encode("utf-16-le")
+    return buffer.decode("utf-16-le")
+
+
+@dataclass
+class _CachedNote:
+    content: str
+    version: int
+
+
+def _parse_ops(ops: List[dict]) -> List[TextOp]:
+    return [TextOp(**op) for op in ops]
+
+
+class AutosaveBuffer:
+    """Автосохранение конспектов правками с редкой перезаписью текста.
+
+    Принятые правки сразу пишутся в журнал note_edits (сотни байт вместо
+    всего текста), поэтому выданная клиенту версия уже есть в БД и видна
+    всем процессам. Текст в notes переписывается при сбросе журнала: фоновая
+    задача сбрасывает правки старше `coalesce_seconds`, обработчики чтения
+    вызывают `flush_note`, а изменения другим путем - `fold` в своей
+    транзакции. Правки одного конспекта упорядочены блокировкой его строки
+    (SELECT ... FOR UPDATE). В памяти процесса - только LRU-копии последних
+    текстов, чтобы не собирать текст из БД на каждую правку. При
+    coalesce_seconds = 0 текст пишется сразу, без журнала.
+    """
+
+    def __init__(self, coalesce_seconds: float, cache_size: int = 1000):
+        self.coalesce_seconds = coalesce_seconds
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, _CachedNote]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        self.applied = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.flush_errors = 0
+
+    async def start(self):
+        if self._tasks or self.coalesce_seconds <= 0:
+            return
+        self._tasks = [asyncio.create_task(self._run())]
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush_all()
+
+    async def apply(self, db: AsyncSession, owner_id: int, note_id: int,
+                    base_version: int, ops: List[TextOp]) -> Optional[int]:
+        """Применяет правки; возвращает новую версию (уже записанную в БД) или None, если конспект не найден"""
+        result = await db.execute(
+            select(Note.owner_id, Note.version).where(Note.id == note_id).with_for_update()
+        )
+        row = result.first()
+        if row is None or row.owner_id != owner_id:
+            return None
+
+        pending = await db.scalar(select(func.max(NoteEdit.version)).where(NoteEdit.note_id == note_id))
+        current = max(row.version, pending or 0)
+        if current != base_version:
+            self.conflicts += 1
+            raise NoteVersionConflict(current)
+
+        content = apply_text_ops(await self._content(db, note_id, row.version, current), ops)
+        version = current + 1
+        if self.coalesce_seconds <= 0:
+            await db.execute(
+                update(Note)
+                .where(Note.id == note_id)
+                .values(content=content, snippet=make_snippet(content), version=version, updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+            self.writes += 1
+        else:
+            db.add(NoteEdit(note_id=note_id, version=version, ops=[op.model_dump() for op in ops]))
+        await db.commit()
+
+        self._remember(note_id, content, version)
+        self.applied += 1
+        return version
+
+    async def fold(self, db: AsyncSession, note_id: int) -> bool:
+        """Переносит журнал конспекта в notes в текущей транзакции; True - есть что сохранить.
+
+        Строка конспекта остается заблокированной до commit вызывающего кода,
+        поэтому между сбросом и его собственным изменением правки не вклиниваются.
+        """
+        # populate_existing: конспект мог быть загружен в сессию до блокировки (проверка
+        # владельца) - берем строку, прочитанную уже под блокировкой
+        note = (await db.execute(
+            select(Note).where(Note.id == note_id).with_for_update().execution_options(populate_existing=True)
+        )).scalar_one_or_none()
+        if note is None:
+            return False
+        result = await db.execute(
+            select(NoteEdit.version, NoteEdit.ops)
+            .where(NoteEdit.note_id == note_id)
+            .order_by(NoteEdit.version)
+        )
+        edits = result.all()
+        if not edits:
+            return False
+
+        # Правки не новее текста (записан напрямую) уже в нем
+        newer = [edit for edit in edits if edit.version > note.version]
+        if newer:
+            last_version = newer[-1].version
+            cached = self._cache.get(note_id)
+            if cached is not None and cached.version == last_version:
+                content = cached.content
+            else:
+                content = note.content
+                for edit in newer:
+                    content = apply_text_ops(content, _parse_ops(edit.ops))
+            note.content = content
+            note.snippet = make_snippet(content)
+            note.version = last_version
+            self.writes += 1
+
+        await db.execute(
+            delete(NoteEdit)
+            .where(NoteEdit.note_id == note_id, NoteEdit.version <= note.version)
+            .execution_options(synchronize_session=False)
+        )
+        return True
+
+    async def flush_note(self, db: AsyncSession, note_id: int):
+        """Записывает накопленные правки конспекта (перед чтением)"""
+        # Без блокировки: у большинства конспектов журнал пуст
+        if await db.scalar(select(NoteEdit.id).where(NoteEdit.note_id == note_id).limit(1)) is None:
+            return
+        if await self.fold(db, note_id):
+            await db.commit()
+
+    async def flush_all(self, older_than: float = 0.0):
+        """Сбрасывает журналы конспектов, чьи правки ждут дольше older_than секунд (правки любых процессов)"""
+        from app.db.session import AsyncSessionLocal
+
+        edited_before = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(NoteEdit.note_id).where(NoteEdit.created_at <= edited_before).distinct()
+            )
+            note_ids = list(result.scalars())
+
+        for note_id in note_ids:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.flush_note(db, note_id)
+            except Exception as e:
+                # Правки остаются в журнале: следующий сброс или чтение повторят запись
+                self.flush_errors += 1
+                print(f"Автосохранение: ошибка записи конспекта {note_id}: {e}")
+
+    def discard(self, note_ids: Iterable[int]):
+        """Забывает копии удаленных конспектов (журнал удаляется каскадно)"""
+        for note_id in note_ids:
+            self._cache.pop(note_id, None)
+
+    async def _content(self, db: AsyncSession, note_id: int, db_version: int, version: int) -> str:
+        """Текст конспекта версии version: копия в памяти или notes.content + журнал"""
+        cached = self._cache.get(note_id)
+        if cached is not None and cached.version == version:
+            self._cache.move_to_end(note_id)
+            return cached.content
+
+        content = await db.scalar(select(Note.content).where(Note.id == note_id))
+        if version > db_version:
+            result = await db.execute(
+                select(NoteEdit.ops)
+                .where(NoteEdit.note_id == note_id, NoteEdit.version > db_version)
+                .order_by(NoteEdit.version)
+            )
+            for ops in result.scalars():
+                content = apply_text_ops(content, _parse_ops(ops))
+        return content
+
+    def _remember(self, note_id: int, content: str, version: int):
+        self._cache[note_id] = _CachedNote(content, version)
+        self._cache.move_to_end(note_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.coalesce_seconds / 2)
+            try:
+                await self.flush_all(older_than=self.coalesce_seconds)
+            except Exception as e:
+                print(f"Автосохранение: ошибка сброса журнала: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached": len(self._cache),
+            "applied": self.applied,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "flush_errors": self.flush_errors
+        }
+
+
+autosave_buffer = AutosaveBuffer(settings.AUTOSAVE_COALESCE_SECONDS)
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+
+class EnhancementPoolSaturated(Exception):
+    """Очередь пула заполнена: запрос нужно быстро отклонить (503)"""
+
+
+class EnhancementPool:
+    """Пул процессов для CPU-bound ML-обработки.
+
+    Обходит GIL: каждый запрос обрабатывается в отдельном процессе, а event
+    loop только ждёт результат. Воркеры прогреваются при старте (initializer
+    загружает словари энхансера), очередь ограничена `max_pending` задачами -
+    при переполнении `run` сразу бросает EnhancementPoolSaturated.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int,
+                 initializer: Optional[Callable[[], None]] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restart_lock = asyncio.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._restarts = 0
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.max_pending
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: форк процесса с запущенным event loop и потоками небезопасен
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer
+        )
+
+    async def _warm(self, executor: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        # Задач столько же, сколько воркеров: пул запускает процессы по требованию
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, _warmup) for _ in range(self.max_workers)
+        ))
+
+    async def start(self):
+        """Создает пул и поднимает все воркеры заранее"""
+        if self._executor is not None:
+            return
+        self._executor = self._create_executor()
+        await self._warm(self._executor)
+
+    async def _restart(self, broken: ProcessPoolExecutor):
+        """Заменяет сломанный пул новым, прогретым так же, как при старте.
+
+        Сломанный пул видят сразу все ожидающие запросы: пересоздает его
+        только первый, остальные находят под блокировкой уже новый пул.
+        """
+        async with self._restart_lock:
+            if self._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+            self._restarts += 1
+            try:
+                await self._warm(self._executor)
+            except Exception as e:
+                # Не прогретый пул все равно рабочий: процессы поднимутся по требованию
+                print(f"Прогрев пересозданного пула ML-обработки: {e}")
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет функцию в пуле с учетом ограничения очереди"""
+        if self._executor is None:
+            raise RuntimeError("Пул ML-обработки не запущен")
+        if self.saturated:
+            self._rejected += 1
+            raise EnhancementPoolSaturated("Сервис ML-обработки перегружен, повторите запрос позже")
+
+        executor = self._executor
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # Воркер упал: пересоздаем пул, чтобы следующие запросы не падали
+            await self._restart(executor)
+            raise
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": self._rejected,
+            "restarts": self._restarts
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def _warmup() -> None:
+    """Пустая задача: нужна только для запуска процесса и его initializer"""
+    return None
@@ -0,0 +1,286 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.db.models.ai_request import AIRequest, AIResponse
+from app.services.result_cache import result_cache
+
+# Шаги пайплайна в порядке выполнения
+STAGES = ("ocr", "openrouter", "ml_enhancement")
+
+
+def fill_response(response: AIResponse, request_data: Dict[str, Any], result: Dict[str, Any],
+                  cache_key: Optional[str]):
+    """Переносит результаты шагов (в том числе частичные) в AIResponse"""
+    steps = result.get("steps", {})
+    if "ocr" in steps:
+        response.ocr_raw_text = (steps["ocr"] or {}).get("text")
+    if "openrouter" in steps:
+        response.openrouter_result = steps["openrouter"]
+    if "ml_enhancement" in steps:
+        response.ml_enhanced_result = (steps["ml_enhancement"] or {}).get("processed_text")
+    response.processing_time = result.get("processing_time")
+    if result.get("success") and not result_cache.is_cacheable(result):
+        # Результат запасного пути (без LLM, ошибка ML) из кэша отдаваться не должен:
+        # PersistentResultStore ищет по cache_key записи с final_result
+        response.cache_key = None
+    elif cache_key is not None:
+        # Нужен и неудачной записи: по нему перезапуск изображения попадает в тот же кэш
+        response.cache_key = cache_key
+
+    if result.get("success"):
+        content = request_data["content"]
+        response.final_result = result["final_text"]
+        response.key_terms = result.get("key_terms", [])
+        response.word_count_original = len(content.split()) if request_data["type"] == "text" else None
+        response.word_count_processed = len(result["final_text"].split())
+
+
+def pipeline_stages(content_type: str) -> List[str]:
+    """Шаги, которые пайплайн выполняет для типа контента при текущих настройках"""
+    stages = ["ocr"] if content_type in ("image", "document") else []
+    if settings.USE_OPENROUTER and (content_type != "image" or not settings.USE_DIRECT_OCR_ENHANCEMENT):
+        stages.append("openrouter")
+    if settings.USE_ML_ENHANCER:
+        stages.append("ml_enhancement")
+    return stages
+
+
+def reuse_plan(request: AIRequest, from_stage: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Сохраненные шаги до from_stage для перезапуска пайплайна.
+
+    Без from_stage пересчет начинается с первого шага, результата которого нет.
+    None - пересчитывать нечего. ValueError - шаг неизвестен или для перезапуска
+    не хватает данных (исходное изображение в БД не хранится).
+    """
+    stages = pipeline_stages(request.type)
+    if not stages:
+        return None
+    steps = stored_steps(request.response)
+    if from_stage is None:
+        missing = [stage for stage in stages if stage not in steps]
+        if not missing and request.status == "completed":
+            return None
+        from_stage = missing[0] if missing else stages[-1]
+    if from_stage not in stages:
+        raise ValueError(f"Неизвестный шаг: {from_stage}")
+
+    reuse = {stage: steps[stage] for stage in stages[:stages.index(from_stage)]}
+    if len(reuse) < stages.index(from_stage):
+        raise ValueError("Нет сохраненных результатов предыдущих шагов")
+    if request.type in ("image", "document") and "ocr" not in reuse:
+        raise ValueError("Исходное изображение не сохраняется: загрузите его заново")
+    return reuse
+
+
+def stored_steps(response: Optional[AIResponse]) -> Dict[str, Any]:
+    """Сохраненные результаты шагов в формате result["steps"] оркестратора"""
+    steps: Dict[str, Any] = {}
+    if response is None:
+        return steps
+    if response.ocr_raw_text is not None:
+        steps["ocr"] = {"text": response.ocr_raw_text}
+    if response.openrouter_result is not None:
+        steps["openrouter"] = response.openrouter_result
+    if response.ml_enhanced_result is not None:
+        steps["ml_enhancement"] = {
+            "processed_text": response.ml_enhanced_result,
+            "key_terms": response.key_terms or []
+        }
+    return steps
+
+
+class HistoryService:
+    @staticmethod
+    async def list_requests(db: AsyncSession, user_id: int, limit: int,
+                            cursor: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Страница истории пользователя от новых запросов к старым.
+
+        Keyset-пагинация по id: без OFFSET и без чтения текстов запросов и результатов.
+        """
+        query = select(
+            AIRequest.id, AIRequest.type, AIRequest.processing_type, AIRequest.status,
+            AIRequest.error, AIRequest.file_name, AIRequest.created_at
+        ).where(AIRequest.user_id == user_id)
+        if cursor is not None:
+            query = query.where(AIRequest.id < cursor)
+
+        result = await db.execute(query.order_by(AIRequest.id.desc()).limit(limit + 1))
+        rows = [dict(row) for row in result.mappings().all()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
+        return rows, next_cursor
+
+    @staticmethod
+    async def get_request(db: AsyncSession, user_id: int, request_id: int) -> Optional[AIRequest]:
+        """
+        Запрос пользователя вместе с результатом (None, если не найден или чужой)
+        """
+        request = await db.scalar(
+            select(AIRequest)
+            .options(selectinload(AIRequest.response))
+            .where(AIRequest.id == request_id, AIRequest.user_id == user_id)
+        )
+        return request
+
+    @staticmethod
+    def to_entry(request: AIRequest) -> Dict[str, Any]:
+        response = request.response
+        return {
+            "id": request.id,
+            "type": request.type,
+            "processing_type": request.processing_type,
+            "status": request.status,
+            "error": request.error,
+            "file_name": request.file_name,
+            "created_at": request.created_at,
+            "content": request.content,
+            "processed_text": response.final_result if response is not None else None,
+            "key_terms": (response.key_terms if response is not None else None) or [],
+            "processing_time": response.processing_time if response is not None else None,
+            "steps": stored_steps(response)
+        }
+
+
+class HistoryWriter:
+    """Запись истории AI-обработки (AIRequest/AIResponse) вне пути запроса.
+
+    Оркестратор только кладет результат в очередь (`record` не ждет БД);
+    фоновая задача собирает записи в пачки до `batch_size` штук или
+    `flush_seconds` и сохраняет пачку одной транзакцией. При переполнении
+    очереди запись отбрасывается - обработка запроса важнее истории.
+    """
+
+    def __init__(self, batch_size: int, flush_seconds: float, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._run())]
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Дописываем то, что успело накопиться
+        if self._queue is not None:
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await self._write(batch)
+
+    def record(self, request_data: Dict[str, Any], result: Dict[str, Any], cache_key: Optional[str]):
+        """Ставит результат в очередь записи; history_id в request_data - обновить существующую запись"""
+        if not self.started or request_data.get("user_id") is None:
+            return
+        if request_data["type"] != "text":
+            # Буферы изображений в очереди не держим: в историю они не пишутся
+            request_data = {**request_data, "content": ""}
+        try:
+            self._queue.put_nowait((request_data, result, cache_key))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch):
+        from app.db.session import AsyncSessionLocal
+
+        try:
+            async with AsyncSessionLocal() as db:
+                updates = {
+                    request_data["history_id"]: (request_data, result, cache_key)
+                    for request_data, result, cache_key in batch if request_data.get("history_id")
+                }
+                if updates:
+                    existing = await db.execute(
+                        select(AIRequest).where(AIRequest.id.in_(updates))
+                    )
+                    for request in existing.scalars():
+                        request_data, result, cache_key = updates[request.id]
+                        response = await db.scalar(
+                            select(AIResponse).where(AIResponse.request_id == request.id)
+                        )
+                        if response is None:
+                            response = AIResponse(request_id=request.id)
+                            db.add(response)
+                        fill_response(response, request_data, result, cache_key)
+                        if result.get("success"):
+                            request.status, request.error = "completed", None
+                        elif request.status != "completed":
+                            # Неудачный перезапуск не портит ранее готовый результат
+                            request.status, request.error = "failed", result.get("error")
+
+                for request_data, result, cache_key in batch:
+                    if request_data.get("history_id"):
+                        continue
+                    request = AIRequest(
+                        user_id=request_data["user_id"],
+                        type=request_data["type"],
+                        processing_type=request_data["processing_type"],
+                        # Изображения не дублируем в БД: достаточно хеша в cache_key и текста OCR
+                        content=request_data["content"] if request_data["type"] == "text" else "",
+                        status="completed" if result.get("success") else "failed",
+                        error=None if result.get("success") else result.get("error"),
+                        file_name=request_data.get("filename"),
+                        file_size=request_data.get("file_size")
+                    )
+                    request.response = AIResponse()
+                    fill_response(request.response, request_data, result, cache_key)
+                    db.add(request)
+
+                await db.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            print(f"История AI-обработки: ошибка записи пачки из {len(batch)}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
+
+
+history_writer = HistoryWriter(
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_seconds=settings.HISTORY_FLUSH_SECONDS,
+    max_pending=settings.HISTORY_MAX_PENDING
+)
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services.image_upload import ImageData, InvalidImage
+
+# Ниже этого качества JPEG текст начинает "плыть" - дальше уменьшаем размер, а не качество
+_MIN_JPEG_QUALITY = 50
+_QUALITY_STEP = 10
+_DOWNSCALE_STEP = 0.75
+# Порог "чернил" для поиска области текста и отступ вокруг нее (доля стороны)
+_INK_THRESHOLD = 160
+_CROP_MARGIN = 0.02
+
+
+def _autocrop(image: Image.Image) -> Image.Image:
+    """Обрезает поля вокруг текста: рамка по темным пикселям на уменьшенной копии"""
+    gray = image.convert("L")
+    preview = gray.copy()
+    preview.thumbnail((512, 512))
+    bbox = preview.point(lambda value: 255 if value < _INK_THRESHOLD else 0).getbbox()
+    if bbox is None:
+        return image
+
+    scale_x = image.width / preview.width
+    scale_y = image.height / preview.height
+    margin_x = int(image.width * _CROP_MARGIN)
+    margin_y = int(image.height * _CROP_MARGIN)
+    box = (
+        max(0, int(bbox[0] * scale_x) - margin_x),
+        max(0, int(bbox[1] * scale_y) - margin_y),
+        min(image.width, int(bbox[2] * scale_x) + margin_x),
+        min(image.height, int(bbox[3] * scale_y) + margin_y)
+    )
+    return image.crop(box)
+
+
+def _encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def preprocess_image(data: memoryview, max_dimension: int, target_bytes: int, quality: int,
+                     grayscale: bool, autocrop: bool) -> Optional[bytes]:
+    """Готовит изображение для vision-модели; None - исходный файл уже не хуже.
+
+    Поворот по EXIF, уменьшение до max_dimension по большей стороне,
+    (опционально) оттенки серого и обрезка полей, затем JPEG: качество
+    снижается до _MIN_JPEG_QUALITY, а если и этого мало - уменьшается размер,
+    пока результат не уложится в target_bytes.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        original_size = source.size
+        # JPEG декодируется сразу в уменьшенном виде (масштабирование DCT) - быстрее и меньше памяти
+        source.draft("L" if grayscale else "RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(source)
+
+    if image.mode in ("RGBA", "LA", "P"):
+        # Прозрачность на белом фоне, иначе прозрачные области станут черными
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    image = image.convert("L" if grayscale else "RGB")
+
+    if autocrop:
+        image = _autocrop(image)
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    encoded = _encode_jpeg(image, quality)
+    while len(encoded) > target_bytes:
+        if quality - _QUALITY_STEP >= _MIN_JPEG_QUALITY:
+            quality -= _QUALITY_STEP
+        else:
+            width, height = int(image.width * _DOWNSCALE_STEP), int(image.height * _DOWNSCALE_STEP)
+            if min(width, height) < 256:
+                break
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        encoded = _encode_jpeg(image, quality)
+
+    if len(encoded) >= data.nbytes and image.size == original_size:
+        return None
+    return encoded
+
+
+# pdfium не потокобезопасен: документы рендерятся по одному
+_pdf_lock = threading.Lock()
+
+
+def render_pdf_pages(data: memoryview, max_pages: int, max_dimension: int, quality: int) -> List[bytes]:
+    """Страницы PDF как JPEG не больше max_dimension по большей стороне (нужен пакет pypdfium2)"""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise InvalidImage("PDF не поддерживается на сервере: загрузите страницы как изображения")
+
+    pages = []
+    with _pdf_lock:
+        try:
+            document = pdfium.PdfDocument(bytes(data))
+        except pdfium.PdfiumError:
+            raise InvalidImage("Не удалось открыть PDF")
+        try:
+            if len(document) > max_pages:
+                raise InvalidImage(f"Слишком много страниц: максимум {max_pages}")
+            for index in range(len(document)):
+                page = document[index]
+                try:
+                    scale = max_dimension / max(page.get_size())
+                    image = page.render(scale=scale).to_pil().convert("RGB")
+                finally:
+                    page.close()
+                pages.append(_encode_jpeg(image, quality))
+        finally:
+            document.close()
+    return pages
+
+
+class ImagePreprocessor:
+    """Предобработка изображений перед OCR в пуле потоков.
+
+    Pillow отпускает GIL на декодировании, ресайзе и кодировании, поэтому
+    потоки работают параллельно и не блокируют event loop. Предобработка -
+    оптимизация, а не обязательный шаг: при переполнении очереди
+    (`max_pending`) или ошибке декодирования отправляется исходный файл.
+    """
+
+    def __init__(self, enabled: bool, max_workers: int, max_pending: int):
+        self.enabled = enabled
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.processed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def config_tag(self) -> Tuple:
+        """Параметры, от которых зависит результат OCR (входят в ключ кэша)"""
+        if not self.enabled:
+            return ()
+        return (
+            settings.IMAGE_OCR_MAX_DIMENSION,
+            settings.IMAGE_OCR_TARGET_BYTES,
+            settings.IMAGE_OCR_JPEG_QUALITY,
+            settings.IMAGE_OCR_GRAYSCALE,
+            settings.IMAGE_OCR_AUTOCROP
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="image-preprocess"
+            )
+        return self._executor
+
+    async def prepare(self, image: ImageData) -> ImageData:
+        """Уменьшенный JPEG для OCR; digest остается от исходного файла (ключ кэша)"""
+        if not self.enabled:
+            return image
+        if self._pending >= self.max_pending:
+            self.skipped += 1
+            return image
+
+        self._pending += 1
+        try:
+            encoded = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), preprocess_image, image.buffer,
+                settings.IMAGE_OCR_MAX_DIMENSION, settings.IMAGE_OCR_TARGET_BYTES,
+                settings.IMAGE_OCR_JPEG_QUALITY, settings.IMAGE_OCR_GRAYSCALE,
+                settings.IMAGE_OCR_AUTOCROP
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"Предобработка изображения: {e}; отправляется исходный файл")
+            return image
+        finally:
+            self._pending -= 1
+
+        self.processed += 1
+        self.bytes_in += image.size
+        if encoded is None:
+            self.bytes_out += image.size
+            return image
+        self.bytes_out += len(encoded)
+        return ImageData(memoryview(encoded), "image/jpeg", image.digest)
+
+    async def split_pdf(self, document: ImageData, max_pages: int) -> List[ImageData]:
+        """Страницы PDF как отдельные изображения (рендер в том же пуле потоков)"""
+        pages = await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), render_pdf_pages, document.buffer, max_pages,
+            settings.IMAGE_OCR_MAX_DIMENSION, settings.IMAGE_OCR_JPEG_QUALITY
+        )
+        return [
+            ImageData(memoryview(page), "image/jpeg", hashlib.sha256(page).hexdigest())
+            for page in pages
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+image_preprocessor = ImagePreprocessor(
+    enabled=settings.IMAGE_PREPROCESS_ENABLED,
+    max_workers=settings.IMAGE_PREPROCESS_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.IMAGE_PREPROCESS_MAX_PENDING
+)
@@ -0,0 +1,120 @@
+import base64
+import binascii
+import hashlib
+from typing import Optional
+
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+PDF_MIME_TYPE = "application/pdf"
+
+# Сигнатуры поддерживаемых форматов: тип определяется по содержимому, а не по заголовку клиента
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class InvalidImage(ValueError):
+    """Файл не является изображением поддерживаемого формата (400)"""
+
+
+class ImageTooLarge(ValueError):
+    """Изображение больше IMAGE_UPLOAD_MAX_BYTES (400)"""
+
+
+def detect_mime_type(head: bytes) -> Optional[str]:
+    """MIME-тип по первым байтам файла (None - формат не поддерживается)"""
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return PDF_MIME_TYPE
+    return None
+
+
+class ImageData:
+    """Загруженное изображение: один буфер байтов на весь пайплайн.
+
+    Байты лежат в bytearray и передаются дальше как memoryview, без копий.
+    SHA-256 считается при чтении, а base64 строится только в `data_url()` -
+    на границе с сетью (запрос к vision-модели, запись задачи в БД).
+    """
+
+    __slots__ = ("buffer", "mime_type", "digest")
+
+    def __init__(self, buffer: memoryview, mime_type: str, digest: str):
+        self.buffer = buffer
+        self.mime_type = mime_type
+        self.digest = digest
+
+    @property
+    def size(self) -> int:
+        return self.buffer.nbytes
+
+    def data_url(self) -> str:
+        """data: URL для отправки по сети; строится заново при каждом вызове, не хранится"""
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.buffer).decode('ascii')}"
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ImageData":
+        mime_type = detect_mime_type(bytes(data[:12]))
+        if mime_type is None or mime_type == PDF_MIME_TYPE:
+            raise InvalidImage("Неподдерживаемый формат изображения. Используйте JPEG, PNG, GIF или WebP.")
+        return cls(memoryview(data), mime_type, hashlib.sha256(data).hexdigest())
+
+    @classmethod
+    def from_data_url(cls, data_url: str) -> "ImageData":
+        """Изображение из data: URL (задачи очереди хранят его в ai_requests.content)"""
+        encoded = data_url.split(",", 1)[1] if data_url.startswith("data:") else data_url
+        try:
+            return cls.from_bytes(bytearray(base64.b64decode(encoded, validate=True)))
+        except binascii.Error:
+            raise InvalidImage("Некорректные данные изображения")
+
+    def __repr__(self) -> str:
+        return f"ImageData({self.mime_type}, {self.size} bytes, {self.digest[:12]})"
+
+
+async def read_image_upload(file: UploadFile,
+                            max_bytes: Optional[int] = None,
+                            chunk_size: Optional[int] = None,
+                            allow_pdf: bool = False) -> ImageData:
+    """Читает загрузку кусками в один буфер.
+
+    Размер проверяется до чтения (если клиент его сообщил) и после каждого
+    куска, поэтому слишком большой файл не читается целиком. Формат
+    проверяется по сигнатуре первого куска; PDF принимается только при
+    allow_pdf (его страницы затем рендерятся в изображения).
+    """
+    max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+    chunk_size = chunk_size or settings.IMAGE_UPLOAD_CHUNK_BYTES
+    too_large = ImageTooLarge(f"Файл слишком большой. Максимальный размер: {max_bytes // (1024 * 1024)}MB")
+
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    buffer = bytearray()
+    digest = hashlib.sha256()
+    mime_type = None
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        if mime_type is None:
+            mime_type = detect_mime_type(chunk[:12])
+            if mime_type is None or (mime_type == PDF_MIME_TYPE and not allow_pdf):
+                raise InvalidImage("Неподдерживаемый формат изображения. Используйте JPEG, PNG, GIF или WebP.")
+        if len(buffer) + len(chunk) > max_bytes:
+            raise too_large
+        buffer += chunk
+        digest.update(chunk)
+
+    if mime_type is None:
+        raise InvalidImage("Пустой файл")
+    return ImageData(memoryview(buffer), mime_type, digest.hexdigest())
@@ -0,0 +1,435 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import or_
+
+from app.core.config import settings
+from app.services.ai_orchestrator import AIOrchestrator
+from app.services.enhancement_pool import EnhancementPoolSaturated
+from app.services.image_upload import ImageData
+from app.services.llm_policy import LLMUnavailable
+from app.services.openrouter_service import OpenRouterService
+from app.services.result_cache import result_cache
+
+# Статусы AIRequest
+PENDING = "pending"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Слишком много необработанных задач: новую нужно отклонить (503)"""
+
+
+class JobQueue:
+    """Очередь AI-обработки поверх таблицы ai_requests.
+
+    Задача - строка AIRequest со статусом pending. Воркеры (asyncio-задачи
+    процесса) забирают её через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько процессов uvicorn могут разбирать одну очередь без дублей.
+    Результаты шагов пишутся в AIResponse по мере готовности. Задачи
+    переживают перезапуск: зависшие в processing возвращаются в очередь
+    при старте и затем периодически (воркер другого процесса мог упасть).
+    Временные ошибки не проваливают задачу: она возвращается в pending с
+    экспоненциальной паузой (run_after), пока не исчерпаны max_attempts.
+    """
+
+    def __init__(self, workers: int, max_pending: int, poll_interval: float, stale_seconds: int,
+                 max_attempts: int, retry_backoff: float, retry_backoff_max: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Подписчики на изменения задач (SSE): job_id -> события подписчиков
+        self._subscribers: Dict[int, Set[asyncio.Event]] = {}
+        self._orchestrator: Optional[AIOrchestrator] = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, openrouter: OpenRouterService):
+        if self._tasks:
+            return
+        self._orchestrator = AIOrchestrator(openrouter)
+        await _run_db(_requeue_stale, self.stale_seconds)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._requeue_loop()))
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: int, request_data: Dict[str, Any]) -> int:
+        """Сохраняет задачу и сразу возвращает её id"""
+        if await _run_db(_count_pending) >= self.max_pending:
+            raise JobQueueFull("Очередь обработки переполнена, повторите запрос позже")
+        job_id = await _run_db(_create_job, user_id, request_data)
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        return await _run_db(_get_job, job_id, user_id)
+
+    def subscribe(self, job_id: int) -> asyncio.Event:
+        """Событие взводится, когда воркер этого процесса меняет задачу"""
+        changed = asyncio.Event()
+        self._subscribers.setdefault(job_id, set()).add(changed)
+        return changed
+
+    def unsubscribe(self, job_id: int, changed: asyncio.Event):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(changed)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _notify(self, job_id: int):
+        for changed in self._subscribers.get(job_id, ()):
+            changed.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await _run_db(_claim_job)
+                if job is not None:
+                    self._notify(job["id"])
+                    await self._process(job)
+                    continue
+            except Exception as e:
+                # Ошибка одной итерации (БД недоступна и т.п.) не должна останавливать воркер;
+                # задача, оставшаяся в processing, вернется в очередь через _requeue_loop
+                print(f"Очередь AI-обработки: {e}")
+
+            # Задачи других процессов подхватываются по таймауту
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _requeue_loop(self):
+        """Периодически возвращает в очередь задачи, брошенные упавшими процессами"""
+        while True:
+            await asyncio.sleep(self.stale_seconds / 2)
+            try:
+                if await _run_db(_requeue_stale, self.stale_seconds):
+                    self._wakeup.set()
+            except Exception as e:
+                print(f"Очередь AI-обработки: возврат зависших задач: {e}")
+
+    async def _process(self, job: Dict[str, Any]):
+        job_id = job["id"]
+
+        async def on_step(step: str, value: Any):
+            await _run_db(_save_step, job_id, step, value)
+            self._notify(job_id)
+
+        try:
+            request_data = job["request_data"]
+            if request_data["type"] == "image":
+                # Декодируем data: URL один раз, дальше пайплайн работает с буфером
+                request_data["content"] = ImageData.from_data_url(request_data["content"])
+            # user_id не передаем: строка запроса уже есть, дубль в кэше не нужен
+            result = await self._orchestrator.process_request(request_data, on_step=on_step)
+        except (EnhancementPoolSaturated, LLMUnavailable) as e:
+            if await _run_db(_retry_job, job_id, str(e), self.max_attempts,
+                             self.retry_backoff, self.retry_backoff_max):
+                self.retried += 1
+            else:
+                self.failed += 1
+            self._notify(job_id)
+            return
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        if result["success"]:
+            request_data = job["request_data"]
+            # Результат запасного пути в ai_responses пишется без ключа кэша
+            cache_key = result_cache.make_key(
+                "pipeline", request_data["content"], request_data["processing_type"],
+                type=request_data["type"]
+            ) if result_cache.is_cacheable(result) else None
+            await _run_db(_complete_job, job_id, result, cache_key)
+            self.completed += 1
+        else:
+            await _run_db(_fail_job, job_id, result.get("error", "Unknown error"))
+            self.failed += 1
+        self._notify(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried
+        }
+
+
+async def _run_db(fn, *args):
+    return await asyncio.get_event_loop().run_in_executor(None, fn, *args)
+
+
+def _serialize(request, response) -> Dict[str, Any]:
+    data = {
+        "job_id": request.id,
+        "status": request.status,
+        "type": request.type,
+        "processing_type": request.processing_type,
+        "file_name": request.file_name,
+        "error": request.error,
+        "created_at": request.created_at.isoformat() if request.created_at else None,
+        "updated_at": request.updated_at.isoformat() if request.updated_at else None,
+        "steps": {}
+    }
+    if response is not None:
+        if response.ocr_raw_text is not None:
+            data["steps"]["ocr"] = {"text": response.ocr_raw_text}
+        if response.openrouter_result is not None:
+            data["steps"]["openrouter"] = response.openrouter_result
+        if response.ml_enhanced_result is not None:
+            data["steps"]["ml_enhancement"] = {"processed_text": response.ml_enhanced_result}
+        if request.status == COMPLETED:
+            data["processed_text"] = response.final_result
+            data["key_terms"] = response.key_terms or []
+            data["processing_time"] = response.processing_time
+    return data
+
+
+def _count_pending() -> int:
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        return db.query(AIRequest).filter(AIRequest.status == PENDING).count()
+    finally:
+        db.close()
+
+
+def _create_job(user_id: int, request_data: Dict[str, Any]) -> int:
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        request = AIRequest(
+            user_id=user_id,
+            type=request_data["type"],
+            processing_type=request_data["processing_type"],
+            # Задача должна пережить перезапуск: изображение хранится в строке как data: URL
+            content=request_data["content"].data_url() if request_data["type"] == "image"
+            else request_data["content"],
+            status=PENDING,
+            file_name=request_data.get("filename"),
+            file_size=request_data.get("file_size")
+        )
+        db.add(request)
+        db.commit()
+        return request.id
+    finally:
+        db.close()
+
+
+def _claim_job() -> Optional[Dict[str, Any]]:
+    """Забирает самую старую задачу; заблокированные другими воркерами пропускаются"""
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        # Задачи, отложенные после временной ошибки, ждут своего run_after
+        request = db.query(AIRequest).filter(
+            AIRequest.status == PENDING,
+            or_(AIRequest.run_after.is_(None), AIRequest.run_after <= datetime.now(timezone.utc))
+        ).order_by(AIRequest.id).with_for_update(skip_locked=True).first()
+        if request is None:
+            db.rollback()
+            return None
+
+        # Условный UPDATE: без SKIP LOCKED (не Postgres) задачу может забрать только один воркер
+        claimed = db.query(AIRequest).filter(
+            AIRequest.id == request.id,
+            AIRequest.status == PENDING
+        ).update({"status": PROCESSING}, synchronize_session=False)
+        if not claimed:
+            db.rollback()
+            return None
+
+        job = {
+            "id": request.id,
+            "request_data": {
+                "type": request.type,
+                "content": request.content,
+                "processing_type": request.processing_type,
+                "filename": request.file_name
+            }
+        }
+        db.commit()
+        return job
+    finally:
+        db.close()
+
+
+def _get_response(db, job_id: int):
+    from app.db.models.ai_request import AIResponse
+
+    response = db.query(AIResponse).filter(AIResponse.request_id == job_id).first()
+    if response is None:
+        response = AIResponse(request_id=job_id)
+        db.add(response)
+    return response
+
+
+def _save_step(job_id: int, step: str, value: Any):
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        response = _get_response(db, job_id)
+        if step == "ocr":
+            response.ocr_raw_text = value.get("text")
+        elif step == "openrouter":
+            response.openrouter_result = value
+        elif step == "ml_enhancement":
+            response.ml_enhanced_result = value.get("processed_text")
+            response.key_terms = value.get("key_terms", [])
+        # Обновляем updated_at: задача жива
+        db.query(AIRequest).filter(AIRequest.id == job_id).update({"status": PROCESSING})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _complete_job(job_id: int, result: Dict[str, Any], cache_key: Optional[str]):
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        request = db.get(AIRequest, job_id)
+        response = _get_response(db, job_id)
+        steps = result.get("steps", {})
+        response.cache_key = cache_key
+        if "ocr" in steps:
+            response.ocr_raw_text = steps["ocr"].get("text")
+        if "openrouter" in steps:
+            response.openrouter_result = steps["openrouter"]
+        if "ml_enhancement" in steps:
+            response.ml_enhanced_result = steps["ml_enhancement"].get("processed_text")
+        response.final_result = result["final_text"]
+        response.key_terms = result.get("key_terms", [])
+        response.processing_time = result.get("processing_time")
+        response.word_count_original = len(request.content.split()) if request.type == "text" else None
+        response.word_count_processed = len(result["final_text"].split())
+        request.status = COMPLETED
+        request.error = None
+        _release_content(request)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _fail_job(job_id: int, error: str):
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        request = db.get(AIRequest, job_id)
+        request.status = FAILED
+        request.error = error
+        _release_content(request)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _retry_job(job_id: int, error: str, max_attempts: int, backoff: float, backoff_max: float) -> bool:
+    """Возвращает задачу в очередь после временной ошибки; False - попытки исчерпаны, задача провалена"""
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        request = db.get(AIRequest, job_id)
+        request.attempts = (request.attempts or 0) + 1
+        request.error = error
+        if request.attempts >= max_attempts:
+            request.status = FAILED
+            _release_content(request)
+            db.commit()
+            return False
+        delay = min(backoff * 2 ** (request.attempts - 1), backoff_max)
+        request.status = PENDING
+        request.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def _release_content(request):
+    """Изображение нужно только до завершения задачи: data: URL не держим в таблице"""
+    if request.type == "image":
+        request.content = ""
+
+
+def _requeue_stale(stale_seconds: int) -> int:
+    """Возвращает в очередь задачи, брошенные упавшими воркерами; результат - их число"""
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)
+    db = SessionLocal()
+    try:
+        requeued = db.query(AIRequest).filter(
+            AIRequest.status == PROCESSING,
+            AIRequest.updated_at < stale_before
+        ).update({"status": PENDING}, synchronize_session=False)
+        db.commit()
+        return requeued
+    finally:
+        db.close()
+
+
+def _get_job(job_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    from app.db.session import SessionLocal
+    from app.db.models.ai_request import AIRequest
+
+    db = SessionLocal()
+    try:
+        request = db.query(AIRequest).filter(
+            AIRequest.id == job_id,
+            AIRequest.user_id == user_id
+        ).first()
+        if request is None:
+            return None
+        return _serialize(request, request.response)
+    finally:
+        db.close()
+
+
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    max_pending=settings.JOB_QUEUE_MAX_PENDING,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    stale_seconds=settings.JOB_STALE_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_backoff=settings.JOB_RETRY_BACKOFF_SECONDS,
+    retry_backoff_max=settings.JOB_RETRY_BACKOFF_MAX_SECONDS
+)
@@ -0,0 +1,284 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+import openai
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Состояния автомата защиты модели
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMUnavailable(Exception):
+    """Ни одна модель цепочки не ответила (ошибки, таймауты или открытые автоматы)"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Временная ошибка: повтор или другая модель могут помочь"""
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _describe(error: Optional[BaseException]) -> str:
+    if error is None:
+        return "автоматы защиты открыты"
+    # У таймаута пустой текст - показываем тип
+    return str(error) or type(error).__name__
+
+
+def parse_models(value: str) -> List[str]:
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+class CircuitBreaker:
+    """Автомат защиты модели: после `failure_threshold` ошибок подряд модель
+    пропускается `reset_seconds`, затем пропускается один пробный вызов."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        # В half-open пробный вызов уже идет - остальные ждут его результата;
+        # если он так и не завершился (отмена), через reset_seconds пускаем следующий
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных вызовов модели"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CallPolicy:
+    """Политика вызовов LLM: таймаут, повторы, хеджирование, автомат и запасные модели.
+
+    Для каждой модели цепочки (основная, затем запасные): таймаут на вызов,
+    до `max_retries` повторов временных ошибок (429, 5xx, таймаут, сеть) с
+    экспоненциальной задержкой и полным jitter. Если вызов идет дольше p95
+    модели, параллельно запускается второй (hedged) - берется первый ответ.
+    Модель с открытым автоматом пропускается сразу. Если цепочка исчерпана -
+    LLMUnavailable, и вызывающий код переходит на запасной путь (только ML).
+    """
+
+    def __init__(self, timeout_seconds: float, max_retries: int, backoff_base_seconds: float,
+                 backoff_max_seconds: float, hedge_enabled: bool, hedge_min_samples: int,
+                 breaker_failures: int, breaker_reset_seconds: float, latency_window: int = 200):
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.latency_window = latency_window
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.unavailable = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(self.breaker_failures, self.breaker_reset_seconds)
+        return self._breakers[model]
+
+    def latency(self, model: str) -> LatencyTracker:
+        if model not in self._latency:
+            self._latency[model] = LatencyTracker(self.latency_window)
+        return self._latency[model]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        tracker = self.latency(model)
+        if not self.hedge_enabled or len(tracker.samples) < self.hedge_min_samples:
+            return None
+        return tracker.percentile(0.95)
+
+    async def _attempt(self, call: Callable[[str], Awaitable[T]], model: str) -> T:
+        """Один вызов с таймаутом; при долгом ответе - второй параллельный вызов"""
+        started = time.monotonic()
+        first = asyncio.ensure_future(asyncio.wait_for(call(model), self.timeout_seconds))
+        tasks = [first]
+        try:
+            hedge_delay = self._hedge_delay(model)
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    self.hedged += 1
+                    tasks.append(asyncio.ensure_future(asyncio.wait_for(call(model), self.timeout_seconds)))
+
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    break
+                pending = [task for task in tasks if not task.done()]
+                if not pending:
+                    # Все вызовы упали - отдаем ошибку первого
+                    raise first.exception()
+                tasks = pending
+
+            if winner is not first:
+                self.hedge_wins += 1
+            self.latency(model).add(time.monotonic() - started)
+            return winner.result()
+        finally:
+            for task in tasks + [first]:
+                task.cancel()
+
+    async def call(self, call: Callable[[str], Awaitable[T]], models: List[str]) -> T:
+        """Вызов call(model) по цепочке моделей"""
+        last_error: Optional[BaseException] = None
+        for position, model in enumerate(models):
+            breaker = self.breaker(model)
+            if not breaker.allow():
+                continue
+            if position > 0:
+                self.fallbacks += 1
+
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = await self._attempt(call, model)
+                except Exception as e:
+                    last_error = e
+                    if not is_retryable(e):
+                        # Ошибка запроса (400, 401, 404...): повтор той же модели не поможет,
+                        # и на доступность модели она не указывает
+                        break
+                    breaker.record_failure()
+                    if attempt == self.max_retries or not breaker.allow():
+                        break
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                breaker.record_success()
+                return result
+
+        self.unavailable += 1
+        raise LLMUnavailable(f"LLM недоступна ({', '.join(models)}): {_describe(last_error)}")
+
+    async def stream(self, call: Callable[[str], AsyncGenerator[T, None]],
+                     models: List[str]) -> AsyncGenerator[T, None]:
+        """Потоковый вызов по цепочке моделей.
+
+        Повтор и переход на другую модель возможны только до первого
+        фрагмента: после него ошибка передается вызывающему коду.
+        """
+        last_error: Optional[BaseException] = None
+        for position, model in enumerate(models):
+            breaker = self.breaker(model)
+            if not breaker.allow():
+                continue
+            if position > 0:
+                self.fallbacks += 1
+
+            for attempt in range(self.max_retries + 1):
+                started = time.monotonic()
+                stream = call(model)
+                try:
+                    first = await asyncio.wait_for(stream.__anext__(), self.timeout_seconds)
+                except StopAsyncIteration:
+                    breaker.record_success()
+                    return
+                except Exception as e:
+                    await stream.aclose()
+                    last_error = e
+                    if not is_retryable(e):
+                        break
+                    breaker.record_failure()
+                    if attempt == self.max_retries or not breaker.allow():
+                        break
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+
+                breaker.record_success()
+                self.latency(model).add(time.monotonic() - started)
+                try:
+                    yield first
+                    async for item in stream:
+                        yield item
+                finally:
+                    await stream.aclose()
+                return
+
+        self.unavailable += 1
+        raise LLMUnavailable(f"LLM недоступна ({', '.join(models)}): {_describe(last_error)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "unavailable": self.unavailable,
+            "models": {
+                model: {
+                    "state": breaker.state,
+                    "failures": breaker.failures,
+                    "trips": breaker.trips,
+                    "p95_seconds": self.latency(model).percentile(0.95)
+                }
+                for model, breaker in self._breakers.items()
+            }
+        }
+
+
+llm_policy = CallPolicy(
+    timeout_seconds=settings.LLM_CALL_TIMEOUT_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    backoff_base_seconds=settings.LLM_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.LLM_BACKOFF_MAX_SECONDS,
+    hedge_enabled=settings.LLM_HEDGE_ENABLED,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    breaker_failures=settings.LLM_BREAKER_FAILURES,
+    breaker_reset_seconds=settings.LLM_BREAKER_RESET_SECONDS
+)
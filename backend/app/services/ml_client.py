@@ -1,4 +1,5 @@
 import httpx
+from typing import List
 
 ML_URL = "http://ml_module:8001"  # имя контейнера ML в docker-compose
 
@@ -11,3 +12,15 @@ async def enhance_text(text: str) -> str:
         )
         response.raise_for_status()
         return response.json()["enhanced"]
+
+
+async def enhance_texts(texts: List[str]) -> List[str]:
+    """Пакетное улучшение: один запрос вместо запроса на каждую заметку"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{ML_URL}/enhance/batch",
+            json={"texts": texts},
+            timeout=120
+        )
+        response.raise_for_status()
+        return response.json()["enhanced"]
@@ -1,17 +1,22 @@
 import asyncio
 import sys
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import re
 from collections import Counter
+from app.core.config import settings
+from app.services.enhancement_pool import EnhancementPool, EnhancementPoolSaturated
 
 # Добавляем путь к ML модулю
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../..', 'ml_module'))
 
 try:
     from text_enhancer import AdvancedTextEnhancer
+    from text_tokenizer import SENTENCE_PATTERN
 except ImportError:
     # Fallback если ML модуль недоступен
+    SENTENCE_PATTERN = re.compile(r'[^.!?]+')
+
     class AdvancedTextEnhancer:
         def process_text(self, text):
             return {
@@ -20,6 +25,56 @@ except ImportError:
                 "stats": {"word_count": len(text.split())}
             }
 
+# Энхансер процесса-воркера пула (создается в initializer)
+_worker_enhancer: Optional[AdvancedTextEnhancer] = None
+
+
+def _init_worker():
+    """Прогрев воркера: загружаем словари и паттерны до первого запроса"""
+    global _worker_enhancer
+    _worker_enhancer = AdvancedTextEnhancer()
+
+
+def _enhance(enhancer: AdvancedTextEnhancer, text: str) -> Dict[str, Any]:
+    """Обработанный текст и ключевые термины (process_text модуля возвращает только текст)"""
+    result = enhancer.process_text(text)
+    if isinstance(result, dict):
+        # Запасной энхансер без ML модуля
+        return result
+    return {
+        "processed_text": result,
+        "key_terms": enhancer.extract_key_terms(text),
+        "stats": {"word_count": len(text.split())}
+    }
+
+
+def _enhance_in_worker(text: str) -> Dict[str, Any]:
+    if _worker_enhancer is None:
+        _init_worker()
+    return _enhance(_worker_enhancer, text)
+
+
+def _key_terms(enhancer: AdvancedTextEnhancer, text: str) -> List[str]:
+    """Только ключевые термины, без повторной обработки текста"""
+    if not hasattr(enhancer, "extract_key_terms"):
+        # Запасной энхансер без ML модуля
+        return []
+    return enhancer.extract_key_terms(text)
+
+
+def _key_terms_in_worker(text: str) -> List[str]:
+    if _worker_enhancer is None:
+        _init_worker()
+    return _key_terms(_worker_enhancer, text)
+
+
+enhancement_pool = EnhancementPool(
+    max_workers=settings.ML_POOL_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.ML_POOL_MAX_PENDING,
+    initializer=_init_worker
+)
+
+
 class MLEnhancerService:
     """Сервис для интеграции ML модуля"""
     
@@ -37,26 +92,24 @@ class MLEnhancerService:
                     "error": "Пустой текст"
                 }
             
-            # Используем ML модуль для обработки
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.enhancer.process_text(text)
-            )
+            # Используем ML модуль для обработки: в пуле процессов, если он запущен
+            if enhancement_pool.started:
+                result = await enhancement_pool.run(_enhance_in_worker, text)
+            else:
+                result = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    _enhance, self.enhancer, text
+                )
             
             # Адаптируем результат под нашу структуру
-            if isinstance(result, dict):
-                return {
-                    "processed_text": result.get("processed_text", text),
-                    "key_terms": result.get("key_terms", []),
-                    "stats": result.get("stats", {})
-                }
-            else:
-                return {
-                    "processed_text": result,
-                    "key_terms": [],
-                    "stats": {"word_count": len(text.split())}
-                }
+            return {
+                "processed_text": result.get("processed_text", text),
+                "key_terms": result.get("key_terms", []),
+                "stats": result.get("stats", {})
+            }
                 
+        except EnhancementPoolSaturated:
+            raise
         except Exception as e:
             return {
                 "processed_text": text,
@@ -64,3 +117,20 @@ class MLEnhancerService:
                 "stats": {},
                 "error": f"ML обработка ошибка: {str(e)}"
             }
+    
+    async def extract_key_terms(self, text: str) -> List[str]:
+        """Ключевые термины текста без его повторной обработки (текст уже улучшен по абзацам)"""
+        try:
+            if not text or not text.strip():
+                return []
+            if enhancement_pool.started:
+                return await enhancement_pool.run(_key_terms_in_worker, text)
+            return await asyncio.get_event_loop().run_in_executor(
+                None,
+                _key_terms, self.enhancer, text
+            )
+        except EnhancementPoolSaturated:
+            raise
+        except Exception as e:
+            print(f"ML обработка: ключевые термины: {e}")
+            return []
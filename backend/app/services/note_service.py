@@ -0,0 +1,186 @@
+import base64
+import html
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.folder import Folder
+from app.db.models.note import Note
+from app.schemas.note import NoteCreate, NoteUpdate
+
+SNIPPET_LENGTH = 200
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+# Колонки элемента списка: content и original_text не читаются
+_SUMMARY_COLUMNS = (Note.id, Note.folder_id, Note.title, Note.snippet, Note.created_at, Note.updated_at)
+
+
+def make_snippet(content: str) -> str:
+    """Начало текста конспекта без HTML-разметки"""
+    text = _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", content or ""))).strip()
+    return text[:SNIPPET_LENGTH]
+
+
+def encode_cursor(updated_at: datetime, note_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{note_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        updated_at, note_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(note_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор"
+        )
+
+
+class NoteService:
+    @staticmethod
+    async def list_folders(db: AsyncSession, owner_id: int) -> List[Folder]:
+        """
+        Папки пользователя
+        """
+        result = await db.execute(
+            select(Folder).where(Folder.owner_id == owner_id).order_by(Folder.id)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_folder(db: AsyncSession, owner_id: int, folder_id: int) -> Folder | None:
+        """
+        Папка пользователя по ID (None, если не найдена или чужая)
+        """
+        folder = await db.get(Folder, folder_id)
+        if folder is None or folder.owner_id != owner_id:
+            return None
+        return folder
+
+    @staticmethod
+    async def create_folder(db: AsyncSession, owner_id: int, name: str) -> Folder:
+        folder = Folder(name=name, owner_id=owner_id)
+        db.add(folder)
+        await db.commit()
+        await db.refresh(folder)
+        return folder
+
+    @staticmethod
+    async def delete_folder(db: AsyncSession, folder: Folder):
+        """
+        Удаляет папку вместе с конспектами одним запросом на таблицу
+        """
+        await db.execute(delete(Note).where(Note.folder_id == folder.id))
+        await db.delete(folder)
+        await db.commit()
+
+    @staticmethod
+    async def list_notes(
+            db: AsyncSession,
+            owner_id: int,
+            folder_id: int,
+            limit: int,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Страница конспектов папки от новых к старым.
+
+        Keyset-пагинация по (updated_at, id): каждая страница - поиск по индексу
+        ix_notes_owner_folder_updated, без OFFSET и без чтения content.
+        """
+        query = select(*_SUMMARY_COLUMNS).where(
+            Note.owner_id == owner_id,
+            Note.folder_id == folder_id
+        )
+        if cursor:
+            query = query.where(tuple_(Note.updated_at, Note.id) < decode_cursor(cursor))
+
+        result = await db.execute(
+            query.order_by(Note.updated_at.desc(), Note.id.desc()).limit(limit + 1)
+        )
+        rows = [dict(row) for row in result.mappings().all()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+        return rows, next_cursor
+
+    @staticmethod
+    async def get_note(db: AsyncSession, owner_id: int, note_id: int) -> Note | None:
+        """
+        Конспект пользователя по ID (None, если не найден или чужой)
+        """
+        note = await db.get(Note, note_id)
+        if note is None or note.owner_id != owner_id:
+            return None
+        return note
+
+    @staticmethod
+    async def create_note(db: AsyncSession, owner_id: int, folder_id: int, note_data: NoteCreate) -> Note:
+        note = Note(
+            title=note_data.title,
+            content=note_data.content,
+            original_text=note_data.original_text,
+            snippet=make_snippet(note_data.content),
+            owner_id=owner_id,
+            folder_id=folder_id
+        )
+        db.add(note)
+        await db.commit()
+        await db.refresh(note)
+        return note
+
+    @staticmethod
+    async def update_note(db: AsyncSession, note: Note, note_update: NoteUpdate) -> Note:
+        update_data = note_update.model_dump(exclude_unset=True)
+
+        for field, value in update_data.items():
+            setattr(note, field, value)
+        if "content" in update_data:
+            note.snippet = make_snippet(note.content)
+        note.version = note.version + 1
+
+        await db.commit()
+        await db.refresh(note)
+        return note
+
+    @staticmethod
+    async def delete_note(db: AsyncSession, note: Note):
+        await db.delete(note)
+        await db.commit()
+
+    @staticmethod
+    async def bulk_move(db: AsyncSession, owner_id: int, note_ids: List[int], folder_id: int) -> int:
+        """
+        Переносит конспекты пользователя в папку одним UPDATE; возвращает число перенесенных
+        """
+        result = await db.execute(
+            update(Note)
+            .where(Note.owner_id == owner_id, Note.id.in_(note_ids))
+            .values(folder_id=folder_id)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
+
+    @staticmethod
+    async def bulk_delete(db: AsyncSession, owner_id: int, note_ids: List[int]) -> int:
+        """
+        Удаляет конспекты пользователя одним DELETE; возвращает число удаленных
+        """
+        result = await db.execute(
+            delete(Note)
+            .where(Note.owner_id == owner_id, Note.id.in_(note_ids))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
@@ -1,31 +1,53 @@
-import base64
 import asyncio
 from app.core.config import settings
+from app.services.image_preprocessor import image_preprocessor
+from app.services.image_upload import ImageData
+from app.services.llm_policy import LLMUnavailable
 from app.services.openrouter_service import OpenRouterService
+from app.services.result_cache import result_cache
 from typing import Dict, Any
 
 class OCRService:
     """OCR сервис через OpenRouter Vision модели"""
     
-    def __init__(self):
-        self.openrouter = OpenRouterService()
+    def __init__(self, openrouter: OpenRouterService):
+        self.openrouter = openrouter
     
-    async def process_image(self, image_data: str) -> Dict[str, Any]:
+    async def process_image(self, image: ImageData) -> Dict[str, Any]:
         """Обработка изображения через OpenRouter"""
         try:
+            # Одно и то же фото слайда загружают многие студенты: OCR кэшируется
+            # по содержимому изображения, независимо от типа дальнейшей обработки
+            cache_key = result_cache.make_image_key(
+                "ocr", image.digest, preprocess=list(image_preprocessor.config_tag)
+            )
+            cached = await result_cache.get(cache_key)
+            if cached is not None:
+                cached["cached"] = True
+                return cached
+            
             # Промпт для OCR
             ocr_prompt = "Точно распознай весь текст на этом изображении. Верни только распознанный текст без форматирования и комментариев."
             
-            extracted_text = await self.openrouter.process_image_with_text(image_data, ocr_prompt)
+            # Предобработка только при промахе кэша: уменьшенный JPEG вместо исходного фото
+            prepared = await image_preprocessor.prepare(image)
+            extracted_text = await self.openrouter.process_image_with_text(prepared, ocr_prompt)
             
-            return {
+            ocr_result = {
                 "text": extracted_text,
                 "confidence": 0.95,
                 "word_count": len(extracted_text.split()),
                 "language": "ru",
                 "model_used": settings.OPENROUTER_OCR_MODEL
             }
+            if extracted_text:
+                await result_cache.set(cache_key, ocr_result)
+            
+            return ocr_result
             
+        except LLMUnavailable:
+            # Недоступность LLM временная: решает вызывающий код (очередь повторит задачу)
+            raise
         except Exception as e:
             return {
                 "text": "",
@@ -34,7 +56,7 @@ class OCRService:
                 "word_count": 0
             }
     
-    async def process_image_with_enhancement(self, image_data: str, enhancement_type: str) -> Dict[str, Any]:
+    async def process_image_with_enhancement(self, image: ImageData, enhancement_type: str) -> Dict[str, Any]:
         """Прямая обработка изображения с улучшением"""
         try:
             enhancement_prompts = {
@@ -44,7 +66,8 @@ class OCRService:
             }
             
             prompt = enhancement_prompts.get(enhancement_type, "Распознай текст на изображении:")
-            processed_text = await self.openrouter.process_image_with_text(image_data, prompt)
+            prepared = await image_preprocessor.prepare(image)
+            processed_text = await self.openrouter.process_image_with_text(prepared, prompt)
             
             return {
                 "text": processed_text,
@@ -53,6 +76,8 @@ class OCRService:
                 "enhancement_type": enhancement_type
             }
             
+        except LLMUnavailable:
+            raise
         except Exception as e:
             return {
                 "text": "",
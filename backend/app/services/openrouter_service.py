@@ -1,65 +1,229 @@
 import openai
 import asyncio
+import importlib.util
+import httpx
 from app.core.config import settings
-from typing import AsyncGenerator
-import base64
+from app.services.image_upload import ImageData
+from app.services.llm_policy import LLMUnavailable, llm_policy, parse_models
+from app.services.text_chunker import estimate_tokens, split_into_chunks
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+
+def create_openrouter_client() -> openai.AsyncOpenAI:
+    """Создает асинхронный клиент OpenRouter с общим пулом соединений.
+
+    Клиент один на всё приложение: создается в lifespan и закрывается при
+    остановке, соединения переиспользуются между запросами (keep-alive).
+    """
+    if not settings.OPENROUTER_API_KEY or settings.OPENROUTER_API_KEY == "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":
+        raise ValueError("OPENROUTER_API_KEY не настроен в .env файле")
+
+    # HTTP/2 только если установлен пакет h2
+    http2 = settings.OPENROUTER_HTTP2 and importlib.util.find_spec("h2") is not None
+
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENROUTER_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(settings.OPENROUTER_TIMEOUT, connect=10.0)
+    )
+
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENROUTER_API_KEY,  # Берем из настроек
+        base_url=settings.OPENROUTER_BASE_URL,
+        http_client=http_client,
+        # Повторы выполняет llm_policy (с jitter и автоматом защиты), а не SDK
+        max_retries=0
+    )
+
 
 class OpenRouterService:
-    def __init__(self):
-        if not settings.OPENROUTER_API_KEY or settings.OPENROUTER_API_KEY == "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":
-            raise ValueError("OPENROUTER_API_KEY не настроен в .env файле")
+    def __init__(self, client: openai.AsyncOpenAI):
+        self.client = client
+        self.model = settings.OPENROUTER_MODEL
+        # Цепочки моделей: основная, затем запасные (см. llm_policy)
+        self.models = [self.model, *parse_models(settings.OPENROUTER_FALLBACK_MODELS)]
+        self.ocr_models = [settings.OPENROUTER_OCR_MODEL, *parse_models(settings.OPENROUTER_OCR_FALLBACK_MODELS)]
+        # Ограничение одновременных запросов к OpenRouter на процесс
+        self.semaphore = asyncio.Semaphore(settings.OPENROUTER_MAX_CONCURRENCY)
     
-        self.client = openai.OpenAI(
-            api_key=settings.OPENROUTER_API_KEY,  # Берем из настроек
-            base_url="https://openrouter.ai/api/v1"
-        )
+    async def aclose(self):
+        await self.client.close()
     
-    async def process_text(self, text: str, processing_type: str) -> str:
-        """Обработка текста через OpenRouter"""
-        try:
-            prompts = {
-                "summarize": f"Сократи следующий учебный конспект, сохраняя ключевые идеи и факты. Верни только сокращенный текст без комментариев:\n\n{text}",
-                "enhance": f"Улучши структуру и читаемость этого учебного конспекта. Сделай его более организованным и понятным. Верни результат в формате HTML с заголовками, списками и выделением ключевых моментов:\n\n{text}",
-                "extract_terms": f"Выдели ключевые термины и понятия из этого учебного конспекта:\n\n{text}"
+    @staticmethod
+    def _text_messages(text: str, processing_type: str) -> List[Dict[str, str]]:
+        prompts = {
+            "summarize": f"Сократи следующий учебный конспект, сохраняя ключевые идеи и факты. Верни только сокращенный текст без комментариев:\n\n{text}",
+            "enhance": f"Улучши структуру и читаемость этого учебного конспекта. Сделай его более организованным и понятным. Верни результат в формате HTML с заголовками, списками и выделением ключевых моментов:\n\n{text}",
+            "extract_terms": f"Выдели ключевые термины и понятия из этого учебного конспекта:\n\n{text}"
+        }
+        
+        prompt = prompts.get(processing_type, text)
+        
+        return [
+            {
+                "role": "system", 
+                "content": "Ты - помощник для обработки учебных конспектов. Возвращай только обработанный текст без дополнительных комментариев."
+            },
+            {
+                "role": "user", 
+                "content": prompt
             }
-            
-            prompt = prompts.get(processing_type, text)
-            
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "Ты - помощник для обработки учебных конспектов. Возвращай только обработанный текст без дополнительных комментариев."
-                        },
-                        {
-                            "role": "user", 
-                            "content": prompt
-                        }
-                    ],
+        ]
+    
+    @staticmethod
+    def _reduce_messages(parts: List[str], processing_type: str) -> List[Dict[str, str]]:
+        joined = "\n\n---\n\n".join(parts)
+        prompts = {
+            "summarize": f"Ниже - краткие содержания последовательных частей одного учебного конспекта. Объедини их в одно связное краткое содержание без повторов, сохраняя порядок изложения. Верни только текст:\n\n{joined}",
+            "extract_terms": f"Ниже - ключевые термины, выделенные из последовательных частей одного учебного конспекта. Объедини их в один список без повторов:\n\n{joined}"
+        }
+        return [
+            {
+                "role": "system",
+                "content": "Ты - помощник для обработки учебных конспектов. Возвращай только обработанный текст без дополнительных комментариев."
+            },
+            {
+                "role": "user",
+                "content": prompts[processing_type]
+            }
+        ]
+    
+    @staticmethod
+    def is_long_text(text: str) -> bool:
+        """Текст обрабатывается по частям (map-reduce), а не одним запросом"""
+        return estimate_tokens(text) > settings.LONG_TEXT_THRESHOLD_TOKENS
+    
+    async def _complete(self, messages: List[Dict[str, str]]) -> str:
+        async def create(model: str) -> str:
+            async with self.semaphore:
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
                     max_tokens=4000,
                     temperature=0.3
                 )
-            )
-            
             return response.choices[0].message.content.strip()
+        
+        return await llm_policy.call(create, self.models)
+    
+    async def _stream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
+        async def create(model: str) -> AsyncGenerator[str, None]:
+            async with self.semaphore:
+                stream = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=4000,
+                    temperature=0.3,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+        
+        async for delta in llm_policy.stream(create, self.models):
+            yield delta
+    
+    async def process_text(self, text: str, processing_type: str) -> str:
+        """Обработка текста через OpenRouter (длинный текст - по частям)"""
+        try:
+            if self.is_long_text(text):
+                parts: List[str] = []
+                async for event, data in self.stream_long_text(text, processing_type):
+                    if event == "token":
+                        parts.append(data)
+                return "".join(parts).strip()
+            
+            return await self._complete(self._text_messages(text, processing_type))
             
+        except LLMUnavailable:
+            raise
         except Exception as e:
             raise Exception(f"OpenRouter ошибка: {str(e)}")
     
-    async def process_image_with_text(self, image_data: str, text_prompt: str) -> str:
-        """Обработка изображения через OpenRouter Vision"""
+    async def stream_text(self, text: str, processing_type: str) -> AsyncGenerator[str, None]:
+        """Потоковая обработка текста: фрагменты ответа отдаются по мере генерации"""
         try:
-            # Безопасное извлечение base64 данных
-            if image_data.startswith('data:'):
-                image_data = image_data.split(',')[1]
+            async for delta in self._stream(self._text_messages(text, processing_type)):
+                yield delta
             
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.chat.completions.create(
-                    model=settings.OPENROUTER_OCR_MODEL,
+        except LLMUnavailable:
+            raise
+        except Exception as e:
+            raise Exception(f"OpenRouter ошибка: {str(e)}")
+    
+    async def _map_chunks(self, chunks: List[str], processing_type: str) -> AsyncGenerator[Tuple[int, str], None]:
+        """Обрабатывает куски параллельно (не больше LONG_TEXT_MAX_CONCURRENCY); отдает по готовности"""
+        semaphore = asyncio.Semaphore(settings.LONG_TEXT_MAX_CONCURRENCY)
+        
+        async def process_chunk(index: int, chunk: str) -> Tuple[int, str]:
+            async with semaphore:
+                return index, await self._complete(self._text_messages(chunk, processing_type))
+        
+        tasks = [asyncio.create_task(process_chunk(index, chunk)) for index, chunk in enumerate(chunks)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _reduce_groups(self, parts: List[str], processing_type: str) -> List[str]:
+        """Сворачивает частичные результаты группами, пока они не поместятся в один запрос"""
+        budget = settings.LONG_TEXT_CHUNK_TOKENS
+        while len(parts) > 1 and estimate_tokens("".join(parts)) > budget:
+            groups: List[List[str]] = [[]]
+            for part in parts:
+                if groups[-1] and estimate_tokens("".join(groups[-1] + [part])) > budget:
+                    groups.append([])
+                groups[-1].append(part)
+            if len(groups) == len(parts):
+                # Каждая часть сама по себе на пределе бюджета - дальше не сжать
+                break
+            parts = await asyncio.gather(*(
+                self._complete(self._reduce_messages(group, processing_type)) if len(group) > 1
+                else asyncio.sleep(0, result=group[0])
+                for group in groups
+            ))
+        return list(parts)
+    
+    async def stream_long_text(self, text: str, processing_type: str) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Map-reduce для длинного текста.
+        
+        Текст делится на куски по LONG_TEXT_CHUNK_TOKENS по границам
+        предложений, куски обрабатываются параллельно, затем результаты
+        сводятся одним запросом (для enhance - просто склеиваются по порядку).
+        События:
+            ("chunk", {"index", "total", "text"}) - готов очередной кусок
+            ("token", str) - фрагмент итогового текста
+        """
+        chunks = split_into_chunks(text, settings.LONG_TEXT_CHUNK_TOKENS)
+        results: List[Optional[str]] = [None] * len(chunks)
+        async for index, chunk_result in self._map_chunks(chunks, processing_type):
+            results[index] = chunk_result
+            yield "chunk", {"index": index, "total": len(chunks), "text": chunk_result}
+        
+        if processing_type not in ("summarize", "extract_terms") or len(results) == 1:
+            # Улучшенные куски сами по себе - части итогового текста
+            yield "token", "\n\n".join(results)
+            return
+        
+        parts = await self._reduce_groups(results, processing_type)
+        async for delta in self._stream(self._reduce_messages(parts, processing_type)):
+            yield "token", delta
+    
+    async def process_image_with_text(self, image: ImageData, text_prompt: str) -> str:
+        """Обработка изображения через OpenRouter Vision"""
+        async def create(model: str) -> str:
+            async with self.semaphore:
+                response = await self.client.chat.completions.create(
+                    model=model,
                     messages=[
                         {
                             "role": "user",
@@ -68,7 +232,8 @@ class OpenRouterService:
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:image/jpeg;base64,{image_data}"
+                                        # base64 строится здесь, на границе с сетью
+                                        "url": image.data_url()
                                     }
                                 }
                             ]
@@ -76,11 +241,12 @@ class OpenRouterService:
                     ],
                     max_tokens=2000
                 )
-            )
-            
             return response.choices[0].message.content.strip()
+        
+        try:
+            return await llm_policy.call(create, self.ocr_models)
             
+        except LLMUnavailable:
+            raise
         except Exception as e:
             raise Exception(f"Ошибка обработки изображения: {str(e)}")
-
-
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM
+)
+
+
+class PasswordHashPoolSaturated(Exception):
+    """Очередь хеширования паролей заполнена: запрос нужно быстро отклонить (503)"""
+
+
+def _prepare_password(password: str) -> str:
+    # Длинные пароли предварительно сворачиваются в sha256 (совместимость со старыми хешами)
+    if len(password.encode('utf-8')) > 72:
+        password = hashlib.sha256(password.encode('utf-8')).hexdigest()
+    return password
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(_prepare_password(password))
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(_prepare_password(password), hashed_password)
+
+
+def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверяет пароль; если хеш создан с устаревшими параметрами (needs_update) - возвращает новый"""
+    return pwd_context.verify_and_update(_prepare_password(password), hashed_password)
+
+
+class PasswordHasher:
+    """Пул потоков для argon2.
+
+    argon2-cffi отпускает GIL на время вычисления хеша, поэтому потоки
+    работают параллельно, а event loop только ждет результат. Очередь
+    ограничена `max_pending` задачами - при переполнении запрос сразу
+    получает PasswordHashPoolSaturated, а не копится в памяти.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="argon2"
+            )
+        return self._executor
+
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise PasswordHashPoolSaturated("Сервис аутентификации перегружен, повторите запрос позже")
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_and_update_password, password, hashed_password)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": self._rejected
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
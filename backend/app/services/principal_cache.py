@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.db.models.user import User
+from app.services.result_cache import LRUCache
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Личность пользователя из токена: хватает обработчикам, которым не нужна ORM-модель"""
+    id: int
+    username: str
+    is_active: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin)
+        )
+
+
+class PrincipalCache:
+    """Короткоживущий LRU username -> Principal.
+
+    Снимает запрос к users с каждого аутентифицированного запроса. Изменения
+    флагов пользователя должны вызывать `invalidate`; в других процессах
+    устаревшая запись живет не дольше PRINCIPAL_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self.memory = LRUCache(
+            max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+            max_bytes=settings.PRINCIPAL_CACHE_MAX_ENTRIES * 1024,
+            ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+        )
+
+    def get(self, username: str) -> Optional[Principal]:
+        return self.memory.get(username)
+
+    def set(self, principal: Principal):
+        self.memory.set(principal.username, principal)
+
+    def invalidate(self, *usernames: Optional[str]):
+        for username in usernames:
+            if username:
+                self.memory.delete(username)
+
+    def stats(self) -> Dict[str, int]:
+        return self.memory.stats()
+
+
+principal_cache = PrincipalCache()
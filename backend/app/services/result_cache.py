@@ -0,0 +1,242 @@
+import asyncio
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.services.image_upload import ImageData
+
+# Меняется при изменении логики пайплайна, чтобы не отдавать устаревшие результаты
+# 2: из ai_responses больше не отдаются результаты запасного пути, ML возвращает термины
+PIPELINE_VERSION = "2"
+
+
+def _content_digest(content: Union[str, ImageData, List[ImageData]]) -> str:
+    # У изображений хеш уже посчитан при загрузке; документ - хеши страниц по порядку
+    if isinstance(content, ImageData):
+        return content.digest
+    if isinstance(content, list):
+        return hashlib.sha256("".join(page.digest for page in content).encode("ascii")).hexdigest()
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """In-process LRU с TTL и ограничением по числу записей и объему"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        # Старое значение убираем до проверки размера: иначе слишком большой
+        # новый результат оставил бы под ключом устаревший
+        if key in self._data:
+            self._remove(key)
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        self._data[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._bytes += size
+
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        if key in self._data:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class PersistentResultStore:
+    """Персистентный уровень кэша: готовые результаты в ai_responses"""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        from app.db.session import SessionLocal
+        from app.db.models.ai_request import AIResponse
+        from app.services.history_store import stored_steps
+
+        created_after = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+        db = SessionLocal()
+        try:
+            response = db.query(AIResponse).filter(
+                AIResponse.cache_key == key,
+                AIResponse.final_result.isnot(None),
+                AIResponse.created_at >= created_after
+            ).order_by(AIResponse.id.desc()).first()
+        except Exception:
+            self.errors += 1
+            return None
+        finally:
+            db.close()
+
+        if response is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return {
+            "success": True,
+            "final_text": response.final_result,
+            "key_terms": response.key_terms or [],
+            "steps": stored_steps(response)
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+class ResultCache:
+    """Контентно-адресуемый кэш результатов AIOrchestrator.
+
+    Ключ - хеш от (контент, тип обработки, модели, конфигурация пайплайна).
+    Сначала проверяется LRU в памяти процесса, затем (если включено)
+    таблица ai_responses.
+    """
+
+    def __init__(self):
+        self.memory = LRUCache(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS
+        )
+        self.persistent = (
+            PersistentResultStore(settings.RESULT_CACHE_PERSISTENT_TTL_SECONDS)
+            if settings.RESULT_CACHE_PERSISTENT else None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return settings.RESULT_CACHE_ENABLED
+
+    @staticmethod
+    def make_key(stage: str, content: Union[str, ImageData, List[ImageData]],
+                 processing_type: str = "", **extra: Any) -> str:
+        """Ключ стадии пайплайна (или всего пайплайна для stage='pipeline')"""
+        payload = {
+            "stage": stage,
+            "content": _content_digest(content),
+            "processing_type": processing_type,
+            "model": settings.OPENROUTER_MODEL,
+            "ocr_model": settings.OPENROUTER_OCR_MODEL,
+            "config": [
+                settings.USE_OPENROUTER,
+                settings.USE_ML_ENHANCER,
+                settings.USE_DIRECT_OCR_ENHANCEMENT,
+                PIPELINE_VERSION
+            ],
+            **extra
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_cacheable(result: Dict[str, Any]) -> bool:
+        """Полный результат пайплайна: без запасного пути (LLM недоступна) и без ошибки ML"""
+        return bool(
+            result.get("success")
+            and not result.get("degraded")
+            and "error" not in (result.get("steps", {}).get("ml_enhancement") or {})
+        )
+
+    @staticmethod
+    def make_image_key(stage: str, image_digest: str, **extra: Any) -> str:
+        """Ключ стадии, зависящей только от изображения (OCR): без типа обработки и текстовой модели"""
+        payload = {
+            "stage": stage,
+            "image": image_digest,
+            "ocr_model": settings.OPENROUTER_OCR_MODEL,
+            "version": PIPELINE_VERSION,
+            **extra
+        }
+        raw = json.dumps(payload, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, persistent: bool = False) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        value = self.memory.get(key)
+        if value is None and persistent and self.persistent is not None:
+            value = await asyncio.get_event_loop().run_in_executor(
+                None, self.persistent.get, key
+            )
+            if value is not None:
+                self.memory.set(key, value)
+
+        # Копия: вызывающий код может дополнять результат
+        return copy.deepcopy(value) if value is not None else None
+
+    async def set(self, key: str, value: Any):
+        # В ai_responses результаты пишет история обработки (history_store) с тем же cache_key
+        if not self.enabled:
+            return
+
+        self.memory.set(key, copy.deepcopy(value))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "memory": self.memory.stats(),
+            "persistent": self.persistent.stats() if self.persistent is not None else None
+        }
+
+
+def _estimate_size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+result_cache = ResultCache()
@@ -0,0 +1,152 @@
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, literal, literal_column, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.ai_request import AIRequest, AIResponse
+from app.db.models.note import Note
+
+NOTE = "note"
+AI_RESULT = "ai_result"
+SOURCES = (NOTE, AI_RESULT)
+
+_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=25, MinWords=8"
+
+
+def _search_query(q: str):
+    # Запрос разбирается обеими конфигурациями: совпадение по любой морфологии
+    return func.websearch_to_tsquery(literal_column("'russian'::regconfig"), q).op("||")(
+        func.websearch_to_tsquery(literal_column("'english'::regconfig"), q)
+    )
+
+
+def encode_cursor(rank: float, source: str, hit_id: int) -> str:
+    raw = f"{rank!r}|{source}|{hit_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        rank, source, hit_id = raw.split("|")
+        return float(rank), source, int(hit_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор"
+        )
+
+
+def _headline(text_column, query):
+    # HTML конспектов убирается до подсветки, иначе в выдачу попадут теги
+    plain = func.regexp_replace(func.coalesce(text_column, ""), "<[^>]+>", " ", "g")
+    return func.ts_headline(literal_column("'russian'::regconfig"), plain, query, _HEADLINE_OPTIONS)
+
+
+class SearchService:
+    @staticmethod
+    async def search(
+            db: AsyncSession,
+            user_id: int,
+            q: str,
+            sources: List[str],
+            limit: int,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Полнотекстовый поиск по конспектам и результатам AI-обработки пользователя.
+
+        Совпадения ищутся по GIN-индексам search_vector; порядок - по рангу
+        ts_rank_cd (веса A/B: заголовки и ключевые термины выше текста).
+        Пагинация keyset по (rank, source, id). ts_headline, самая дорогая
+        часть, считается только для строк текущей страницы.
+        """
+        query = _search_query(q)
+        selects = []
+
+        if NOTE in sources:
+            selects.append(
+                select(
+                    func.ts_rank_cd(Note.search_vector, query).label("rank"),
+                    literal(NOTE).label("source"),
+                    Note.id.label("id")
+                ).where(Note.owner_id == user_id, Note.search_vector.op("@@")(query))
+            )
+        if AI_RESULT in sources:
+            selects.append(
+                select(
+                    func.ts_rank_cd(AIResponse.search_vector, query).label("rank"),
+                    literal(AI_RESULT).label("source"),
+                    AIResponse.id.label("id")
+                )
+                .join(AIRequest, AIResponse.request_id == AIRequest.id)
+                .where(AIRequest.user_id == user_id, AIResponse.search_vector.op("@@")(query))
+            )
+
+        hits = union_all(*selects).subquery() if len(selects) > 1 else selects[0].subquery()
+        page_query = select(hits.c.rank, hits.c.source, hits.c.id)
+        if cursor:
+            page_query = page_query.where(
+                tuple_(hits.c.rank, hits.c.source, hits.c.id) < decode_cursor(cursor)
+            )
+        result = await db.execute(
+            page_query.order_by(hits.c.rank.desc(), hits.c.source.desc(), hits.c.id.desc()).limit(limit + 1)
+        )
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.rank, last.source, last.id)
+
+        details = await SearchService._load_details(db, query, rows)
+        items = []
+        for row in rows:
+            detail = details.get((row.source, row.id))
+            if detail is None:
+                # Удалено между запросами
+                continue
+            items.append({"source": row.source, "id": row.id, "rank": row.rank, **detail})
+        return items, next_cursor
+
+    @staticmethod
+    async def _load_details(db: AsyncSession, query, rows) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        details: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+        note_ids = [row.id for row in rows if row.source == NOTE]
+        if note_ids:
+            result = await db.execute(
+                select(Note.id, Note.title, Note.created_at, _headline(Note.content, query).label("highlight"))
+                .where(Note.id.in_(note_ids))
+            )
+            for row in result:
+                details[(NOTE, row.id)] = {
+                    "title": row.title,
+                    "highlight": row.highlight,
+                    "created_at": row.created_at
+                }
+
+        response_ids = [row.id for row in rows if row.source == AI_RESULT]
+        if response_ids:
+            result = await db.execute(
+                select(
+                    AIResponse.id,
+                    AIRequest.file_name,
+                    AIRequest.processing_type,
+                    AIResponse.created_at,
+                    _headline(AIResponse.final_result, query).label("highlight")
+                )
+                .join(AIRequest, AIResponse.request_id == AIRequest.id)
+                .where(AIResponse.id.in_(response_ids))
+            )
+            for row in result:
+                details[(AI_RESULT, row.id)] = {
+                    "title": row.file_name or row.processing_type,
+                    "highlight": row.highlight,
+                    "created_at": row.created_at
+                }
+
+        return details
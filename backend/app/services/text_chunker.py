@@ -0,0 +1,52 @@
+import math
+from typing import List
+
+from app.core.config import settings
+from app.services.ml_enhancer_service import SENTENCE_PATTERN
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов LLM по длине текста (без токенизатора модели)"""
+    return math.ceil(len(text) / settings.LLM_CHARS_PER_TOKEN)
+
+
+def _sentences(text: str) -> List[str]:
+    """Предложения вместе с завершающими знаками и пробелами: склейка дает исходный текст.
+
+    Границы - те же, что у токенизатора ML-модуля (SENTENCE_PATTERN).
+    """
+    starts = [match.start() for match in SENTENCE_PATTERN.finditer(text)]
+    if not starts:
+        return [text] if text else []
+    starts[0] = 0
+    return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+
+def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
+    """Предложение длиннее бюджета режется по пробелам (или по символам, если пробелов нет)"""
+    pieces = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(sentence[:cut])
+        sentence = sentence[cut:]
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """Делит текст на куски не больше max_tokens (оценочно) по границам предложений"""
+    max_chars = max(1, int(max_tokens * settings.LLM_CHARS_PER_TOKEN))
+    chunks: List[str] = []
+    current = ""
+    for sentence in _sentences(text):
+        for piece in _split_long_sentence(sentence, max_chars):
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
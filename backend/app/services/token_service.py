@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from jose import jwt, JWTError
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import create_refresh_token
+from app.db.models.refresh_token import RefreshToken
+from app.db.models.user import User
+
+
+def _hash_jti(jti: str) -> str:
+    return hashlib.sha256(jti.encode("utf-8")).hexdigest()
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Невалидный refresh токен",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+class TokenService:
+    """Ротация refresh-токенов.
+
+    Каждый refresh-токен одноразовый: при обмене он отзывается, а клиент
+    получает новый из того же семейства (family_id). Повторное предъявление
+    отозванного токена означает утечку - тогда отзывается всё семейство.
+    Проверка - один поиск по уникальному индексу jti_hash вместо argon2.
+    """
+
+    @staticmethod
+    async def issue_refresh_token(db: AsyncSession, user: User, family_id: Optional[str] = None) -> str:
+        """
+        Выпускает refresh токен (новое семейство, если family_id не передан)
+        """
+        jti = uuid.uuid4().hex
+        family_id = family_id or uuid.uuid4().hex
+        token = create_refresh_token({"sub": user.username, "jti": jti, "fam": family_id})
+
+        db.add(RefreshToken(
+            jti_hash=_hash_jti(jti),
+            family_id=family_id,
+            user_id=user.id,
+            expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        ))
+        await db.commit()
+
+        return token
+
+    @staticmethod
+    async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[User, str]:
+        """
+        Обменивает refresh токен на новый; возвращает пользователя и новый токен
+        """
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            raise _invalid_refresh_token()
+
+        jti = payload.get("jti")
+        family_id = payload.get("fam")
+        if payload.get("type") != "refresh" or not jti or not family_id:
+            raise _invalid_refresh_token()
+
+        now = datetime.now(timezone.utc)
+        # Отзыв атомарный: из двух одновременных обменов одного токена проходит один
+        result = await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.jti_hash == _hash_jti(jti),
+                RefreshToken.family_id == family_id,
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now
+            )
+            .values(revoked_at=now)
+            .returning(RefreshToken.user_id)
+        )
+        user_id = result.scalar_one_or_none()
+
+        if user_id is None:
+            # Токен уже использован, отозван или истек - считаем семейство скомпрометированным
+            await TokenService.revoke_family(db, family_id)
+            raise _invalid_refresh_token()
+
+        user = await db.get(User, user_id)
+        if user is None or not user.is_active:
+            await TokenService.revoke_family(db, family_id)
+            raise _invalid_refresh_token()
+
+        new_token = await TokenService.issue_refresh_token(db, user, family_id)
+        return user, new_token
+
+    @staticmethod
+    async def revoke_token_family(db: AsyncSession, token: str):
+        """
+        Отзывает все токены цепочки, к которой относится refresh токен (выход)
+        """
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            raise _invalid_refresh_token()
+
+        if payload.get("type") != "refresh" or not payload.get("fam"):
+            raise _invalid_refresh_token()
+
+        await TokenService.revoke_family(db, payload["fam"])
+
+    @staticmethod
+    async def revoke_family(db: AsyncSession, family_id: str):
+        await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+
+    @staticmethod
+    async def delete_expired(db: AsyncSession) -> int:
+        """
+        Удаляет истекшие токены; отозванные живут до истечения, чтобы ловить повторное использование
+        """
+        result = await db.execute(
+            delete(RefreshToken).where(RefreshToken.expires_at <= datetime.now(timezone.utc))
+        )
+        await db.commit()
+        return result.rowcount
+
+
+class RefreshTokenSweeper:
+    """Фоновая задача процесса: периодически чистит refresh_tokens от истекших строк"""
+
+    def __init__(self, interval_seconds: int):
+        self.interval_seconds = interval_seconds
+        self._tasks: List[asyncio.Task] = []
+        self.deleted = 0
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run())]
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        from app.db.session import AsyncSessionLocal
+
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    self.deleted += await TokenService.delete_expired(db)
+            except Exception as e:
+                print(f"Очистка refresh-токенов: ошибка БД: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+refresh_token_sweeper = RefreshTokenSweeper(settings.REFRESH_TOKEN_SWEEP_INTERVAL_SECONDS)
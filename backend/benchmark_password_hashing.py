@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.services.password_hasher import PasswordHasher, hash_password, verify_password
+
+
+async def run_logins(hasher: PasswordHasher, hashed: str, logins: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(hasher.verify("benchmark-password", hashed) for _ in range(logins)))
+    return time.perf_counter() - started
+
+
+def main():
+    """
+    Замеряет пропускную способность проверки паролей (логинов/с) с текущими параметрами argon2
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк хеширования паролей")
+    parser.add_argument("--logins", type=int, default=200, help="число проверок пароля")
+    parser.add_argument("--workers", type=int, default=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"argon2: time_cost={settings.ARGON2_TIME_COST}, "
+          f"memory_cost={settings.ARGON2_MEMORY_COST} КиБ, parallelism={settings.ARGON2_PARALLELISM}")
+
+    hashed = hash_password("benchmark-password")
+    assert verify_password("benchmark-password", hashed)
+
+    started = time.perf_counter()
+    for _ in range(min(args.logins, 20)):
+        verify_password("benchmark-password", hashed)
+    single = (time.perf_counter() - started) / min(args.logins, 20)
+    print(f"Одна проверка: {single * 1000:.1f} мс")
+
+    hasher = PasswordHasher(max_workers=args.workers, max_pending=args.logins)
+    try:
+        elapsed = asyncio.run(run_logins(hasher, hashed, args.logins))
+    finally:
+        hasher.shutdown()
+
+    cores = min(args.workers, os.cpu_count() or 1)
+    throughput = args.logins / elapsed
+    print(f"Пул из {args.workers} потоков: {throughput:.1f} логинов/с "
+          f"({throughput / cores:.1f} логинов/с на ядро, ядер: {cores})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    """Заглушка; поведение можно менять на ходу через app.state (так делают тесты llm_policy):
+
+    fail_models - модели, всегда отвечающие ошибкой; fail_next / slow_next - сколько
+    ближайших ответов будут ошибкой / медленными; requests - число запросов по моделям.
+    """
+    app = FastAPI(title="OpenRouter stub")
+    app.state.fail_models = {model.strip() for model in args.fail_models.split(",") if model.strip()}
+    app.state.error_statuses = [int(code) for code in args.error_statuses.split(",") if code.strip()]
+    app.state.fail_next = args.fail_first
+    app.state.slow_next = args.slow_first
+    app.state.requests = Counter()
+
+    def completion(model: str, content: str) -> dict:
+        return {
+            "id": f"stub-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    def chunk(model: str, delta: dict) -> str:
+        data = {
+            "id": "stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        app.state.requests[model] += 1
+
+        # Медленный хвост: часть ответов задерживается (проверка хеджирования и таймаутов)
+        slow = app.state.slow_next > 0 or random.random() < args.slow_rate
+        if app.state.slow_next > 0:
+            app.state.slow_next -= 1
+        await asyncio.sleep(args.latency * (args.slow_factor if slow else 1))
+
+        fail = model in app.state.fail_models or app.state.fail_next > 0 or random.random() < args.error_rate
+        if app.state.fail_next > 0:
+            app.state.fail_next -= 1
+        if fail:
+            status = random.choice(app.state.error_statuses)
+            return JSONResponse({"error": {"message": f"stub error {status}", "code": status}}, status_code=status)
+
+        text = f"[{model}] ответ заглушки"
+        if not body.get("stream"):
+            return completion(model, text)
+
+        async def events():
+            yield chunk(model, {"role": "assistant"})
+            for word in text.split(" "):
+                await asyncio.sleep(args.token_delay)
+                yield chunk(model, {"content": word + " "})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Заглушка OpenRouter")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа, с")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="доля медленных ответов")
+    parser.add_argument("--slow-factor", type=float, default=20.0, help="во сколько раз медленнее")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="доля ответов 429/5xx")
+    parser.add_argument("--fail-models", default="", help="модели, которые всегда отвечают ошибкой (через запятую)")
+    parser.add_argument("--error-statuses", default="429,500,502,503", help="коды ошибок (через запятую)")
+    parser.add_argument("--fail-first", type=int, default=0, help="первые N ответов - ошибка")
+    parser.add_argument("--slow-first", type=int, default=0, help="первые N ответов - медленные")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="пауза между фрагментами stream, с")
+    return parser
+
+
+def main():
+    """
+    Локальная заглушка OpenRouter (OpenAI-совместимый /v1/chat/completions) для проверки llm_policy:
+    задержки, медленный хвост, ошибки 429/5xx и всегда недоступные модели.
+
+    OPENROUTER_BASE_URL=http://localhost:9000/v1 направляет backend на заглушку.
+    """
+    args = build_parser().parse_args()
+    uvicorn.run(create_app(args), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ let state = {
 
 // Конфигурация API
 const API_URL = 'http://localhost:8000';
+// Конспектов на странице списка папки
+const NOTES_PAGE_SIZE = 50;
 
 // Класс API сервиса
 class ApiService {
@@ -56,7 +58,12 @@ class ApiService {
 
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({}));
-                throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+                const detail = errorData.detail;
+                // status и detail нужны вызывающему коду (например, 409 при автосохранении)
+                const httpError = new Error((detail && detail.message) || detail || `HTTP error! status: ${response.status}`);
+                httpError.status = response.status;
+                httpError.detail = detail;
+                throw httpError;
             }
 
             return await response.json();
@@ -65,7 +72,9 @@ class ApiService {
             
             // Более понятные сообщения об ошибках
             if (error.name === 'TypeError' && error.message.includes('fetch')) {
-                throw new Error('Нет соединения с сервером. Проверьте, запущен ли бэкенд на localhost:8000');
+                const networkError = new Error('Нет соединения с сервером. Проверьте, запущен ли бэкенд на localhost:8000');
+                networkError.network = true;
+                throw networkError;
             }
             
             throw error;
@@ -91,8 +100,15 @@ class ApiService {
     }
 
     // Методы для работы с конспектами
-    async getNotes(folderId) {
-        return this.request(`/api/folders/${folderId}/notes/`);
+    async getNotes(folderId, cursor = null) {
+        // Одна страница списка без текста конспектов; следующая - по next_cursor
+        let query = `?limit=${NOTES_PAGE_SIZE}`;
+        if (cursor) query += `&cursor=${encodeURIComponent(cursor)}`;
+        return this.request(`/api/folders/${folderId}/notes/${query}`);
+    }
+
+    async getNote(noteId) {
+        return this.request(`/api/notes/${noteId}`);
     }
 
     async createNote(folderId, title, content = '', original_text = '') {
@@ -214,18 +230,13 @@ async function loadUserData() {
         
         // Преобразуем данные бэкенда в формат фронтенда
         state.folders = await Promise.all(foldersData.map(async (folder) => {
-            // Загружаем конспекты для каждой папки
+            // Загружаем первую страницу конспектов папки, остальные - по кнопке или прокрутке
             let notes = [];
+            let nextCursor = null;
             try {
-                const notesData = await api.getNotes(folder.id);
-                notes = notesData.map(note => ({
-                    id: note.id,
-                    title: note.title,
-                    content: note.content || '',
-                    originalText: note.original_text || note.content || '',
-                    smartText: note.content || '<div class="note-content"><p>Ваш конспект будет здесь...</p></div>',
-                    date: note.created_at || note.updated_at || new Date().toISOString()
-                }));
+                const page = await api.getNotes(folder.id);
+                notes = page.items.map(toNoteSummary);
+                nextCursor = page.next_cursor;
             } catch (error) {
                 console.error(`Error loading notes for folder ${folder.id}:`, error);
                 notes = [];
@@ -234,7 +245,8 @@ async function loadUserData() {
             return {
                 id: folder.id,
                 name: folder.name,
-                notes: notes
+                notes: notes,
+                nextCursor: nextCursor
             };
         }));
 
@@ -520,7 +532,7 @@ function renderFolders() {
         
         folderItem.innerHTML = `
             ${folder.name}
-            <span class="note-count">${folder.notes.length}</span>
+            <span class="note-count">${formatNotesCount(folder)}</span>
             <div class="folder-actions">
                 <button class="btn-folder-delete" data-folder-id="${folder.id}" title="Удалить папку">
                     <i class="fas fa-times"></i>
@@ -553,6 +565,46 @@ function selectFolder(folder) {
     showFolderContent();
 }
 
+// Элемент списка конспектов; текст подгружается при открытии (editNote)
+function toNoteSummary(note) {
+    return {
+        id: note.id,
+        title: note.title,
+        snippet: note.snippet || '',
+        loaded: false,
+        date: note.created_at || note.updated_at || new Date().toISOString()
+    };
+}
+
+// Следующая страница конспектов папки
+async function loadMoreNotes(folder) {
+    if (!folder.nextCursor || folder.loadingMore) return;
+    folder.loadingMore = true;
+    try {
+        const page = await api.getNotes(folder.id, folder.nextCursor);
+        // Созданные в этой сессии конспекты уже есть в списке
+        const known = new Set(folder.notes.map(note => note.id));
+        folder.notes.push(...page.items.filter(note => !known.has(note.id)).map(toNoteSummary));
+        folder.nextCursor = page.next_cursor;
+    } catch (error) {
+        console.error(`Error loading notes for folder ${folder.id}:`, error);
+    } finally {
+        folder.loadingMore = false;
+    }
+
+    if (state.currentFolder === folder) {
+        if (elements.notesCount) elements.notesCount.textContent = formatNotesCount(folder);
+        renderNotes();
+    }
+    renderFolders();
+    updateStats();
+}
+
+// Число загруженных конспектов; "+" - есть еще страницы
+function formatNotesCount(folder) {
+    return `${folder.notes.length}${folder.nextCursor ? '+' : ''}`;
+}
+
 // Показать содержимое папки
 function showFolderContent() {
     hideAllSections();
@@ -565,7 +617,7 @@ function showFolderContent() {
         elements.currentFolderTitle.textContent = `Папка: ${state.currentFolder.name}`;
     }
     if (elements.notesCount) {
-        elements.notesCount.textContent = state.currentFolder.notes.length;
+        elements.notesCount.textContent = formatNotesCount(state.currentFolder);
     }
     renderNotes();
 }
@@ -595,7 +647,7 @@ function renderNotes() {
                     <div class="note-date">${formatDate(note.date)}</div>
                 </div>
             </div>
-            <div class="note-preview">${(note.content || note.smartText || '').substring(0, 100)}...</div>
+            <div class="note-preview">${(note.snippet || note.content || note.smartText || '').substring(0, 100)}...</div>
             <div class="note-actions">
                 <button class="btn-note-action btn-note-edit" data-note-id="${note.id}">
                     <i class="fas fa-edit"></i>Редактировать
@@ -622,6 +674,34 @@ function renderNotes() {
             deleteNote(noteId);
         });
     });
+
+    renderLoadMoreButton();
+}
+
+// Кнопка следующей страницы: срабатывает по клику и при прокрутке до конца списка
+let loadMoreObserver = null;
+
+function renderLoadMoreButton() {
+    if (loadMoreObserver) {
+        loadMoreObserver.disconnect();
+        loadMoreObserver = null;
+    }
+
+    const folder = state.currentFolder;
+    if (!folder.nextCursor) return;
+
+    const button = document.createElement('button');
+    button.className = 'btn-load-more';
+    button.innerHTML = '<i class="fas fa-chevron-down"></i>Показать еще';
+    button.addEventListener('click', () => loadMoreNotes(folder));
+    elements.notesContainer.appendChild(button);
+
+    if ('IntersectionObserver' in window) {
+        loadMoreObserver = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) loadMoreNotes(folder);
+        });
+        loadMoreObserver.observe(button);
+    }
 }
 
 // Форматирование даты
@@ -671,6 +751,7 @@ async function createNewNoteFromModal() {
             id: newNote.id,
             title: newNote.title,
             content: newNote.content || '',
+            version: newNote.version,
             originalText: newNote.original_text || '',
             smartText: newNote.content || '<div class="note-content"><p>Ваш конспект будет здесь...</p></div>',
             date: newNote.created_at || new Date().toISOString()
@@ -695,10 +776,24 @@ async function createNewNoteFromModal() {
 }
 
 // Просмотр конспекта
-function editNote(noteId) {
+async function editNote(noteId) {
     const note = state.currentFolder.notes.find(n => n.id === noteId);
     if (!note) return;
     
+    if (note.loaded === false) {
+        try {
+            const fullNote = await api.getNote(noteId);
+            note.content = fullNote.content || '';
+            note.version = fullNote.version;
+            note.originalText = fullNote.original_text || fullNote.content || '';
+            note.smartText = fullNote.content || '<div class="note-content"><p>Ваш конспект будет здесь...</p></div>';
+            note.loaded = true;
+        } catch (error) {
+            console.error('Ошибка загрузки конспекта:', error);
+            return;
+        }
+    }
+    
     state.currentNote = note;
     showNoteView();
 }
@@ -753,10 +848,11 @@ async function changeNoteTitle() {
     }
     
     try {
-        await api.updateNote(state.currentNote.id, { title: newTitle });
+        const updatedNote = await api.updateNote(state.currentNote.id, { title: newTitle });
         
         if (state.currentNote) {
             state.currentNote.title = newTitle;
+            if (updatedNote) state.currentNote.version = updatedNote.version;
             if (elements.viewNoteTitle) elements.viewNoteTitle.textContent = newTitle;
             renderNotes();
             updateStats();
@@ -1099,10 +1195,11 @@ async function saveNoteFromView() {
     const newContent = elements.noteTextContent.innerHTML;
     
     try {
-        await api.updateNote(state.currentNote.id, { 
+        const updatedNote = await api.updateNote(state.currentNote.id, { 
             content: newContent 
         });
         
+        if (updatedNote) state.currentNote.version = updatedNote.version;
         state.currentNote.smartText = newContent;
         state.currentNote.content = newContent;
         state.currentNote.date = new Date().toISOString();
@@ -1140,37 +1237,155 @@ function debounce(func, wait) {
     };
 }
 
+// Одна правка {offset, delete, insert}: общий префикс и суффикс не отправляются
+function diffText(oldText, newText) {
+    let prefix = 0;
+    const maxPrefix = Math.min(oldText.length, newText.length);
+    while (prefix < maxPrefix && oldText[prefix] === newText[prefix]) prefix++;
+
+    let suffix = 0;
+    const maxSuffix = Math.min(oldText.length, newText.length) - prefix;
+    while (suffix < maxSuffix &&
+           oldText[oldText.length - 1 - suffix] === newText[newText.length - 1 - suffix]) suffix++;
+
+    return {
+        offset: prefix,
+        delete: oldText.length - prefix - suffix,
+        insert: newText.substring(prefix, newText.length - suffix)
+    };
+}
+
+// Трехстороннее слияние: правка относительно base, перенесенная поверх remote.
+// null - правки пересекаются или касаются друг друга (порядок не определен)
+function rebaseEdit(base, local, remote) {
+    const mine = diffText(base, local);
+    const theirs = diffText(base, remote);
+    let offset;
+    if (mine.offset + mine.delete < theirs.offset) {
+        offset = mine.offset;
+    } else if (theirs.offset + theirs.delete < mine.offset) {
+        offset = mine.offset + theirs.insert.length - theirs.delete;
+    } else {
+        return null;
+    }
+    const op = { offset, delete: mine.delete, insert: mine.insert };
+    return {
+        op,
+        text: remote.substring(0, offset) + op.insert + remote.substring(offset + op.delete)
+    };
+}
+
+// Повторы автосохранения только при обрыве связи: 2, 4, 8... секунд
+const AUTOSAVE_MAX_RETRIES = 5;
+let autoSaveInFlight = false;
+let autoSaveQueued = false;
+let autoSaveRetries = 0;
+let autoSaveRetryTimer = null;
+
+function sendAutoSave(note, baseVersion, op) {
+    return api.request(`/api/notes/${note.id}/autosave`, {
+        method: 'PATCH',
+        body: JSON.stringify({ base_version: baseVersion, ops: [op] })
+    });
+}
+
 async function autoSaveNote() {
     if (!state.currentNote || !elements.noteTextContent) return;
+    // Правки, сделанные во время запроса, уйдут следующим запросом от новой версии
+    if (autoSaveInFlight) {
+        autoSaveQueued = true;
+        return;
+    }
+    clearTimeout(autoSaveRetryTimer);
     
+    const note = state.currentNote;
     const newContent = elements.noteTextContent.innerHTML;
-    if (newContent !== (state.currentNote.smartText || state.currentNote.content)) {
-        try {
-            // Быстрое сохранение без ожидания ответа
-            fetch(`${API_URL}/api/notes/${state.currentNote.id}`, {
-                method: 'PUT',
-                headers: {
-                    'Authorization': `Bearer ${localStorage.getItem('token')}`,
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ 
-                    content: newContent,
-                    updated_at: new Date().toISOString()
-                })
-            }).catch(e => console.error('Auto-save error:', e));
-            
-            state.currentNote.smartText = newContent;
-            state.currentNote.content = newContent;
-            state.currentNote.date = new Date().toISOString();
-            
-            showAutoSaveIndicator();
-        } catch (error) {
+    const savedContent = note.content || '';
+    if (newContent === savedContent || newContent === note.smartText) return;
+    
+    autoSaveInFlight = true;
+    try {
+        // Отправляем только изменившийся фрагмент относительно сохраненной версии
+        const result = await sendAutoSave(note, note.version || 1, diffText(savedContent, newContent));
+        if (!result) return;
+        markAutoSaved(note, result.version, newContent);
+        autoSaveRetries = 0;
+    } catch (error) {
+        if (error.status === 409) {
+            await resolveAutoSaveConflict(note, savedContent, newContent);
+        } else if (error.network && autoSaveRetries < AUTOSAVE_MAX_RETRIES) {
+            // Запрос мог не дойти: повторяем ту же правку от той же версии. Если он все же
+            // был принят, повтор получит 409 и совпадающий текст на сервере
+            autoSaveRetries++;
+            showAutoSaveIndicator('Нет связи, повтор автосохранения...', true);
+            autoSaveRetryTimer = setTimeout(autoSaveNote, 1000 * 2 ** autoSaveRetries);
+        } else {
             console.error('Auto-save error:', error);
+            showAutoSaveIndicator(`Изменения не сохранены: ${error.message}`, true);
+        }
+    } finally {
+        autoSaveInFlight = false;
+        if (autoSaveQueued) {
+            autoSaveQueued = false;
+            autoSaveNote();
         }
     }
 }
 
-function showAutoSaveIndicator() {
+function markAutoSaved(note, version, content) {
+    note.version = version;
+    note.smartText = content;
+    note.content = content;
+    note.date = new Date().toISOString();
+    showAutoSaveIndicator();
+}
+
+// Версия устарела (правка в другой вкладке или на другом устройстве)
+async function resolveAutoSaveConflict(note, baseContent, localContent) {
+    try {
+        const latest = await api.getNote(note.id);
+        if (!latest) return;
+        const remoteContent = latest.content || '';
+
+        // Наш же запрос, ответ на который потерялся
+        if (remoteContent === localContent) {
+            markAutoSaved(note, latest.version, localContent);
+            return;
+        }
+
+        // Правки в разных местах текста: переносим свою поверх сохраненной версии
+        const merged = rebaseEdit(baseContent, localContent, remoteContent);
+        if (merged) {
+            const result = await sendAutoSave(note, latest.version, merged.op);
+            if (!result) return;
+            if (state.currentNote === note && elements.noteTextContent.innerHTML === localContent) {
+                elements.noteTextContent.innerHTML = merged.text;
+            }
+            markAutoSaved(note, result.version, merged.text);
+            return;
+        }
+
+        // Правки пересекаются: решает пользователь
+        const keepLocal = confirm(
+            'Конспект изменен в другом месте, и изменения пересекаются с вашими.\n\n' +
+            'OK - сохранить вашу версию поверх, Отмена - загрузить сохраненную версию (ваши последние правки будут потеряны).'
+        );
+        if (keepLocal) {
+            const result = await sendAutoSave(note, latest.version, diffText(remoteContent, localContent));
+            if (result) markAutoSaved(note, result.version, localContent);
+        } else {
+            note.version = latest.version;
+            note.content = remoteContent;
+            note.smartText = remoteContent;
+            if (state.currentNote === note) elements.noteTextContent.innerHTML = remoteContent;
+        }
+    } catch (error) {
+        console.error('Auto-save conflict error:', error);
+        showAutoSaveIndicator(`Изменения не сохранены: ${error.message}`, true);
+    }
+}
+
+function showAutoSaveIndicator(message = 'Автосохранение', failed = false) {
     let indicator = document.querySelector('.auto-save-indicator');
     if (!indicator) {
         indicator = document.createElement('div');
@@ -1178,12 +1393,13 @@ function showAutoSaveIndicator() {
         document.body.appendChild(indicator);
     }
     
-    indicator.innerHTML = '<i class="fas fa-check"></i> Автосохранение';
+    indicator.innerHTML = `<i class="fas fa-${failed ? 'exclamation-triangle' : 'check'}"></i> ${message}`;
+    indicator.classList.toggle('failed', failed);
     indicator.style.display = 'block';
     
     setTimeout(() => {
         indicator.style.display = 'none';
-    }, 2000);
+    }, failed ? 5000 : 2000);
 }
 
 // Функция для показа модального окна успеха
@@ -0,0 +1,95 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from text_tokenizer import TokenizedText
+
+# Сколько самых частых слов документа считаются ключевыми при оценке предложений
+KEY_TERMS_PER_DOCUMENT = 10
+
+
+def select_sentences(documents: Sequence[TokenizedText],
+                     phrase_scores: Sequence[Sequence[int]]) -> List[List[int]]:
+    """Отбирает важные предложения сразу для пакета документов.
+
+    Значимые слова всех документов получают общий словарь, по ним строится
+    разреженная матрица документ x термин (пары с количеством и первым
+    вхождением). Ключевые термины, оценки предложений и отбор топ-80%
+    считаются векторно - так же, как AdvancedTextEnhancer делает это для
+    одного документа.
+
+    Args:
+        documents: Токенизированные документы
+        phrase_scores: Сумма весов индикаторов для каждого предложения каждого документа
+
+    Returns:
+        Для каждого документа - индексы оставленных предложений по порядку
+    """
+    vocabulary: Dict[str, int] = {}
+    term_ids = []
+    term_sentences = []
+    sentence_counts = []
+    sentence_offset = 0
+
+    for document in documents:
+        lengths = [s.last_token - s.first_token for s in document.sentences]
+        sentence_ids = np.repeat(
+            np.arange(sentence_offset, sentence_offset + len(lengths), dtype=np.int64), lengths
+        )
+        mask = np.fromiter(document.is_term, dtype=bool, count=len(document.is_term))
+        terms = document.terms
+        term_sentences.append(sentence_ids[mask])
+        term_ids.append(np.fromiter(
+            (vocabulary.setdefault(term, len(vocabulary)) for term in terms),
+            dtype=np.int64, count=len(terms)
+        ))
+        sentence_counts.append(len(lengths))
+        sentence_offset += len(lengths)
+
+    total_sentences = sentence_offset
+    if not total_sentences:
+        return [[] for _ in documents]
+
+    sentence_counts = np.array(sentence_counts, dtype=np.int64)
+    sentence_starts = np.cumsum(sentence_counts) - sentence_counts
+    sentence_document = np.repeat(np.arange(len(documents), dtype=np.int64), sentence_counts)
+
+    token_term = np.concatenate(term_ids)
+    token_sentence = np.concatenate(term_sentences)
+    token_document = sentence_document[token_sentence]
+
+    # Разреженная матрица документ x термин: уникальные пары, частоты и первые вхождения
+    vocabulary_size = max(len(vocabulary), 1)
+    token_pair = token_document * vocabulary_size + token_term
+    pairs, first_seen, counts = np.unique(token_pair, return_index=True, return_counts=True)
+    pair_document = pairs // vocabulary_size
+
+    # Ключевые термины: топ-10 по частоте (при равенстве - по первому вхождению), частота >= 2
+    order = np.lexsort((first_seen, -counts, pair_document))
+    ordered_document = pair_document[order]
+    rank = np.arange(len(order)) - np.searchsorted(ordered_document, ordered_document)
+    is_key_pair = (rank < KEY_TERMS_PER_DOCUMENT) & (counts[order] >= 2)
+    is_key_token = np.isin(token_pair, pairs[order][is_key_pair])
+
+    # Оценка предложений
+    key_count = np.bincount(token_sentence, weights=is_key_token, minlength=total_sentences)
+    word_count = np.bincount(token_sentence, minlength=total_sentences)
+    indicator_score = np.fromiter(
+        (score for scores in phrase_scores for score in scores),
+        dtype=np.float64, count=total_sentences
+    )
+    scores = key_count * 2 + indicator_score + ((word_count >= 8) & (word_count <= 25))
+
+    # Топ-80% (минимум 3) предложений документа; при равной оценке - более поздние
+    local_index = np.arange(total_sentences) - sentence_starts[sentence_document]
+    order = np.lexsort((-local_index, -scores, sentence_document))
+    ordered_document = sentence_document[order]
+    rank = np.arange(total_sentences) - np.searchsorted(ordered_document, ordered_document)
+    keep_count = np.maximum(3, (sentence_counts * 0.8).astype(np.int64))
+    kept = np.sort(order[rank < keep_count[ordered_document]])
+
+    boundaries = np.searchsorted(sentence_document[kept], np.arange(1, len(documents)))
+    return [
+        (indices - start).tolist()
+        for indices, start in zip(np.split(kept, boundaries), sentence_starts)
+    ]
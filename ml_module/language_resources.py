@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Sequence, Tuple
+
+from phrase_matcher import PhraseMatcher
+from text_tokenizer import TextTokenizer
+
+# Языки по умолчанию: учебные тексты русские, но с английскими вставками
+DEFAULT_LANGUAGES = ('ru', 'en')
+
+# Каталог с файлами, переопределяющими встроенные словари:
+# <каталог>/<язык>/stop_words.txt, topic_markers.txt, paragraph_markers.txt,
+# general_terms.txt (по фразе на строку) и importance_indicators.json
+RESOURCES_DIR_ENV = 'ML_RESOURCES_DIR'
+
+DATE_PATTERNS = [
+    r'\b\d{1,2}\.\d{1,2}\.\d{4}\b',
+    r'\b\d{4}\.\d{1,2}\.\d{1,2}\b',
+    r'\b\d{1,2}/\d{1,2}/\d{4}\b',
+    r'\b\d{4}-\d{1,2}-\d{1,2}\b',
+    r'\b\d{4}\b'
+]
+
+BUILTIN_LANGUAGES: Dict[str, dict] = {
+    'ru': {
+        'uppercase': 'А-Я',
+        'stop_words': {
+            'и', 'в', 'во', 'на', 'с', 'по', 'к', 'у', 'о', 'из', 'за', 'от', 'до',
+            'не', 'что', 'как', 'а', 'то', 'все', 'так', 'это', 'но', 'они', 'мы',
+            'вы', 'его', 'ее', 'их', 'этот', 'тот', 'который', 'которые', 'этом',
+            'вот', 'или', 'если', 'при', 'также', 'для', 'со', 'же', 'бы',
+            'ли', 'нет', 'да', 'ну', 'мне', 'меня', 'тебе', 'тебя',
+            'ему', 'ей', 'нам', 'вам', 'ими', 'ними', 'описывает', 'является',
+            'говорит', 'был', 'была', 'имеет', 'могут', 'может', 'какой',
+            'когда', 'где', 'чем', 'почему', 'хотя', 'после', 'перед', 'между',
+            # Местоимения и вспомогательные глаголы
+            'я', 'ты', 'он', 'она', 'оно', 'себя',
+            'есть', 'быть', 'стать', 'являться', 'называться', 'считаться'
+        },
+        'importance_indicators': {
+            'определение': 3, 'понятие': 2, 'термин': 3, 'концепция': 3,
+            'теория': 2, 'метод': 2, 'алгоритм': 3, 'формула': 3,
+            'закон': 3, 'принцип': 2, 'свойство': 2, 'функция': 2,
+            'структура': 2, 'процесс': 2, 'система': 2, 'модель': 2,
+            'важно': 1, 'ключевой': 2, 'основной': 2, 'главный': 2
+        },
+        'topic_markers': {
+            'также', 'кроме', 'однако', 'поэтому', 'следовательно',
+            'в результате', 'в отличие', 'например', 'в частности'
+        },
+        'paragraph_markers': {'таким образом', 'в заключение', 'кроме того'},
+        'general_terms': {
+            'может быть', 'также как', 'однако это', 'кроме того',
+            'в том числе', 'поэтому можно', 'следует отметить'
+        }
+    },
+    'en': {
+        'uppercase': 'A-Z',
+        'stop_words': {
+            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+            'of', 'with', 'by', 'as', 'is', 'are', 'was', 'were', 'be', 'been',
+            'this', 'that', 'these', 'those', 'have', 'has', 'had', 'do', 'does',
+            'did', 'will', 'would', 'could', 'should', 'can', 'may', 'might'
+        },
+        'importance_indicators': {},
+        'topic_markers': set(),
+        'paragraph_markers': set(),
+        'general_terms': set()
+    }
+}
+
+
+@dataclass(frozen=True)
+class LanguageResources:
+    """Неизменяемый набор словарей и скомпилированных паттернов.
+
+    Один экземпляр на набор языков разделяется всеми энхансерами процесса
+    (и потоками): после создания он только читается.
+    """
+    languages: Tuple[str, ...]
+    stop_words: FrozenSet[str]
+    importance_indicators: Mapping[str, int]
+    topic_markers: FrozenSet[str]
+    paragraph_markers: FrozenSet[str]
+    general_terms: FrozenSet[str]
+    date_pattern: re.Pattern
+    acronym_pattern: re.Pattern
+    tokenizer: TextTokenizer
+    phrase_matcher: PhraseMatcher
+
+    @classmethod
+    def build(cls, languages: Tuple[str, ...], data: Mapping[str, dict]) -> "LanguageResources":
+        stop_words = frozenset().union(*(data[lang]['stop_words'] for lang in languages))
+        indicators: Dict[str, int] = {}
+        for lang in languages:
+            indicators.update(data[lang]['importance_indicators'])
+        topic_markers = frozenset().union(*(data[lang]['topic_markers'] for lang in languages))
+        paragraph_markers = frozenset().union(*(data[lang]['paragraph_markers'] for lang in languages))
+        uppercase = ''.join(data[lang]['uppercase'] for lang in languages)
+
+        return cls(
+            languages=languages,
+            stop_words=stop_words,
+            importance_indicators=MappingProxyType(indicators),
+            topic_markers=topic_markers,
+            paragraph_markers=paragraph_markers,
+            general_terms=frozenset().union(*(data[lang]['general_terms'] for lang in languages)),
+            # Даты - одна альтернатива в порядке приоритета,
+            # чтобы год не выделялся внутри полной даты
+            date_pattern=re.compile('|'.join(f'(?:{p})' for p in DATE_PATTERNS)),
+            acronym_pattern=re.compile(rf'\b[{uppercase}]{{2,6}}\b'),
+            tokenizer=TextTokenizer(stop_words),
+            # Один автомат для индикаторов и маркеров: поиск за один проход по тексту
+            phrase_matcher=PhraseMatcher(set(indicators) | topic_markers | paragraph_markers)
+        )
+
+    def with_indicators(self, indicators: Mapping[str, int]) -> "LanguageResources":
+        """Возвращает копию набора с дополнительными индикаторами важности"""
+        merged = dict(self.importance_indicators)
+        merged.update((indicator.lower(), weight) for indicator, weight in indicators.items())
+        return replace(
+            self,
+            importance_indicators=MappingProxyType(merged),
+            phrase_matcher=PhraseMatcher(set(merged) | self.topic_markers | self.paragraph_markers)
+        )
+
+
+class ResourceRegistry:
+    """Реестр языковых ресурсов: ленивая загрузка и общий кэш на процесс"""
+
+    def __init__(self, override_dir: Optional[str] = None):
+        self.override_dir = Path(override_dir) if override_dir else None
+        self._bundles: Dict[Tuple[str, ...], LanguageResources] = {}
+        self._lock = threading.Lock()
+
+    def get(self, languages: Sequence[str] = DEFAULT_LANGUAGES) -> LanguageResources:
+        key = tuple(languages)
+        bundle = self._bundles.get(key)
+        if bundle is None:
+            with self._lock:
+                bundle = self._bundles.get(key)
+                if bundle is None:
+                    data = {lang: self._load_language(lang) for lang in key}
+                    bundle = LanguageResources.build(key, data)
+                    self._bundles[key] = bundle
+        return bundle
+
+    def clear(self):
+        """Сбрасывает кэш (например, после обновления файлов словарей)"""
+        with self._lock:
+            self._bundles.clear()
+
+    def _load_language(self, language: str) -> dict:
+        if language not in BUILTIN_LANGUAGES:
+            raise ValueError(f"Неподдерживаемый язык: {language}")
+        data = dict(BUILTIN_LANGUAGES[language])
+
+        if self.override_dir is None:
+            return data
+        language_dir = self.override_dir / language
+
+        for name in ('stop_words', 'topic_markers', 'paragraph_markers', 'general_terms'):
+            path = language_dir / f'{name}.txt'
+            if path.is_file():
+                data[name] = set(_read_phrases(path))
+
+        path = language_dir / 'importance_indicators.json'
+        if path.is_file():
+            with open(path, encoding='utf-8') as f:
+                data['importance_indicators'] = {
+                    indicator.lower(): int(weight) for indicator, weight in json.load(f).items()
+                }
+
+        return data
+
+
+def _read_phrases(path: Path) -> Iterable[str]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().lower()
+            if line and not line.startswith('#'):
+                yield line
+
+
+registry = ResourceRegistry(os.environ.get(RESOURCES_DIR_ENV))
+
+
+def get_resources(languages: Sequence[str] = DEFAULT_LANGUAGES) -> LanguageResources:
+    """Возвращает общий для процесса набор ресурсов (загружается при первом обращении)"""
+    return registry.get(languages)
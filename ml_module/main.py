@@ -1,13 +1,25 @@
+from typing import List
 from fastapi import FastAPI
 from pydantic import BaseModel
-from text_enhancer import enhance
+from text_enhancer import AdvancedTextEnhancer
 
 app = FastAPI()
 
+# Один энхансер на процесс: словари и паттерны загружаются один раз
+enhancer = AdvancedTextEnhancer()
+
 class Item(BaseModel):
     text: str
 
 @app.post("/enhance")
 def enhance_text(item: Item):
-    enhanced = enhance(item.text)
+    enhanced = enhancer.process_text(item.text)
+    return {"enhanced": enhanced}
+
+class BatchItem(BaseModel):
+    texts: List[str]
+
+@app.post("/enhance/batch")
+def enhance_batch(item: BatchItem):
+    enhanced = enhancer.process_batch(item.texts)
     return {"enhanced": enhanced}
@@ -0,0 +1,70 @@
+import re
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+_END = ''  # маркер конца фразы в узле префиксного дерева
+
+
+class PhraseMatcher:
+    """Многошаблонный поиск подстрок за один проход по тексту.
+
+    Словарь фраз компилируется в одно регулярное выражение в форме
+    префиксного дерева, обёрнутое в lookahead: в каждой позиции движок re
+    за один спуск по дереву находит самую длинную фразу, а все более короткие
+    фразы, начинающиеся там же, берутся из заранее посчитанных префиксов.
+    Так находятся все вхождения (в том числе перекрывающиеся), а время поиска
+    почти не зависит от размера словаря.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases = frozenset(phrase.lower() for phrase in phrases if phrase)
+
+        trie: Dict[str, dict] = {}
+        for phrase in self.phrases:
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[_END] = {}
+
+        # Для каждой фразы - все фразы словаря, являющиеся её префиксами
+        self._prefixes: Dict[str, Tuple[str, ...]] = {}
+        for phrase in self.phrases:
+            node = trie
+            prefixes = []
+            for i, char in enumerate(phrase, 1):
+                node = node[char]
+                if _END in node:
+                    prefixes.append(phrase[:i])
+            self._prefixes[phrase] = tuple(prefixes)
+
+        self._pattern: Optional[re.Pattern] = None
+        if self.phrases:
+            self._pattern = re.compile('(?=(' + self._build_pattern(trie) + '))')
+
+    @classmethod
+    def _build_pattern(cls, node: Dict[str, dict]) -> str:
+        """Сериализует узел дерева; ветви разделены по первому символу"""
+        branches = [re.escape(char) + cls._build_pattern(child)
+                    for char, child in sorted(node.items()) if char != _END]
+        if not branches:
+            return ''
+        if len(branches) == 1 and _END not in node:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        # Жадная необязательная группа: сначала пробуем продолжить фразу
+        return body + '?' if _END in node else body
+
+    def finditer(self, text: str, pos: int = 0, endpos: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """Возвращает все вхождения фраз как пары (позиция, фраза)"""
+        if self._pattern is None:
+            return
+        if endpos is None:
+            endpos = len(text)
+        prefixes = self._prefixes
+        for match in self._pattern.finditer(text, pos, endpos):
+            start = match.start()
+            for phrase in prefixes[match.group(1)]:
+                yield start, phrase
+
+    def find(self, text: str, pos: int = 0, endpos: Optional[int] = None) -> Set[str]:
+        """Возвращает множество фраз, встречающихся в тексте"""
+        return {phrase for _, phrase in self.finditer(text, pos, endpos)}
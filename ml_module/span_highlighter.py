@@ -0,0 +1,43 @@
+from typing import Iterable, List, NamedTuple
+
+
+class Span(NamedTuple):
+    """Фрагмент текста для выделения"""
+    start: int
+    end: int
+    priority: int
+    wrap: bool = True  # False - фрагмент только блокирует пересечения (уже выделенный текст)
+
+
+def resolve_overlaps(spans: Iterable[Span], length: int) -> List[Span]:
+    """Оставляет непересекающиеся фрагменты: сначала более приоритетные, затем более длинные"""
+    ordered = sorted(spans, key=lambda span: (-span.priority, span.start - span.end, span.start))
+
+    # Маска занятых символов: проверка и пометка диапазона выполняются в C
+    occupied = bytearray(length)
+    accepted: List[Span] = []
+    for span in ordered:
+        if span.start >= span.end or occupied.find(1, span.start, span.end) != -1:
+            continue
+        occupied[span.start:span.end] = b'\x01' * (span.end - span.start)
+        accepted.append(span)
+
+    accepted.sort()
+    return accepted
+
+
+def render(text: str, spans: Iterable[Span], marker: str = '**') -> str:
+    """Собирает текст с разметкой за один линейный проход"""
+    parts: List[str] = []
+    position = 0
+    for span in resolve_overlaps(spans, len(text)):
+        parts.append(text[position:span.start])
+        if span.wrap:
+            parts.append(marker)
+            parts.append(text[span.start:span.end])
+            parts.append(marker)
+        else:
+            parts.append(text[span.start:span.end])
+        position = span.end
+    parts.append(text[position:])
+    return ''.join(parts)
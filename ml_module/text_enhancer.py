@@ -1,66 +1,62 @@
 import re
-import string
 from collections import Counter
-from typing import List, Set, Tuple
+from typing import Dict, FrozenSet, List, Mapping, Optional, Sequence, Set
 import heapq
+from language_resources import DEFAULT_LANGUAGES, LanguageResources, get_resources
+from phrase_matcher import PhraseMatcher
+from span_highlighter import Span, render
+from text_tokenizer import TokenizedText
+
+# Уже размеченный Markdown-жирным текст
+BOLD_PATTERN = re.compile(r'\*\*[^*]+\*\*')
+
+# Приоритеты при пересечении выделяемых фрагментов
+HIGHLIGHT_PRIORITY = {'bold': 4, 'dates': 3, 'terms': 2, 'acronyms': 1}
 
 class AdvancedTextEnhancer:
-    def __init__(self):
-        # Умные стоп-слова с весами
-        self.stop_words = self._load_stop_words()
-        
-        # Паттерны для важных элементов
-        self.patterns = {
-            'dates': [
-                r'\b\d{1,2}\.\d{1,2}\.\d{4}\b',
-                r'\b\d{4}\.\d{1,2}\.\d{1,2}\b',
-                r'\b\d{1,2}/\d{1,2}/\d{4}\b',
-                r'\b\d{4}-\d{1,2}-\d{1,2}\b',
-                r'\b\d{4}\b'
-            ],
-            'acronyms': r'\b[A-ZА-Я]{2,6}\b',
-            'numbers': r'\b\d+[.,]?\d*\b',
-            'capitalized': r'\b[А-ЯA-Z][а-яa-z]{3,}\b'
-        }
-        
-        # Тематические индикаторы (слова, указывающие на важность)
-        self.importance_indicators = {
-            'определение': 3, 'понятие': 2, 'термин': 3, 'концепция': 3,
-            'теория': 2, 'метод': 2, 'алгоритм': 3, 'формула': 3,
-            'закон': 3, 'принцип': 2, 'свойство': 2, 'функция': 2,
-            'структура': 2, 'процесс': 2, 'система': 2, 'модель': 2,
-            'важно': 1, 'ключевой': 2, 'основной': 2, 'главный': 2
-        }
-
-    def _load_stop_words(self) -> Set[str]:
-        """Загружает расширенный список стоп-слов"""
-        base_stop_words = {
-            # Русские стоп-слова
-            'и', 'в', 'во', 'на', 'с', 'по', 'к', 'у', 'о', 'из', 'за', 'от', 'до',
-            'не', 'что', 'как', 'а', 'то', 'все', 'так', 'это', 'но', 'они', 'мы',
-            'вы', 'его', 'ее', 'их', 'этот', 'тот', 'который', 'которые', 'этом',
-            'вот', 'или', 'если', 'при', 'также', 'для', 'со', 'то', 'же', 'бы',
-            'ли', 'по', 'до', 'нет', 'да', 'ну', 'вы', 'мне', 'меня', 'тебе', 'тебя',
-            'ему', 'ей', 'нам', 'вам', 'ими', 'ними', 'описывает', 'является',
-            'говорит', 'был', 'была', 'имеет', 'могут', 'может', 'этом', 'какой',
-            'когда', 'где', 'чем', 'почему', 'хотя', 'после', 'перед', 'между',
-            
-            # Английские стоп-слова
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'as', 'is', 'are', 'was', 'were', 'be', 'been',
-            'this', 'that', 'these', 'those', 'have', 'has', 'had', 'do', 'does',
-            'did', 'will', 'would', 'could', 'should', 'can', 'may', 'might'
-        }
-        
-        # Добавляем местоимения и вспомогательные глаголы
-        pronouns = {'я', 'ты', 'он', 'она', 'оно', 'мы', 'вы', 'они', 'себя'}
-        verbs = {'есть', 'быть', 'стать', 'являться', 'называться', 'считаться'}
-        
-        return base_stop_words | pronouns | verbs
+    def __init__(self, languages: Sequence[str] = DEFAULT_LANGUAGES,
+                 resources: Optional[LanguageResources] = None):
+        # Словари и паттерны общие для процесса: создание энхансера почти бесплатно
+        self.resources = resources or get_resources(languages)
+
+    @property
+    def stop_words(self) -> FrozenSet[str]:
+        return self.resources.stop_words
+
+    @property
+    def importance_indicators(self) -> Mapping[str, int]:
+        return self.resources.importance_indicators
+
+    @property
+    def topic_markers(self) -> FrozenSet[str]:
+        return self.resources.topic_markers
+
+    @property
+    def paragraph_markers(self) -> FrozenSet[str]:
+        return self.resources.paragraph_markers
+
+    @property
+    def phrase_matcher(self) -> PhraseMatcher:
+        return self.resources.phrase_matcher
 
-    def _calculate_sentence_importance(self, sentence: str, key_terms: Set[str]) -> float:
+    def update_importance_indicators(self, indicators: Dict[str, int]):
+        """Добавляет индикаторы важности (например, словарь терминов предметной области)"""
+        # Общий набор не меняется: экземпляр получает собственную копию
+        self.resources = self.resources.with_indicators(indicators)
+
+    def tokenize(self, text: str) -> TokenizedText:
+        """Разбирает текст на предложения и токены (один раз на документ)"""
+        return self.resources.tokenizer.tokenize(text)
+
+    def _match_phrases(self, document: TokenizedText) -> List[Set[str]]:
+        """Находит индикаторы и маркеры в каждом предложении документа"""
+        return [self.phrase_matcher.find(document.sentence_lower(i))
+                for i in range(len(document.sentences))]
+
+    def _calculate_sentence_importance(self, document: TokenizedText, index: int,
+                                       key_terms: Set[str], phrases: Set[str]) -> float:
         """Рассчитывает важность предложения"""
-        words = self._tokenize_text(sentence.lower())
+        words = document.sentence_terms(index)
         
         importance_score = 0
         
@@ -69,9 +65,8 @@ class AdvancedTextEnhancer:
         importance_score += term_count * 2
         
         # Учитываем индикаторы важности
-        for indicator, weight in self.importance_indicators.items():
-            if indicator in sentence.lower():
-                importance_score += weight
+        for phrase in phrases:
+            importance_score += self.importance_indicators.get(phrase, 0)
         
         # Учитываем длину предложения (средние предложения обычно важнее)
         word_count = len(words)
@@ -82,99 +77,90 @@ class AdvancedTextEnhancer:
 
     def _tokenize_text(self, text: str) -> List[str]:
         """Токенизирует текст с улучшенной обработкой"""
-        # Убираем пунктуацию, но сохраняем дефисы в словах
-        text = re.sub(r'[^\w\s-]', ' ', text)
-        words = text.lower().split()
-        
-        # Фильтруем стоп-слова и короткие слова
-        return [word for word in words if word not in self.stop_words and len(word) > 2]
+        # Пунктуация отбрасывается, дефисы в словах сохраняются,
+        # стоп-слова и короткие слова отфильтрованы
+        return self.tokenize(text).terms
 
     def remove_repetitive_phrases(self, text: str) -> str:
         """Умное удаление повторяющихся фраз с сохранением смысла"""
-        sentences = self._split_into_sentences(text)
+        return self._remove_repetitive_phrases(self.tokenize(text)).text
+
+    def _remove_repetitive_phrases(self, document: TokenizedText) -> TokenizedText:
+        sentences = document.sentences
         
         if len(sentences) <= 1:
-            return text
+            return document
         
         # Извлекаем ключевые термины для оценки важности
-        all_words = []
-        for sentence in sentences:
-            all_words.extend(self._tokenize_text(sentence))
-        
-        word_freq = Counter(all_words)
+        word_freq = Counter(document.terms)
         key_terms = {word for word, count in word_freq.most_common(10) if count >= 2}
         
         # Оцениваем важность каждого предложения
+        sentence_phrases = self._match_phrases(document)
         scored_sentences = []
-        for i, sentence in enumerate(sentences):
-            score = self._calculate_sentence_importance(sentence, key_terms)
-            scored_sentences.append((score, i, sentence))
+        for i in range(len(sentences)):
+            score = self._calculate_sentence_importance(document, i, key_terms, sentence_phrases[i])
+            scored_sentences.append((score, i))
         
         # Сортируем по важности и берем топ-80% предложений
         scored_sentences.sort(reverse=True)
         keep_count = max(3, int(len(sentences) * 0.8))  # Сохраняем минимум 3 предложения
-        kept_sentences = [sentence for _, _, sentence in scored_sentences[:keep_count]]
         
         # Восстанавливаем порядок
-        kept_indices = sorted([i for _, i, _ in scored_sentences[:keep_count]])
-        final_sentences = [sentences[i] for i in kept_indices]
+        kept_indices = sorted([i for _, i in scored_sentences[:keep_count]])
         
-        return ' '.join(final_sentences)
+        return document.join([kept_indices])
 
     def _split_into_sentences(self, text: str) -> List[str]:
         """Улучшенное разделение на предложения"""
         # Разделяем по точкам, восклицательным и вопросительным знакам
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        return sentences
+        return self.tokenize(text).sentence_texts()
 
     def improve_paragraph_structure(self, text: str) -> str:
         """Улучшает структуру текста с семантической группировкой"""
-        sentences = self._split_into_sentences(text)
+        return self._improve_paragraph_structure(self.tokenize(text)).text
+
+    def _improve_paragraph_structure(self, document: TokenizedText) -> TokenizedText:
+        sentences = document.sentences
         
         if len(sentences) <= 2:
-            return text
+            return document
+        
+        sentence_phrases = self._match_phrases(document)
         
         # Группируем предложения по темам (простая эвристика)
         paragraphs = []
         current_paragraph = []
         
-        for i, sentence in enumerate(sentences):
-            current_paragraph.append(sentence)
+        for i in range(len(sentences)):
+            current_paragraph.append(i)
             
             # Начинаем новый параграф если:
             # 1. Достигли 2-3 предложений И следующее предложение начинается с нового предложения
             # 2. В предложении есть маркеры начала новой темы
             should_break = (
                 (len(current_paragraph) >= 2 and i < len(sentences) - 1 and
-                 self._is_new_topic(sentences[i], sentences[i+1])) or
+                 not self.topic_markers.isdisjoint(sentence_phrases[i+1])) or
                 len(current_paragraph) >= 3 or
-                any(marker in sentence.lower() for marker in ['таким образом', 'в заключение', 'кроме того'])
+                not self.paragraph_markers.isdisjoint(sentence_phrases[i])
             )
             
             if should_break and current_paragraph:
-                paragraphs.append(' '.join(current_paragraph))
+                paragraphs.append(current_paragraph)
                 current_paragraph = []
         
         # Добавляем оставшиеся предложения
         if current_paragraph:
-            paragraphs.append(' '.join(current_paragraph))
+            paragraphs.append(current_paragraph)
         
-        return '\n\n'.join(paragraphs)
-
-    def _is_new_topic(self, current_sentence: str, next_sentence: str) -> bool:
-        """Определяет, начинается ли новая тема"""
-        new_topic_indicators = [
-            'также', 'кроме', 'однако', 'поэтому', 'следовательно',
-            'в результате', 'в отличие', 'например', 'в частности'
-        ]
-        
-        next_lower = next_sentence.lower()
-        return any(indicator in next_lower for indicator in new_topic_indicators)
+        return document.join(paragraphs)
 
     def extract_key_terms(self, text: str, top_n: int = 8) -> List[str]:
         """Извлекает ключевые термины с учетом контекста"""
-        words = self._tokenize_text(text)
+        return self._extract_key_terms(self.tokenize(text), top_n)
+
+    def _extract_key_terms(self, document: TokenizedText, top_n: int = 8) -> List[str]:
+        words = document.terms
         
         # Учитываем составные термины (2-3 слова)
         bigrams = [f"{words[i]} {words[i+1]}" for i in range(len(words)-1)]
@@ -182,16 +168,19 @@ class AdvancedTextEnhancer:
         
         all_terms = words + bigrams + trigrams
         
-        # Взвешиваем термины
+        # Взвешиваем термины: бонус зависит только от самого термина,
+        # поэтому считаем его один раз на уникальный термин
         term_weights = {}
-        for term in all_terms:
-            term_weights[term] = term_weights.get(term, 0) + 1
+        for term, count in Counter(all_terms).items():
+            weight = 1
             
             # Увеличиваем вес для длинных терминов и терминов с заглавными буквами
             if any(word.istitle() for word in term.split()):
-                term_weights[term] += 2
+                weight += 2
             if len(term) > 10:
-                term_weights[term] += 1
+                weight += 1
+            
+            term_weights[term] = weight * count
         
         # Выбираем топ-N терминов
         top_terms = heapq.nlargest(top_n * 2, term_weights.items(), key=lambda x: x[1])
@@ -208,42 +197,56 @@ class AdvancedTextEnhancer:
 
     def _is_too_general(self, term: str) -> bool:
         """Проверяет, не является ли термин слишком общим"""
-        general_terms = {
-            'может быть', 'также как', 'однако это', 'кроме того',
-            'в том числе', 'поэтому можно', 'следует отметить'
-        }
-        return term in general_terms
+        return term in self.resources.general_terms
 
     def highlight_key_elements(self, text: str) -> str:
         """Выделяет ключевые элементы в тексте"""
-        enhanced_text = text
+        return self._highlight_key_elements(self.tokenize(text))
+
+    def _highlight_key_elements(self, document: TokenizedText) -> str:
+        text = document.text
+        spans = []
         
-        # 1. Выделяем даты
-        for pattern in self.patterns['dates']:
-            dates = re.findall(pattern, enhanced_text)
-            for date in set(dates):
-                enhanced_text = enhanced_text.replace(date, f'**{date}**')
+        # 0. Уже выделенные фрагменты не трогаем (защита от двойной разметки)
+        for match in BOLD_PATTERN.finditer(text):
+            spans.append(Span(match.start(), match.end(), HIGHLIGHT_PRIORITY['bold'], wrap=False))
         
-        # 2. Выделяем ключевые термины
-        key_terms = self.extract_key_terms(enhanced_text)
+        # 1. Даты (полные даты раньше годов в общем паттерне)
+        for match in self.resources.date_pattern.finditer(text):
+            spans.append(Span(match.start(), match.end(), HIGHLIGHT_PRIORITY['dates']))
         
-        # Сортируем по длине (сначала длинные, чтобы избежать конфликтов)
-        key_terms.sort(key=len, reverse=True)
+        # 2. Ключевые термины
+        key_terms = self._extract_key_terms(document)
+        spans.extend(self._find_term_spans(document, key_terms))
         
-        for term in key_terms:
-            # Избегаем повторного выделения
-            if f'**{term}**' not in enhanced_text:
-                # Используем границы слов для точного совпадения
-                pattern = r'\b' + re.escape(term) + r'\b'
-                enhanced_text = re.sub(pattern, f'**{term}**', enhanced_text, flags=re.IGNORECASE)
+        # 3. Акронимы
+        for match in self.resources.acronym_pattern.finditer(text):
+            spans.append(Span(match.start(), match.end(), HIGHLIGHT_PRIORITY['acronyms']))
         
-        # 3. Выделяем акронимы и важные capitalized слова
-        acronyms = re.findall(self.patterns['acronyms'], enhanced_text)
-        for acronym in set(acronyms):
-            if f'**{acronym}**' not in enhanced_text:
-                enhanced_text = enhanced_text.replace(acronym, f'**{acronym}**')
-        
-        return enhanced_text
+        # Пересечения разрешаются по приоритету, текст собирается за один проход
+        return render(text, spans)
+
+    def _find_term_spans(self, document: TokenizedText, key_terms: List[str]) -> List[Span]:
+        """Находит вхождения терминов по последовательностям токенов документа"""
+        candidates: Dict[str, List[List[str]]] = {}
+        for term in key_terms:
+            words = term.split()
+            candidates.setdefault(words[0], []).append(words)
+        
+        text, starts, ends, lowers = document.text, document.starts, document.ends, document.lowers
+        priority = HIGHLIGHT_PRIORITY['terms']
+        spans = []
+        
+        for i, word in enumerate(lowers):
+            for words in candidates.get(word, ()):
+                last = i + len(words) - 1
+                if last >= len(lowers) or lowers[i:last + 1] != words:
+                    continue
+                # Слова термина должны идти подряд, разделённые только пробелами
+                if all(text[ends[j]:starts[j + 1]].isspace() for j in range(i, last)):
+                    spans.append(Span(starts[i], ends[last], priority))
+        
+        return spans
 
     def process_text(self, text: str) -> str:
         """Основная функция обработки текста"""
@@ -252,22 +255,55 @@ class AdvancedTextEnhancer:
         
         print("🔧 Начата обработка текста...")
         
+        # Текст токенизируется один раз, дальше стадии работают с документом
+        document = self.tokenize(text)
+        
         # 1. Удаляем повторяющиеся фразы (умное удаление)
-        text_no_repeats = self.remove_repetitive_phrases(text)
+        document = self._remove_repetitive_phrases(document)
         print("✓ Удалены повторяющиеся и маловажные фразы")
         
         # 2. Улучшаем структуру абзацев
-        structured_text = self.improve_paragraph_structure(text_no_repeats)
+        document = self._improve_paragraph_structure(document)
         print("✓ Улучшена структура текста")
         
         # 3. Выделяем ключевые элементы
-        final_text = self.highlight_key_elements(structured_text)
+        final_text = self._highlight_key_elements(document)
         print("✓ Выделены ключевые термины и элементы")
         
         return final_text
 
+    def process_batch(self, texts: Sequence[str]) -> List[str]:
+        """Пакетная обработка: частоты и оценки предложений считаются матрично (NumPy)"""
+        # NumPy нужен только пакетному режиму
+        from batch_scoring import select_sentences
+
+        results = list(texts)
+        active = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 50]
+        if not active:
+            return results
+
+        print(f"🔧 Начата пакетная обработка {len(active)} текстов...")
+
+        documents = [self.tokenize(texts[i]) for i in active]
+        indicators = self.importance_indicators
+        phrase_scores = [
+            [sum(indicators.get(phrase, 0) for phrase in phrases) for phrases in self._match_phrases(document)]
+            for document in documents
+        ]
+        kept = select_sentences(documents, phrase_scores)
+
+        for i, document, kept_indices in zip(active, documents, kept):
+            if len(document.sentences) > 1:
+                document = document.join([kept_indices])
+            document = self._improve_paragraph_structure(document)
+            results[i] = self._highlight_key_elements(document)
+
+        print("✓ Пакетная обработка завершена")
+        return results
+
 # Функция для обратной совместимости
 def enhance_text(text: str) -> str:
+    # Создание дешёвое: словари берутся из общего кэша ресурсов
     enhancer = AdvancedTextEnhancer()
     return enhancer.process_text(text)
 
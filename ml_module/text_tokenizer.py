@@ -0,0 +1,152 @@
+import re
+from bisect import bisect_left
+from typing import Iterable, List, NamedTuple, Optional, Set
+
+# Предкомпилированные паттерны: тело предложения и токен (слово с дефисами)
+SENTENCE_PATTERN = re.compile(r'[^.!?]+')
+TOKEN_PATTERN = re.compile(r'[\w-]+')
+
+
+class Sentence(NamedTuple):
+    """Предложение: границы в тексте (без пробелов по краям) и диапазон его токенов"""
+    start: int
+    end: int
+    first_token: int
+    last_token: int
+
+
+class TokenizedText:
+    """Документ, разобранный один раз: предложения и токены в плоских массивах.
+
+    Для каждого токена хранятся смещения в тексте, форма в нижнем регистре и
+    признак значимого слова (не стоп-слово, длиннее двух символов). Все стадии
+    AdvancedTextEnhancer работают с этой структурой вместо повторной
+    токенизации одного и того же текста.
+    """
+
+    __slots__ = ('text', 'sentences', 'starts', 'ends', 'lowers', 'is_term', '_terms', '_lowered')
+
+    def __init__(self, text: str, sentences: List[Sentence], starts: List[int],
+                 ends: List[int], lowers: List[str], is_term: List[bool],
+                 lowered: Optional[str] = None):
+        self.text = text
+        self.sentences = sentences
+        self.starts = starts
+        self.ends = ends
+        self.lowers = lowers
+        self.is_term = is_term
+        self._terms: Optional[List[str]] = None
+        self._lowered = lowered
+
+    @property
+    def lowered(self) -> str:
+        """Текст в нижнем регистре (считается один раз)"""
+        if self._lowered is None:
+            self._lowered = self.text.lower()
+        return self._lowered
+
+    def sentence_text(self, index: int) -> str:
+        sentence = self.sentences[index]
+        return self.text[sentence.start:sentence.end]
+
+    def sentence_texts(self) -> List[str]:
+        return [self.text[s.start:s.end] for s in self.sentences]
+
+    def sentence_lower(self, index: int) -> str:
+        """Предложение в нижнем регистре без повторного lower() всего предложения"""
+        sentence = self.sentences[index]
+        lowered = self.lowered
+        if len(lowered) == len(self.text):
+            return lowered[sentence.start:sentence.end]
+        return self.text[sentence.start:sentence.end].lower()
+
+    def sentence_terms(self, index: int) -> List[str]:
+        """Значимые слова предложения"""
+        sentence = self.sentences[index]
+        lowers, is_term = self.lowers, self.is_term
+        return [lowers[i] for i in range(sentence.first_token, sentence.last_token) if is_term[i]]
+
+    @property
+    def terms(self) -> List[str]:
+        """Значимые слова всего документа (аналог старого _tokenize_text)"""
+        if self._terms is None:
+            self._terms = [word for word, term in zip(self.lowers, self.is_term) if term]
+        return self._terms
+
+    def join(self, groups: Iterable[Iterable[int]], sep: str = ' ', group_sep: str = '\n\n') -> "TokenizedText":
+        """Склеивает выбранные предложения в новый документ без повторной токенизации.
+
+        Предложения внутри группы соединяются через `sep`, группы - через
+        `group_sep`. Тела предложений не содержат терминаторов, поэтому
+        результат, как и при повторном разбиении строки, - одно предложение.
+        """
+        parts: List[str] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        lowers: List[str] = []
+        is_term: List[bool] = []
+        position = 0
+
+        for group_index, group in enumerate(groups):
+            if group_index:
+                parts.append(group_sep)
+                position += len(group_sep)
+            for sentence_index, index in enumerate(group):
+                if sentence_index:
+                    parts.append(sep)
+                    position += len(sep)
+                sentence = self.sentences[index]
+                first, last = sentence.first_token, sentence.last_token
+                offset = position - sentence.start
+                starts.extend([start + offset for start in self.starts[first:last]])
+                ends.extend([end + offset for end in self.ends[first:last]])
+                lowers.extend(self.lowers[first:last])
+                is_term.extend(self.is_term[first:last])
+                parts.append(self.text[sentence.start:sentence.end])
+                position += sentence.end - sentence.start
+
+        text = ''.join(parts)
+        sentences = [Sentence(0, len(text), 0, len(lowers))] if text.strip() else []
+        return TokenizedText(text, sentences, starts, ends, lowers, is_term)
+
+
+class TextTokenizer:
+    """Однопроходный сегментатор и токенизатор"""
+
+    def __init__(self, stop_words: Set[str]):
+        self.stop_words = stop_words
+
+    def tokenize(self, text: str) -> TokenizedText:
+        """Разбивает текст на предложения и токены"""
+        starts: List[int] = []
+        ends: List[int] = []
+        for match in TOKEN_PATTERN.finditer(text):
+            start, end = match.span()
+            starts.append(start)
+            ends.append(end)
+
+        # Нижний регистр считаем один раз для всего текста; если lower()
+        # меняет длину строки, приводим токены по отдельности
+        lowered = text.lower()
+        lowers = TOKEN_PATTERN.findall(lowered) if len(lowered) == len(text) else []
+        if len(lowers) != len(starts):
+            lowers = [text[start:end].lower() for start, end in zip(starts, ends)]
+
+        stop_words = self.stop_words
+        is_term = [len(word) > 2 and word not in stop_words for word in lowers]
+
+        sentences = []
+        for match in SENTENCE_PATTERN.finditer(text):
+            body = match.group()
+            stripped = body.strip()
+            if not stripped:
+                continue
+            start = match.start() + len(body) - len(body.lstrip())
+            end = start + len(stripped)
+            sentences.append(Sentence(
+                start, end,
+                bisect_left(starts, start),
+                bisect_left(starts, end)
+            ))
+
+        return TokenizedText(text, sentences, starts, ends, lowers, is_term, lowered)